@@ -0,0 +1,175 @@
+"""
+Position analysis with a result cache (used by the /connect4/analyze endpoint of the server)
+
+An analysis scores every column of a position with the search of bot.py. The results are kept in a size bounded
+LRU cache keyed by the canonical key of the position (mirrored positions share one entry, their scores are
+mirrored when they are returned), the board size and the depth, so popular positions like openings are
+searched once. Identical requests that arrive at the same time wait for the first one instead of searching too.
+With an EnginePool (engine_pool.py) the searches run in its worker processes: the calling thread only waits, and
+when the pool is full, analyze raises EngineBusy instead of queueing behind the other searches.
+
+    analyzer = Analyzer(depth=8, cache_size=4096)
+    analyzer.analyze(Position.from_moves([3, 3, 2]))
+    # {"scores": [...], "best_move": 4, "score": -2, "depth": 8, "cached": False}
+"""
+
+import collections
+import concurrent.futures
+import threading
+
+from bot import Bot, Position
+
+
+class LRUCache:
+    """
+    Thread safe mapping with a maximum size, the least recently used entry is removed first
+
+    Attributes:
+        capacity (int):         maximum number of entries
+        hits (int), misses (int): number of successful and failed lookups
+    """
+
+    def __init__(self, capacity:int = 4096) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, count:bool = True):
+        """
+        Parameters:
+            count (bool):   count the lookup in hits / misses
+
+        Returns:
+            the stored value (marked as most recently used) or None
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            if count:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class Analyzer:
+    """
+    Scores all columns of positions, with cached results
+
+    Attributes:
+        depth (int):        default search depth in plies
+        max_depth (int):    requested depths are limited to this
+        cache (LRUCache):   results per (width, height, depth, canonical key)
+        pool (EnginePool):  worker processes for the searches (None: search in the calling thread)
+        timeout (float):    seconds to wait for a search of the pool
+    """
+
+    def __init__(self, depth:int = 8, max_depth:int = None, cache_size:int = 4096, endgame = None, pool = None,
+                 timeout:float = 30.0) -> None:
+        """
+        Parameters:
+            endgame (EndgameDatabase):  optional exact results of late positions (see endgame_db.py),
+                                        used by the searches in the calling thread
+        """
+        self.depth = depth
+        self.max_depth = max_depth or depth
+        self.cache = LRUCache(cache_size)
+        self.bot = Bot(depth, endgame=endgame)
+        self.pool = pool
+        self.timeout = timeout
+        # the bot (and its transposition table) searches one position at a time. Reentrant: the callback of a search
+        # of the pool runs in the submitting thread (holding the lock), if the search is already finished
+        self._lock = threading.RLock()
+        self._running = {} # cache key -> Future of the search in the pool, identical requests wait for it
+
+    def analyze(self, position:Position, depth:int = None) -> dict:
+        """
+        Parameters:
+            position (Position):    the position to analyze (the game must not be over)
+            depth (int):            search depth (default: self.depth, at most self.max_depth)
+
+        Returns:
+            dict:   scores (per column from the view of the player to move, None for full columns),
+                    best_move, score (of the best move), depth, cached (True if the result came from the cache)
+
+        Raises:
+            ValueError: if the game is already over
+            EngineBusy: if the pool is full (the position was not analyzed)
+            TimeoutError: if the search in the pool took longer than timeout
+        """
+        if position.is_full() or position.last_player_won():
+            raise ValueError("the game is over")
+        depth = min(self.depth if depth is None else max(depth, 1), self.max_depth)
+        key, mirrored = position.canonical_key()
+        cache_key = (position.width, position.height, depth, key)
+        scores = self.cache.get(cache_key)
+        cached = scores is not None
+        if not cached:
+            canonical = position.mirrored() if mirrored else position
+            if self.pool is None:
+                scores, cached = self._search(cache_key, canonical, depth)
+            else:
+                scores, cached = self._search_in_pool(cache_key, canonical, depth)
+        scores = list(reversed(scores) if mirrored else scores)
+        # the best score, ties are broken towards the center (the search order of the bot)
+        best_move = max(position.legal_columns(), key=lambda column: scores[column])
+        return {"scores": scores, "best_move": best_move, "score": scores[best_move], "depth": depth, "cached": cached}
+
+    def _search(self, cache_key:tuple, position:Position, depth:int) -> tuple:
+        """
+        Returns:
+            tuple:  (scores, True if another request analyzed the position while this one waited)
+        """
+        with self._lock:
+            scores = self.cache.get(cache_key, count=False)
+            if scores is not None:
+                return scores, True
+            scores = tuple(self.bot.score_moves(position, depth))
+            self.cache.put(cache_key, scores)
+            return scores, False
+
+    def _search_in_pool(self, cache_key:tuple, position:Position, depth:int) -> tuple:
+        """
+        Returns:
+            tuple:  (scores, True if the result came from the cache or a search of another request)
+        """
+        with self._lock:
+            scores = self.cache.get(cache_key, count=False)
+            if scores is not None:
+                return scores, True
+            future = self._running.get(cache_key)
+            joined = future is not None
+            if future is None:
+                future = self._running[cache_key] = self.pool.submit_scores(position, depth)
+
+                def done(future:concurrent.futures.Future) -> None:
+                    # stored even if the waiting request timed out, the next request finds it in the cache
+                    with self._lock:
+                        del self._running[cache_key]
+                        if future.exception() is None:
+                            self.cache.put(cache_key, tuple(future.result()))
+
+                future.add_done_callback(done)
+        try:
+            return tuple(future.result(self.timeout)), joined
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f"the analysis took longer than {self.timeout} seconds") from None
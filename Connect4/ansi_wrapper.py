@@ -1,4 +1,8 @@
 from enum import Enum
+import functools
+import os
+import sys
+
 class TerminalColors(Enum):
     """
     A Class that defines the colors for Ansi formatting
@@ -15,17 +19,42 @@ class TerminalColors(Enum):
     #White = #7
     default = 1000
 
+class ColorSupport(Enum):
+    """
+    How many colors a terminal can display
+    """
+    none = 0        # no escape codes at all (dumb terminals, output redirected to a file, NO_COLOR)
+    ansi16 = 1      # the 8 basic colors and their bright variants
+    ansi256 = 2     # the 256 color palette
+
+# nearest basic color (0-7) and brightness of the TerminalColors, used on terminals with 16 colors
+ANSI16_COLORS = {
+    TerminalColors.Black: (0, False),
+    TerminalColors.Red: (1, True),
+    TerminalColors.Green: (2, False),
+    TerminalColors.Yellow: (3, True),
+    TerminalColors.Orange: (3, False),
+    TerminalColors.Blue: (4, False),
+}
+
+@functools.lru_cache(maxsize=256)
 def colorprint(text:str,
                foreground_color:TerminalColors=TerminalColors.default,
                background_color:TerminalColors=TerminalColors.default,
                foreground_bright:bool=False, background_bright:bool=False,
                underline:bool=False,
                blink:bool=False,
+               color_support:ColorSupport=ColorSupport.ansi256,
                ) -> str:
     """
     returns the text string formattet to be printed into a terminal
     
-    more elaborate description"""
+    The result only depends on the arguments, so it is cached (the same glyphs are formatted over and over again).
+    color_support selects the escape codes: 256 colors, the nearest of the 16 basic colors or no escape codes at all"""
+    if color_support == ColorSupport.none:
+        return text
+    if color_support == ColorSupport.ansi16:
+        return _colorprint16(text, foreground_color, background_color, underline, blink)
     #foreground = (3+foreground_bright*6)*10+foreground_color.value # foreground_bright is a bool. if true, 6 will be added to 3
     #background = (4+background_bright*6)*10+background_color.value # normal colors are from 40 to 47, bright from 100 (=(4+6)*10 - 107
     #return(f"\033[{foreground};{background}{";4"*underline+";5"*blink}m{text}\033[0m")
@@ -42,6 +71,97 @@ def colorprint(text:str,
     return(f"\033[{foreground};{background}{underline_and_blink}m{text}\033[0m")
     #return(f"\033[{foreground};{background}{";4"*underline+";5"*blink}m{text}\033[0m")
 
+def _colorprint16(text:str, foreground_color:TerminalColors, background_color:TerminalColors,
+                  underline:bool, blink:bool) -> str:
+    """colorprint for terminals with 16 colors (30-37 / 90-97 foreground, 40-47 / 100-107 background)"""
+    codes = []
+    if foreground_color == TerminalColors.default:
+        codes.append("39")
+    else:
+        color, bright = ANSI16_COLORS[foreground_color]
+        codes.append(str((90 if bright else 30) + color))
+    if background_color == TerminalColors.default:
+        codes.append("49")
+    else:
+        codes.append(str(40 + ANSI16_COLORS[background_color][0]))
+    if underline:
+        codes.append("4")
+    if blink:
+        codes.append("5")
+    return f"\033[{';'.join(codes)}m{text}\033[0m"
+
+def supports_ansi(stream=None) -> bool:
+    """
+    Returns:
+        bool:   True if the stream is a terminal that understands escape codes (cursor movements, colors)
+    """
+    stream = stream or sys.stdout
+    if os.environ.get("TERM") == "dumb":
+        return False
+    return hasattr(stream, "isatty") and stream.isatty()
+
+def detect_color_support(stream=None) -> ColorSupport:
+    """
+    Guess the color support of the terminal from the environment.
+    Can be overwritten with the environment variable CONNECT4_COLORS (256, 16 or none)
+
+    Returns:
+        ColorSupport:   the detected color support
+    """
+    forced = os.environ.get("CONNECT4_COLORS")
+    if forced:
+        return {"256": ColorSupport.ansi256, "16": ColorSupport.ansi16}.get(forced, ColorSupport.none)
+    # https://no-color.org/
+    if "NO_COLOR" in os.environ or not supports_ansi(stream):
+        return ColorSupport.none
+    term = os.environ.get("TERM", "")
+    if sys.platform.startswith("win") or "256" in term or os.environ.get("COLORTERM") in ("truecolor", "24bit"):
+        return ColorSupport.ansi256
+    return ColorSupport.ansi16
+
+class Palette:
+    """
+    Precomputed glyphs of the board for one level of color support
+
+    Attributes:
+        color_support (ColorSupport):   the color support the glyphs are made for
+        cells (dict):       glyph per board value ('' empty, 'X' / 'O' players, 'x' / 'o' winning coins)
+        cursors (dict):     glyph of the drop position in the header per player icon ('X' / 'O')
+        blank (str):        empty header cell
+        unknown (str):      glyph for board values that are not known
+    """
+
+    def __init__(self, color_support:ColorSupport) -> None:
+        self.color_support = color_support
+        if color_support == ColorSupport.none:
+            # without colors, the coins need to be told apart by their symbols
+            self.cells = {'': " . ", 'X': " X ", 'O': " O ", 'x': "[X]", 'o': "[O]"}
+            self.cursors = {'X': " X ", 'O': " O "}
+            self.blank = "   "
+            self.unknown = " ? "
+            return
+        def coin(color:TerminalColors, background:TerminalColors = TerminalColors.Blue) -> str:
+            return colorprint(" ⬤ ", color, background_color=background, background_bright=True, color_support=color_support)
+        self.cells = {'': coin(TerminalColors.Black),
+                      'X': coin(TerminalColors.Yellow),
+                      'O': coin(TerminalColors.Red),
+                      'x': coin(TerminalColors.Green),
+                      'o': coin(TerminalColors.Orange)}
+        self.cursors = {'X': coin(TerminalColors.Yellow, TerminalColors.default),
+                        'O': coin(TerminalColors.Red, TerminalColors.default)}
+        self.blank = "   "
+        self.unknown = "💩 "
+
+@functools.lru_cache(maxsize=None)
+def get_palette(color_support:ColorSupport = None) -> Palette:
+    """
+    Returns:
+        Palette:    the (shared) palette for the color support. If None, the color support of stdout is detected
+    """
+    if color_support is None:
+        color_support = detect_color_support()
+    return Palette(color_support)
+
 def clear_screen() -> None:
     """clear the entire screen in the Terminal"""
     print("\033[2J", end="")
@@ -0,0 +1,310 @@
+"""
+Microbenchmarks of the hot paths
+
+    engine.check_move       Connect4.check_move (including the win detection) per move
+    engine.random_game      complete random games with the Connect4 engine
+    server.encode_board     the board transposition of the /connect4/board route
+    server.get_board        the whole /connect4/board route (transposition and json encoding, Flask test client)
+    remote.decode_board     the conversion of the api board to a numpy board in Connect4_remote.get_board
+    player.visualize        building and printing the board in Player_Local.visualize (output is discarded)
+    raspi.visualize         Player_Raspi_Local.visualize on a FakeSenseHat (LED matrix only, cursor moves between frames)
+    raspi.get_action        joystick input of Player_Raspi_Local (FakeSenseHat event queue to decoded action)
+    bot.evaluate            the scalar bitboard evaluation of the bot, per position
+    evaluator.batch         BatchEvaluator.evaluate_positions on one batch of positions (1000 by default), per position
+
+Results are written as json, so runs can be compared over time:
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json     # exit code 1 if a benchmark got slower than the threshold
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from game import Connect4
+
+BENCHMARKS = {}
+
+
+def benchmark(name:str, number:int):
+    """
+    Decorator to register a benchmark
+
+    The decorated function gets the number of loops and returns (measured seconds, number of operations),
+    so it can exclude its own setup from the measurement.
+
+    Parameters:
+        name (str):     name of the benchmark
+        number (int):   default number of loops per repetition
+    """
+    def decorator(function):
+        BENCHMARKS[name] = (function, number)
+        return function
+    return decorator
+
+
+def random_games(count:int, width:int = 7, height:int = 6, seed:int = 42) -> list:
+    """
+    Returns:
+        list:   move sequences (lists of columns) of random games, played until the end
+    """
+    generator = random.Random(seed)
+    games = []
+    for _ in range(count):
+        game = _new_game(width, height)
+        while game.winner is None and game.turn_counter < width * height:
+            column = generator.choice([x for x in range(width) if game.board[x][height - 1] == ''])
+            game.check_move(column, id=game.players[game.activeplayer])
+        games.append(list(game.moves))
+    return games
+
+
+def _new_game(width:int = 7, height:int = 6) -> Connect4:
+    game = Connect4(width, height, verbose=False)
+    game.register_player("first", "first", icon='X')
+    game.register_player("second", "second")
+    return game
+
+
+def _played_game(moves:list, width:int = 7, height:int = 6) -> Connect4:
+    game = _new_game(width, height)
+    for column in moves:
+        game.check_move(column, id=game.players[game.activeplayer])
+    return game
+
+
+@benchmark("engine.check_move", number=200)
+def bench_check_move(number:int) -> tuple:
+    games = random_games(number)
+    elapsed = 0.0
+    moves = 0
+    for game_moves in games:
+        game = _new_game()
+        for column in game_moves:
+            player = game.players[game.activeplayer]
+            start = time.perf_counter()
+            game.check_move(column, id=player)
+            elapsed += time.perf_counter() - start
+        moves += len(game_moves)
+    return elapsed, moves
+
+
+@benchmark("engine.random_game", number=50)
+def bench_random_game(number:int) -> tuple:
+    start = time.perf_counter()
+    random_games(number, seed=number)
+    return time.perf_counter() - start, number
+
+
+@benchmark("server.encode_board", number=2000)
+def bench_encode_board(number:int) -> tuple:
+    from server import encode_board
+    board = _played_game(random_games(1)[0]).get_board()
+    start = time.perf_counter()
+    for _ in range(number):
+        encode_board(board)
+    return time.perf_counter() - start, number
+
+
+@benchmark("server.get_board", number=500)
+def bench_get_board(number:int) -> tuple:
+    import logging
+    from server import Connect4Server, DEFAULT_GAME
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = Connect4Server(player_rate=None, ip_rate=None) # measure the endpoint, not the rate limit
+    server.games[DEFAULT_GAME].game = _played_game(random_games(1)[0], 8, 7)
+    client = server.app.test_client()
+    start = time.perf_counter()
+    for _ in range(number):
+        client.get("/connect4/board")
+    return time.perf_counter() - start, number
+
+
+@benchmark("remote.decode_board", number=2000)
+def bench_decode_board(number:int) -> tuple:
+    from server import encode_board
+    from game_remote import decode_board
+    # the json decoded board consists of plain python strings
+    api_board = json.loads(json.dumps(encode_board(_played_game(random_games(1)[0]).get_board())))
+    start = time.perf_counter()
+    for _ in range(number):
+        decode_board(api_board)
+    return time.perf_counter() - start, number
+
+
+@benchmark("player.visualize", number=300)
+def bench_visualize(number:int) -> tuple:
+    from player_local import Player_Local
+    game = Connect4(7, 6, verbose=False)
+    player = Player_Local(game, name="benchmark")
+    Player_Local(game, name="opponent")
+    for column in random_games(1)[0][:20]:
+        game.check_move(column, id=game.players[game.activeplayer])
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        for _ in range(number):
+            player.visualize()
+        elapsed = time.perf_counter() - start
+    return elapsed, number
+
+
+@benchmark("raspi.visualize", number=300)
+def bench_raspi_visualize(number:int) -> tuple:
+    from fake_sense_hat import FakeSenseHat
+    from player_raspi_local import Player_Raspi_Local
+    game = Connect4(7, 6, verbose=False)
+    sense = FakeSenseHat()
+    player = Player_Raspi_Local(game, sense=sense, cli_mirror=False)
+    Player_Raspi_Local(game, sense=sense, cli_mirror=False)
+    for column in random_games(1)[0][:20]:
+        game.check_move(column, id=game.players[game.activeplayer])
+    player.board = game.get_board()
+    start = time.perf_counter()
+    for index in range(number):
+        player.drop_position = index % game.width
+        player.visualize(fetch_board=False)
+    return time.perf_counter() - start, number
+
+
+@benchmark("raspi.get_action", number=1000)
+def bench_raspi_get_action(number:int) -> tuple:
+    from fake_sense_hat import FakeSenseHat
+    from player_raspi_local import Player_Raspi_Local
+    game = Connect4(7, 6, verbose=False)
+    sense = FakeSenseHat()
+    player = Player_Raspi_Local(game, sense=sense, cli_mirror=False)
+    sense.stick.script(["left", "right", "middle"] * (number // 3 + 1))
+    start = time.perf_counter()
+    for _ in range(number):
+        player.get_action()
+    return time.perf_counter() - start, number
+
+
+def _random_positions(count:int) -> list:
+    from bot import Position
+    generator = random.Random(count)
+    positions = []
+    for moves in random_games(count):
+        positions.append(Position.from_moves(moves[:generator.randrange(len(moves))]))
+    return positions
+
+
+@benchmark("bot.evaluate", number=1000)
+def bench_bot_evaluate(number:int) -> tuple:
+    from bot import evaluate
+    positions = _random_positions(number)
+    start = time.perf_counter()
+    for position in positions:
+        evaluate(position)
+    return time.perf_counter() - start, number
+
+
+@benchmark("evaluator.batch", number=1000)
+def bench_batch_evaluator(number:int) -> tuple:
+    from evaluator import BatchEvaluator
+    evaluator = BatchEvaluator(7, 6)
+    positions = _random_positions(number)
+    start = time.perf_counter()
+    evaluator.evaluate_positions(positions)
+    return time.perf_counter() - start, number
+
+
+def run(names:list = None, repeat:int = 5, scale:float = 1.0) -> dict:
+    """
+    Run the benchmarks
+
+    Parameters:
+        names (list):       benchmarks to run (default: all)
+        repeat (int):       repetitions per benchmark (the fastest one is the most reliable result)
+        scale (float):      factor for the number of loops (e.g. 0.1 for a quick run)
+
+    Returns:
+        dict:   per benchmark the time per operation in microseconds (best, median) and the operations per second
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        function, number = BENCHMARKS[name]
+        number = max(1, int(number * scale))
+        per_operation = []
+        for _ in range(repeat):
+            elapsed, operations = function(number)
+            per_operation.append(elapsed / operations)
+        best = min(per_operation)
+        results[name] = {"best_us": best * 1e6,
+                         "median_us": statistics.median(per_operation) * 1e6,
+                         "ops_per_s": 1 / best if best else float("inf"),
+                         "repeat": repeat,
+                         "number": number}
+    return results
+
+
+def compare(results:dict, baseline:dict, threshold:float = 0.10) -> list:
+    """
+    Compare results with a baseline run
+
+    Parameters:
+        results (dict):     benchmarks of the current run (see run)
+        baseline (dict):    benchmarks of an earlier run
+        threshold (float):  relative slowdown of the best time that counts as regression
+
+    Returns:
+        list:   (name, baseline µs, current µs, relative change, regression) for every benchmark in both runs,
+                regression is True if the change is above the threshold
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["best_us"]
+        change = (result["best_us"] - before) / before if before else 0.0
+        rows.append((name, before, result["best_us"], change, change > threshold))
+    return rows
+
+
+def environment() -> dict:
+    """information about the machine, stored with the results"""
+    return {"python": sys.version.split()[0], "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "machine": platform.machine(),
+            "time": datetime.datetime.now().isoformat(timespec="seconds")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connect 4 microbenchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per benchmark")
+    parser.add_argument("--scale", type=float, default=1.0, help="factor for the number of loops")
+    parser.add_argument("--save", metavar="FILE", help="write the results as json to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="compare with the results in FILE")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as regression")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run(args.benchmarks, args.repeat, args.scale)
+    print(f"{'benchmark':<22}{'best µs':>12}{'median µs':>12}{'ops/s':>14}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['best_us']:>12.2f}{result['median_us']:>12.2f}{result['ops_per_s']:>14.1f}")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"environment": environment(), "results": results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n{'benchmark':<22}{'baseline µs':>12}{'current µs':>12}{'change':>10}")
+        for name, before, after, change, regression in rows:
+            print(f"{name:<22}{before:>12.2f}{after:>12.2f}{change:>+10.1%}{'  REGRESSION' if regression else ''}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
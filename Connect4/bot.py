@@ -0,0 +1,581 @@
+"""
+Connect 4 bot (game tree search)
+
+The bot searches on its own compact board representation (Position, a pair of bitboards), because copying and
+scanning the numpy board of Connect4 for every node of the search tree would be far too slow.
+Positions can be created from the board layout of Connect4.get_board (board[x][y], y=0 is the bottom).
+
+The search is a negamax alpha-beta search with iterative deepening and a transposition table.
+Leaves are scored with a threat based heuristic (cells that would complete four in a row for a player).
+"""
+
+import random
+import threading
+import time
+
+# score of a win. Quicker wins get higher scores: WIN_SCORE - number of coins on the board after the winning move
+WIN_SCORE = 10_000
+
+# transposition table flags
+EXACT = 0
+LOWER = 1   # the score is a lower bound (the search failed high)
+UPPER = 2   # the score is an upper bound (the search failed low)
+
+
+class Position:
+    """
+    A Connect 4 position as two bitboards (representation by Pascal Pons)
+
+    Every column uses height + 1 bits (the extra bit on top stays empty), bit 0 is the bottom left cell.
+
+    Attributes:
+        width (int):        width of the board
+        height (int):       height of the board
+        current (int):      bitboard with the coins of the player to move
+        mask (int):         bitboard with all coins
+        moves (int):        number of coins on the board
+    """
+    __slots__ = ("width", "height", "current", "mask", "moves", "_geometry")
+
+    # the masks only depend on the board size, so they are computed once per size
+    _geometries = {}
+
+    def __init__(self, width:int = 7, height:int = 6) -> None:
+        self.width = width
+        self.height = height
+        self.current = 0
+        self.mask = 0
+        self.moves = 0
+        self._geometry = Position._get_geometry(width, height)
+
+    @staticmethod
+    def _get_geometry(width:int, height:int) -> "_Geometry":
+        geometry = Position._geometries.get((width, height))
+        if geometry is None:
+            geometry = Position._geometries[(width, height)] = _Geometry(width, height)
+        return geometry
+
+    @classmethod
+    def from_board(cls, board, icon:str) -> "Position":
+        """
+        Create a position from a board in the layout of Connect4.get_board
+
+        Parameters:
+            board (Array):  board[x][y] with 'X', 'O' or '' (winning coins may be lowercase), y=0 is the bottom
+            icon (str):     the icon of the player to move
+
+        Returns:
+            Position:       the position with icon as the player to move
+        """
+        width = len(board)
+        height = len(board[0])
+        position = cls(width, height)
+        icon = icon.upper()
+        for x in range(width):
+            for y in range(height):
+                cell = board[x][y]
+                if cell == '':
+                    break
+                bit = 1 << (x * (height + 1) + y)
+                position.mask |= bit
+                position.moves += 1
+                if str(cell).upper() == icon:
+                    position.current |= bit
+        return position
+
+    @classmethod
+    def from_moves(cls, columns, width:int = 7, height:int = 6) -> "Position":
+        """
+        Create a position by playing a sequence of columns from the empty board
+
+        Raises:
+            ValueError: if one of the moves is not possible
+        """
+        position = cls(width, height)
+        for column in columns:
+            if not 0 <= column < width or not position.can_play(column):
+                raise ValueError(f"column {column} can't be played")
+            position.play(column)
+        return position
+
+    def copy(self) -> "Position":
+        position = Position.__new__(Position)
+        position.width = self.width
+        position.height = self.height
+        position.current = self.current
+        position.mask = self.mask
+        position.moves = self.moves
+        position._geometry = self._geometry
+        return position
+
+    def can_play(self, column:int) -> bool:
+        """True if the column is not full"""
+        return not self.mask & self._geometry.top[column]
+
+    def play(self, column:int) -> None:
+        """drop a coin of the player to move into the column (the column must not be full)"""
+        self.current ^= self.mask
+        self.mask |= self.mask + self._geometry.bottom[column]
+        self.moves += 1
+
+    def is_winning_move(self, column:int) -> bool:
+        """True if the player to move wins by playing the column"""
+        return bool(self.winning_cells(self.current) & self.possible() & self._geometry.column[column])
+
+    def possible(self) -> int:
+        """bitboard with the cells that can be played next"""
+        return (self.mask + self._geometry.bottom_all) & self._geometry.board
+
+    def legal_columns(self) -> list:
+        """the columns that are not full (in the search order: center columns first)"""
+        return [column for column in self._geometry.order if self.can_play(column)]
+
+    def opponent(self) -> int:
+        """bitboard with the coins of the player that just moved"""
+        return self.current ^ self.mask
+
+    def is_full(self) -> bool:
+        return self.moves >= self.width * self.height
+
+    def last_player_won(self) -> bool:
+        """True if the player who made the last move has four in a row"""
+        return has_four(self.current ^ self.mask, self.height + 1)
+
+    def winning_cells(self, coins:int) -> int:
+        """
+        Returns:
+            int:    bitboard with the empty cells that would complete four in a row for the given coins
+        """
+        return winning_cells(coins, self.mask, self.height + 1, self._geometry.board)
+
+    def key(self) -> int:
+        """unique number of the position (including the player to move)"""
+        return self.current + self.mask
+
+    def mirror_key(self) -> int:
+        """key of the position mirrored at the vertical center line"""
+        return _mirror(self.current, self.width, self.height) + _mirror(self.mask, self.width, self.height)
+
+    def mirrored(self) -> "Position":
+        """the position mirrored at the vertical center line"""
+        position = self.copy()
+        position.current = _mirror(self.current, self.width, self.height)
+        position.mask = _mirror(self.mask, self.width, self.height)
+        return position
+
+    def canonical_key(self) -> tuple:
+        """
+        Returns:
+            tuple:  (key, mirrored) the smaller of key and mirror_key and whether the mirrored one was chosen.
+                    Mirrored positions share the same key (with mirrored columns)
+        """
+        key = self.key()
+        mirrored = self.mirror_key()
+        return (mirrored, True) if mirrored < key else (key, False)
+
+    def to_board(self, icon:str, other_icon:str) -> list:
+        """
+        Returns:
+            list:   the position in the layout of Connect4.get_board (icon is the player to move)
+        """
+        board = [['' for _ in range(self.height)] for _ in range(self.width)]
+        for x in range(self.width):
+            for y in range(self.height):
+                bit = 1 << (x * (self.height + 1) + y)
+                if self.mask & bit:
+                    board[x][y] = icon if self.current & bit else other_icon
+        return board
+
+    def __repr__(self) -> str:
+        rows = []
+        for y in range(self.height - 1, -1, -1):
+            row = ""
+            for x in range(self.width):
+                bit = 1 << (x * (self.height + 1) + y)
+                row += "." if not self.mask & bit else ("x" if self.current & bit else "o")
+            rows.append(row)
+        return "\n".join(rows)
+
+
+class _Geometry:
+    """bit masks for one board size"""
+
+    def __init__(self, width:int, height:int) -> None:
+        column_height = height + 1
+        self.bottom = [1 << (x * column_height) for x in range(width)]
+        self.top = [1 << (x * column_height + height - 1) for x in range(width)]
+        self.column = [((1 << height) - 1) << (x * column_height) for x in range(width)]
+        self.bottom_all = sum(self.bottom)
+        self.board = sum(self.column)
+        # columns in the center take part in more lines of four, so they are searched first
+        self.order = sorted(range(width), key=lambda x: abs(2 * x - (width - 1)))
+        center = width // 2
+        self.center = self.column[center] | (self.column[center - 1] if width % 2 == 0 else 0)
+
+
+def has_four(coins:int, column_height:int) -> bool:
+    """True if the coins (bitboard) contain four in a row"""
+    for shift in (1, column_height, column_height - 1, column_height + 1):
+        pairs = coins & (coins >> shift)
+        if pairs & (pairs >> 2 * shift):
+            return True
+    return False
+
+
+def winning_cells(coins:int, mask:int, column_height:int, board_mask:int) -> int:
+    """
+    Returns:
+        int:    bitboard with the empty cells that would complete four in a row for the coins
+    """
+    # vertical
+    cells = (coins << 1) & (coins << 2) & (coins << 3)
+    # horizontal and both diagonals
+    for shift in (column_height, column_height - 1, column_height + 1):
+        pair = (coins << shift) & (coins << 2 * shift)
+        cells |= pair & (coins << 3 * shift)
+        cells |= pair & (coins >> shift)
+        pair = (coins >> shift) & (coins >> 2 * shift)
+        cells |= pair & (coins << shift)
+        cells |= pair & (coins >> 3 * shift)
+    return cells & (board_mask ^ mask)
+
+
+def _mirror(bitboard:int, width:int, height:int) -> int:
+    """mirrors a bitboard at the vertical center line"""
+    column_height = height + 1
+    column_mask = (1 << column_height) - 1
+    mirrored = 0
+    for x in range(width):
+        mirrored |= ((bitboard >> (x * column_height)) & column_mask) << ((width - 1 - x) * column_height)
+    return mirrored
+
+
+def evaluate(position:Position) -> int:
+    """
+    Heuristic score of a position from the view of the player to move.
+    Counts the empty cells that would complete four in a row (threats) and the coins in the center column(s).
+    """
+    geometry = position._geometry
+    own = position.current
+    opponent = position.current ^ position.mask
+    own_threats = winning_cells(own, position.mask, position.height + 1, geometry.board)
+    opponent_threats = winning_cells(opponent, position.mask, position.height + 1, geometry.board)
+    return (4 * (own_threats.bit_count() - opponent_threats.bit_count())
+            + (own & geometry.center).bit_count() - (opponent & geometry.center).bit_count())
+
+
+class TranspositionTable:
+    """
+    Stores search results per position, so positions that are reached by different move orders are searched once
+
+    The table is a dictionary key -> (depth, flag, score, move). It is cleared when it reaches its capacity.
+    """
+
+    def __init__(self, capacity:int = 1_000_000) -> None:
+        self.capacity = capacity
+        self.entries = {}
+
+    def get(self, key:int):
+        """
+        Returns:
+            tuple:  (depth, flag, score, move) or None if the position is not stored
+        """
+        return self.entries.get(key)
+
+    def store(self, key:int, depth:int, flag:int, score:int, move:int) -> None:
+        if len(self.entries) >= self.capacity:
+            self.entries.clear()
+        self.entries[key] = (depth, flag, score, move)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class SearchTimeout(Exception):
+    """Raised inside of the search when the time limit is reached"""
+
+
+class Bot:
+    """
+    Alpha-beta game tree search
+
+    Attributes:
+        depth (int):            maximum search depth in plies
+        time_limit (float):     optional time limit per move in seconds (iterative deepening stops when it is reached)
+        randomness (float):     probability to play a random legal move instead of the best one (for varied games)
+        table (TranspositionTable): the transposition table, kept between moves
+        nodes (int):            number of searched positions of the last search
+        stop_requested (bool):  set from another thread to abort the running search (see Ponderer)
+        endgame (EndgameDatabase): optional exact results of late positions (see endgame_db.py)
+    """
+
+    def __init__(self, depth:int = 6, time_limit:float = None, randomness:float = 0.0,
+                 table:TranspositionTable = None, seed:int = None, endgame = None) -> None:
+        self.depth = depth
+        self.time_limit = time_limit
+        self.randomness = randomness
+        self.table = TranspositionTable() if table is None else table
+        self.random = random.Random(seed)
+        self.nodes = 0
+        self.stop_requested = False
+        self.endgame = endgame
+        self._deadline = None
+
+    def choose_move(self, board, icon:str) -> int:
+        """
+        Choose a column for the player with the given icon
+
+        Parameters:
+            board (Array):  board in the layout of Connect4.get_board
+            icon (str):     icon of the player to move
+
+        Returns:
+            int:            the chosen column
+        """
+        return self.best_move(Position.from_board(board, icon))
+
+    def best_move(self, position:Position) -> int:
+        """
+        Returns:
+            int:    the column to play in the position (a random one with the probability randomness)
+        """
+        if self.randomness and self.random.random() < self.randomness:
+            return self.random.choice(position.legal_columns())
+        return self.search(position)[0]
+
+    def search(self, position:Position, depth:int = None, time_limit:float = None) -> tuple:
+        """
+        Iterative deepening search
+
+        Parameters:
+            position (Position):    position to search (must have a legal move)
+            depth (int):            maximum depth (default: self.depth)
+            time_limit (float):     time limit in seconds (default: self.time_limit)
+
+        Returns:
+            tuple:  (best column, score, reached depth)
+        """
+        depth = self.depth if depth is None else depth
+        time_limit = self.time_limit if time_limit is None else time_limit
+        self._deadline = time.perf_counter() + time_limit if time_limit else None
+        self.nodes = 0
+        best = (position.legal_columns()[0], 0, 0)
+        for current_depth in range(1, depth + 1):
+            try:
+                move, score = self.search_root(position, current_depth)
+            except SearchTimeout:
+                break
+            best = (move, score, current_depth)
+            if abs(score) >= WIN_SCORE - position.width * position.height:
+                break # the game is decided, deeper searches can't change the result
+        self._deadline = None
+        return best
+
+    def search_root(self, position:Position, depth:int, alpha:int = -WIN_SCORE - 1, beta:int = WIN_SCORE + 1) -> tuple:
+        """
+        Search all moves of the position to a fixed depth
+
+        Returns:
+            tuple:  (best column, score)
+        """
+        best_move = None
+        for column in self.ordered_moves(position):
+            child = position.copy()
+            if child.is_winning_move(column):
+                return column, WIN_SCORE - position.moves - 1
+            child.play(column)
+            score = -self.negamax(child, depth - 1, -beta, -alpha)
+            if best_move is None or score > alpha:
+                best_move, alpha = column, max(alpha, score)
+        self.table.store(position.key(), depth, EXACT, alpha, best_move)
+        return best_move, alpha
+
+    def score_moves(self, position:Position, depth:int = None) -> list:
+        """
+        Score every column of the position with a full window search (slower than search, which only finds the best move)
+
+        Returns:
+            list:   score per column from the view of the player to move, None for full columns
+        """
+        depth = self.depth if depth is None else depth
+        self.nodes = 0
+        scores = [None] * position.width
+        for column in range(position.width):
+            if not position.can_play(column):
+                continue
+            if position.is_winning_move(column):
+                scores[column] = WIN_SCORE - position.moves - 1
+                continue
+            child = position.copy()
+            child.play(column)
+            scores[column] = -self.negamax(child, depth - 1, -WIN_SCORE - 1, WIN_SCORE + 1)
+        return scores
+
+    def ordered_moves(self, position:Position) -> list:
+        """legal columns, the best move stored in the transposition table first, then from the center outwards"""
+        columns = position.legal_columns()
+        entry = self.table.get(position.key())
+        if entry is not None and entry[3] in columns:
+            columns.remove(entry[3])
+            columns.insert(0, entry[3])
+        return columns
+
+    def negamax(self, position:Position, depth:int, alpha:int, beta:int) -> int:
+        """
+        Alpha-beta search from the view of the player to move (the last move did not win)
+
+        Returns:
+            int:    score of the position
+        """
+        self.nodes += 1
+        if not self.nodes & 1023 and (self.stop_requested or
+                                      self._deadline is not None and time.perf_counter() > self._deadline):
+            raise SearchTimeout()
+        if position.is_full():
+            return 0
+        possible = position.possible()
+        if position.winning_cells(position.current) & possible:
+            return WIN_SCORE - position.moves - 1
+        if self.endgame is not None and position.moves >= self.endgame.min_moves:
+            value = self.endgame.lookup(position)
+            if value is not None:
+                # exact result, but without the number of moves: the smallest score of a decided game
+                return value * (WIN_SCORE - position.width * position.height)
+        if depth <= 0:
+            return evaluate(position)
+
+        original_alpha = alpha
+        key = position.key()
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= depth:
+            _, flag, score, _ = entry
+            if flag == EXACT:
+                return score
+            if flag == LOWER and score >= beta:
+                return score
+            if flag == UPPER and score <= alpha:
+                return score
+
+        # if the opponent threatens to win, the only move that does not lose is to block
+        forced = position.winning_cells(position.opponent()) & possible
+        columns = self.ordered_moves(position)
+        if forced:
+            columns = [column for column in columns if forced & position._geometry.column[column]][:1]
+
+        best_score = -WIN_SCORE - 1
+        best_move = columns[0]
+        for column in columns:
+            child = position.copy()
+            child.play(column)
+            score = -self.negamax(child, depth - 1, -beta, -alpha)
+            if score > best_score:
+                best_score, best_move = score, column
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, flag, best_score, best_move)
+        return best_score
+
+
+class Ponderer:
+    """
+    Searches the predicted replies of the opponent in a background thread, while the opponent thinks
+
+    The positions after the replies are deepened in rounds (depth 1 for all replies, then depth 2, ...), the reply the
+    search expects first. All results go to the transposition table of the bot, so when the opponent plays one of
+    the pondered replies, the next search finds the subtree of that reply in the table and gets deeper in the same
+    time. The root results of the other replies are dropped.
+
+    The bot must not search in another thread while the ponderer is running (take stops it).
+
+    Attributes:
+        bot (Bot):              the bot whose table is filled
+        max_replies (int):      number of replies to ponder (None: all)
+        hits (int):             number of opponent moves that were pondered
+        misses (int):           number of opponent moves that were not pondered
+    """
+
+    def __init__(self, bot:Bot, max_replies:int = None) -> None:
+        self.bot = bot
+        self.max_replies = max_replies
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._thread = None
+
+    def start(self, position:Position) -> None:
+        """
+        Start pondering
+
+        Parameters:
+            position (Position):    the position after the own move (the opponent is to move)
+        """
+        self.stop()
+        self._results = {}
+        if position.is_full() or position.last_player_won():
+            return
+        self._thread = threading.Thread(target=self._run, args=(position,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """stop the background search (returns when the thread has ended)"""
+        if self._thread is not None:
+            self.bot.stop_requested = True
+            self._thread.join()
+            self.bot.stop_requested = False
+            self._thread = None
+
+    def take(self, position:Position) -> tuple:
+        """
+        Stop pondering and get the result for the actual position
+
+        Parameters:
+            position (Position):    the position after the opponent's move
+
+        Returns:
+            tuple:  (best column, score, reached depth) or None if the opponent's move was not pondered
+        """
+        self.stop()
+        result = self._results.get(position.key())
+        self._results = {}
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def _run(self, position:Position) -> None:
+        replies = []
+        for column in self.bot.ordered_moves(position)[:self.max_replies]:
+            if position.is_winning_move(column):
+                continue # the game is over after this reply, nothing to ponder
+            child = position.copy()
+            child.play(column)
+            if not child.is_full():
+                replies.append(child)
+        try:
+            for depth in range(1, self.bot.depth + 1):
+                for child in replies:
+                    move, score = self.bot.search_root(child, depth)
+                    self._results[child.key()] = (move, score, depth)
+        except SearchTimeout:
+            pass
+
+
+def random_move(board) -> int:
+    """
+    Returns:
+        int:    a random column that is not full (board in the layout of Connect4.get_board)
+    """
+    return random.choice([x for x in range(len(board)) if board[x][len(board[x]) - 1] == ''])
@@ -0,0 +1,212 @@
+"""
+Move clocks and the timer queue that enforces them
+
+All deadlines of the server (the move clocks of the running games, the reclaim of idle and finished games) are
+kept in one heap and served by a single thread, that sleeps until the earliest deadline. A game costs one heap
+entry instead of a thread or a sleeping request, so thousands of games need no more than one idle thread.
+Rescheduling a game (after every move) cancels its old entry lazily: the entry stays in the heap, marked as
+cancelled, and is skipped when it comes up (the heap is compacted when most entries are cancelled).
+
+    timers = TimerQueue()
+    timer = timers.schedule(30, forfeit, game)  # forfeit(game) is called in 30 seconds by the timer thread
+    timers.cancel(timer)                        # the player moved in time
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class Timer:
+    """
+    A scheduled callback (returned by TimerQueue.schedule)
+
+    Attributes:
+        deadline (float):   time.monotonic() when the callback is due
+        cancelled (bool):   the callback will not be called
+    """
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline:float, callback, args:tuple) -> None:
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerQueue:
+    """
+    Calls callbacks at their deadline, all from one background thread (started with the first timer)
+
+    The callbacks should be short (e.g. change a game under its lock), a slow callback delays the following ones.
+
+    Attributes:
+        fired (int):    number of callbacks that were called
+        errors (int):   number of callbacks that raised an exception (the thread keeps running)
+    """
+
+    # compact the heap when it holds more cancelled entries than this and than live ones
+    COMPACT_MIN = 64
+
+    def __init__(self, name:str = "timers") -> None:
+        self.name = name
+        self.fired = 0
+        self.errors = 0
+        self._heap = []             # (deadline, sequence number, Timer)
+        self._sequence = itertools.count() # equal deadlines are called in the order they were scheduled
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        """number of pending (not cancelled) timers"""
+        with self._condition:
+            return len(self._heap) - self._cancelled
+
+    def schedule(self, delay:float, callback, *args) -> Timer:
+        """
+        Call callback(*args) in delay seconds
+
+        Returns:
+            Timer:  handle for cancel
+        """
+        return self.schedule_at(time.monotonic() + delay, callback, *args)
+
+    def schedule_at(self, deadline:float, callback, *args) -> Timer:
+        """
+        Call callback(*args) at the time.monotonic() deadline (right away if it already passed)
+
+        Returns:
+            Timer:  handle for cancel
+        """
+        timer = Timer(deadline, callback, args)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("the timer queue is closed")
+            heapq.heappush(self._heap, (deadline, next(self._sequence), timer))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            # the thread only has to wake up if the new timer is due before the one it sleeps for
+            if self._heap[0][2] is timer:
+                self._condition.notify()
+        return timer
+
+    def cancel(self, timer:Timer) -> None:
+        """the callback of the timer will not be called (nothing happens if it was already called or cancelled)"""
+        with self._condition:
+            if timer.cancelled or timer.callback is None:
+                return
+            timer.cancelled = True
+            self._cancelled += 1
+            if self._cancelled > self.COMPACT_MIN and self._cancelled * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    deadline, _, timer = self._heap[0]
+                    if timer.cancelled:
+                        heapq.heappop(self._heap)
+                        self._cancelled -= 1
+                        continue
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        self._condition.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    callback, args = timer.callback, timer.args
+                    timer.callback = timer.args = None # called: cancel is a no-op now
+                    break
+            # the callback runs without the lock, it may schedule or cancel timers
+            try:
+                callback(*args)
+                self.fired += 1
+            except Exception:
+                self.errors += 1
+
+    def close(self) -> None:
+        """stop the thread, pending callbacks are not called"""
+        with self._condition:
+            self._closed = True
+            self._heap.clear()
+            self._cancelled = 0
+            self._condition.notify_all()
+
+
+class GameClock:
+    """
+    Time control of a game: a time budget per player (base, plus increment after every move, like a chess clock)
+    and/or a limit for every single move. Only the clock of the player to move runs.
+
+    Attributes:
+        base (float):       seconds every player has for the whole game (None: no budget)
+        increment (float):  seconds added to the budget of a player after each of its moves
+        move_time (float):  seconds for a single move (None: no limit)
+        running (str):      id of the player whose clock runs (None: the clock is stopped)
+    """
+
+    def __init__(self, base:float = None, increment:float = 0.0, move_time:float = None) -> None:
+        self.base = base
+        self.increment = increment
+        self.move_time = move_time
+        self.running = None
+        self.started = None
+        self.budget = {}    # player id -> remaining seconds (when base is set)
+
+    def start(self, player_id:str, now:float = None) -> None:
+        """start the clock of the player to move"""
+        if self.base is not None:
+            self.budget.setdefault(player_id, self.base)
+        self.running = player_id
+        self.started = time.monotonic() if now is None else now
+
+    def stop(self, now:float = None, increment:bool = True) -> float:
+        """
+        Stop the running clock after a move (or at the end of the game), charge the time and add the increment
+        (not at the end of the game: increment=False)
+
+        Returns:
+            float:  seconds the move took (0 if no clock was running)
+        """
+        if self.running is None:
+            return 0.0
+        elapsed = (time.monotonic() if now is None else now) - self.started
+        if self.base is not None:
+            self.budget[self.running] = self.budget[self.running] - elapsed + (self.increment if increment else 0.0)
+        self.running = None
+        return elapsed
+
+    def deadline(self):
+        """
+        Returns:
+            float:  time.monotonic() when the player to move runs out of time (None if no clock runs)
+        """
+        if self.running is None:
+            return None
+        limits = []
+        if self.base is not None:
+            limits.append(self.budget[self.running])
+        if self.move_time is not None:
+            limits.append(self.move_time)
+        return self.started + min(limits) if limits else None
+
+    def remaining(self, now:float = None) -> dict:
+        """
+        Returns:
+            dict:   player id -> seconds left in the budget (the running clock counted up to now), empty without base
+        """
+        remaining = dict(self.budget)
+        if self.running is not None and self.base is not None:
+            remaining[self.running] -= (time.monotonic() if now is None else now) - self.started
+        return {player_id: max(seconds, 0.0) for player_id, seconds in remaining.items()}
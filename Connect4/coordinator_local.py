@@ -1,7 +1,34 @@
 
 
+import time
+
 from game import Connect4
-from os import path # to check if we are wearing a senseHat
+from game_record import GameRecord, GameRecordWriter, append_record
+from fake_sense_hat import create_sense_hat # to check if we are wearing a senseHat
+
+
+class GameResult:
+    """
+    Outcome of a game played by a headless Coordinator_Local
+
+    Attributes:
+        winner (int):       1 if player1 won, 2 if player2 won, None for a draw
+        first (int):        the player that moved first (1 or 2)
+        moves (list):       the played columns, in order
+        seconds (float):    duration of the game
+    """
+
+    __slots__ = ("winner", "first", "moves", "seconds")
+
+    def __init__(self, winner:int, first:int, moves:list, seconds:float) -> None:
+        self.winner = winner
+        self.first = first
+        self.moves = moves
+        self.seconds = seconds
+
+    def __repr__(self) -> str:
+        return f"GameResult(winner={self.winner}, first={self.first}, moves={len(self.moves)}, seconds={self.seconds:.4f})"
+
 
 class Coordinator_Local:
     """ 
@@ -15,27 +42,41 @@ class Coordinator_Local:
         game (Connect4):    Local Instance of a Connect4 Game
         player1 (Player):   Local Instance of a Player 
         player2 (Player):   Local Instance of a Player
+        record_path (str):  Optional log file, to which a record of every finished game is appended (see game_record.py)
+        headless (bool):    True if the players were passed in: nothing is rendered and play returns a GameResult
     """
 
-    def __init__(self) -> None:
+    def __init__(self, record_path:str = None, sense_hat:str = None, players:tuple = None,
+                 width:int = 7, height:int = 6) -> None:
         """
         Initialize the Coordinator_Local with a Game and 2 Players
+
+        Parameters:
+            record_path (str):  Optional path of a NDJSON (.ndjson/.jsonl) or binary game record log
+            sense_hat (str):    Optional "auto", "real", "fake" or "none" (default: environment variable CONNECT4_SENSE_HAT or "auto")
+            players (tuple):    Optional two callables that create a player for a game, e.g.
+                                (Player_Random, functools.partial(Player_Bot, depth=4)) (see player_bot.py).
+                                If given, the coordinator runs headless.
+            width (int):        Board width
+            height (int):       Board height
         """
-        self.game = Connect4(7,6)
-        # check if a SenseHat is connected. If not, the game will run in the Terminal, where this script was started.
-        # https://raspberrypi.stackexchange.com/questions/39153/how-to-detect-what-kind-of-hat-or-gpio-board-is-plugged-in-if-any
-        if path.isfile(r"/proc/device-tree/hat/product"): # the r before the string indicates a raw string.
-            # a Hat is attached, most likely a senseHat
+        self.record_path = record_path
+        self.headless = players is not None
+        self._record_writer = None
+        self.game = Connect4(width, height, verbose=not self.headless)
+        if self.headless:
+            self.player1 = players[0](self.game)
+            self.player2 = players[1](self.game)
+            return
+        # the real SenseHat (if attached), a FakeSenseHat for headless tests or None (see fake_sense_hat.create_sense_hat)
+        sense = create_sense_hat(sense_hat)
+        if sense is not None:
             # create a sense hat shared between both players
-            from sense_hat import SenseHat #type: ignore # this commend makes pylance accept, that sense_hat does not need to be installed on windows
             from player_raspi_local import Player_Raspi_Local
 
-            sense = SenseHat()
             self.player1 = Player_Raspi_Local(self.game, sense=sense)
             self.player2 = Player_Raspi_Local(self.game, sense=sense)
             print("initiated sense-hat players")
-            #self.player1 = Player_Local(self.game)
-            #self.player2 = Player_Local(self.game)
         else:
             from player_local import Player_Local
             self.player1 = Player_Local(self.game)
@@ -49,19 +90,121 @@ class Coordinator_Local:
         
             This method handles player registration, turn management, 
             and checking for a winner until the game concludes.
+
+        Returns:
+            GameResult: in headless mode (interactive games exit on a win)
         """
+        if self.headless:
+            return self.play_headless()
         while not self.game.winner and self.game.turn_counter < self.game.width * self.game.height:
             currentPlayer = self.player1 if self.player1.is_my_turn() else self.player2
             currentPlayer.make_move()
             if self.game.winner:
+                self.save_record()
                 currentPlayer.celebrate_win()
                 exit()
+        self.save_record()
         print('The game is a draw.')
 
+    def play_headless(self) -> GameResult:
+        """
+        Play the current game without any output
+
+        Returns:
+            GameResult: the outcome of the game
+        """
+        game = self.game
+        players = {self.player1.id: self.player1, self.player2.id: self.player2}
+        cells = game.width * game.height
+        start = time.perf_counter()
+        while game.winner is None and game.turn_counter < cells:
+            players[game.players[game.activeplayer]].make_move()
+        seconds = time.perf_counter() - start
+        self.save_record()
+        winner = None if game.winner is None else (1 if game.winner == self.player1.id else 2)
+        first = 1 if game.players[0] == self.player1.id else 2
+        return GameResult(winner, first, list(game.moves), seconds)
+
+    def new_game(self, swap_players:bool = True) -> None:
+        """
+        Reset the game (and the headless players) for the next game, keeping the registered players
+
+        Parameters:
+            swap_players (bool):    the player that moved second, moves first in the next game
+        """
+        self.game.reset(keep_players=True, swap_players=swap_players)
+        for player in (self.player1, self.player2):
+            if hasattr(player, "new_game"):
+                player.new_game()
+
+    def play_many(self, count:int, alternate:bool = True):
+        """
+        Play games back to back on the same game object (headless mode only)
+
+        Parameters:
+            count (int):        number of games
+            alternate (bool):   alternate the player that moves first
+
+        Returns:
+            generator:  the GameResult of every game
+        """
+        if not self.headless:
+            raise RuntimeError("play_many needs a headless coordinator (pass players)")
+        # the record log stays open for all games instead of being opened once per game
+        if self.record_path:
+            self._record_writer = GameRecordWriter(self.record_path)
+        try:
+            for index in range(count):
+                if index or self.game.turn_counter != 0:
+                    self.new_game(swap_players=alternate and index > 0)
+                yield self.play_headless()
+        finally:
+            if self._record_writer is not None:
+                self._record_writer.close()
+                self._record_writer = None
+
+    def save_record(self) -> None:
+        """
+        Append the record of the game to the record log (if a record_path was given)
+        """
+        if self._record_writer is not None:
+            self._record_writer.write(GameRecord.from_game(self.game))
+        elif self.record_path:
+            append_record(self.record_path, GameRecord.from_game(self.game))
+
 
 
 if __name__ == "__main__":
-    # Create a coordinator
-    # play a game
-    Coordinator = Coordinator_Local()
-    Coordinator.play()
\ No newline at end of file
+    import argparse
+    import functools
+    import instrumentation
+    parser = argparse.ArgumentParser(description="Play Connect 4 with two local players")
+    instrumentation.add_arguments(parser)
+    parser.add_argument("--headless", nargs=2, metavar=("PLAYER1", "PLAYER2"), choices=("bot", "random"),
+                        help="play without input and output, with bots or random players (e.g. --headless bot random)")
+    parser.add_argument("--games", type=int, default=1, help="number of headless games")
+    parser.add_argument("--depth", type=int, default=4, help="search depth of the headless bots")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random players")
+    parser.add_argument("--record", metavar="FILE", help="append a record of every game to FILE")
+    args = parser.parse_args()
+    instrumentation.enable(args.trace, args.profile)
+
+    if args.headless:
+        from player_bot import Player_Bot, Player_Random
+        factories = {"bot": functools.partial(Player_Bot, depth=args.depth),
+                     "random": functools.partial(Player_Random, seed=args.seed)}
+        coordinator = Coordinator_Local(record_path=args.record,
+                                        players=[functools.partial(factories[kind], name=f"{kind}{index}")
+                                                 for index, kind in enumerate(args.headless, 1)])
+        wins = {1: 0, 2: 0, None: 0}
+        start = time.perf_counter()
+        for result in coordinator.play_many(args.games):
+            wins[result.winner] += 1
+        elapsed = time.perf_counter() - start
+        print(f"{args.games} games in {elapsed:.2f} s ({60 * args.games / elapsed:.0f} games/min)")
+        print(f"player1 ({args.headless[0]}): {wins[1]}  player2 ({args.headless[1]}): {wins[2]}  draws: {wins[None]}")
+    else:
+        # Create a coordinator
+        # play a game
+        Coordinator = Coordinator_Local(record_path=args.record)
+        Coordinator.play()
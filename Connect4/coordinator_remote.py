@@ -1,7 +1,13 @@
+import time
 from time import sleep
 from game_remote import Connect4_remote
-from os import path # to check if we are wearing a senseHat
+from game_record import MoveTracker, append_record
+from fake_sense_hat import create_sense_hat # to check if we are wearing a senseHat
+from player_local import Action
 import ansi_wrapper
+import input_events
+import instrumentation
+import polling
 
 class Coordinator_Remote:
     """ 
@@ -18,33 +24,49 @@ class Coordinator_Remote:
         player (Player):        Local Instance of ONE remote Player (Raspi or Normal)
         game (Connect4_remote): Local Instance of remote game (communicates with the server via api calls)
         sense (SenseHat):       Optional Local Instance of a SenseHat (if on Raspi)
+        record_path (str):      Optional log file, to which a record of the game is appended (see game_record.py)
+        poll_scheduler (PollScheduler): Decides when the server is polled (see polling.py)
     """
 
-    def __init__(self, api_url: str) -> None:
+    def __init__(self, api_url: str, record_path: str = None, sense_hat: str = None,
+                 poll_scheduler: polling.PollScheduler = None, player = None, engine_depth: int = None,
+                 lobby: bool = False) -> None:
         """
         Initialize the Coordinator_Remote.
 
         Parameters:
             api_url (str):      Address of Server, including Port Bsp: http://10.147.17.27:5000
+            record_path (str):  Optional path of a NDJSON (.ndjson/.jsonl) or binary game record log
+            sense_hat (str):    Optional "auto", "real", "fake" or "none" (default: environment variable CONNECT4_SENSE_HAT or "auto")
+            poll_scheduler (PollScheduler): Optional min/max interval and timeout of the polling (default: PollScheduler())
+            player:             Optional callable that creates the player for the game, e.g.
+                                functools.partial(Player_Bot, time_limit=1, depth=42, ponder=True) (see player_bot.py).
+                                Default: a CLI or SenseHat player
+            engine_depth (int): Optional. Play against an engine of the server with this search depth
+                                (see /connect4/engine) instead of waiting for a second player
+            lobby (bool):       Optional. Let the lobby of the server find an opponent and play in a new game
+                                (see /connect4/lobby) instead of joining the default game
         """
         self.api_url = api_url
-        self.game = Connect4_remote(api_url)
-        # check if a SenseHat is connected. If not, the game will run in the Terminal, where this script was started.
-        # https://raspberrypi.stackexchange.com/questions/39153/how-to-detect-what-kind-of-hat-or-gpio-board-is-plugged-in-if-any
-        if path.isfile(r"/proc/device-tree/hat/product"): # the r before the string indicates a raw string.
-            # a Hat is attached, most likely a senseHat
-            # create a sense hat shared between both players
-            from sense_hat import SenseHat #type: ignore # this commend makes pylance accept, that sense_hat does not need to be installed on windows
+        self.record_path = record_path
+        self.poll_scheduler = poll_scheduler or polling.PollScheduler()
+        self.game = Connect4_remote(api_url, lobby=lobby)
+        if lobby:
+            print("waiting in the lobby for an opponent...")
+        # the real SenseHat (if attached), a FakeSenseHat for headless tests or None (see fake_sense_hat.create_sense_hat)
+        sense = create_sense_hat(sense_hat) if player is None else None
+        if player is not None:
+            self.player = player(self.game)
+        elif sense is not None:
             from player_raspi_local import Player_Raspi_Local
 
-            sense = SenseHat()
             self.player = Player_Raspi_Local(self.game, sense=sense)
             print("initiated sense-hat players")
-            #self.player1 = Player_Local(self.game)
-            #self.player2 = Player_Local(self.game)
         else:
             from player_local import Player_Local
             self.player = Player_Local(self.game)
+        if engine_depth is not None:
+            self.game.add_engine(engine_depth)
         # wait until the other player is connected 
         self.wait_for_second_player()
     
@@ -54,67 +76,148 @@ class Coordinator_Remote:
         """Waits for the second player to connect.
 
         This method checks the game status until the second player is detected,
-        indicating that the game can start.
+        indicating that the game can start. The interval between the checks grows while
+        nobody connects (see polling.py), the spinner keeps turning in between.
+
+        Raises:
+            TimeoutError: If no opponent connected within the timeout of the poll scheduler.
         """
-        turn_number = self.game.get_status()["turn_number"]
-        while turn_number < 0:
-            turn_number = self.game.get_status()["turn_number"]
-            wait_time = 1
-            partial_wait_time = wait_time/4
-
-            print("waiting for opponent to connect    ", flush=True, end = "")
-            sleep(partial_wait_time) 
-            ansi_wrapper.clear_line()
-            print("waiting for opponent to connect .  ",flush=True, end = "")
-            sleep(partial_wait_time) 
-            ansi_wrapper.clear_line()
-            print("waiting for opponent to connect .. ",flush=True, end = "")
-            sleep(partial_wait_time) 
-            ansi_wrapper.clear_line()
-            print("waiting for opponent to connect ...",flush=True, end = "")
-            sleep(partial_wait_time) 
+        scheduler = self.poll_scheduler
+        scheduler.reset()
+        spinner_step = 0.25
+        dots = 0
+        next_poll = time.monotonic()
+        while True:
+            if time.monotonic() >= next_poll:
+                if self.game.get_status()["turn_number"] >= 0:
+                    break
+                if scheduler.timed_out():
+                    raise TimeoutError(f"no opponent connected within {scheduler.timeout} seconds")
+                next_poll = time.monotonic() + scheduler.next_delay()
+
+            print("waiting for opponent to connect " + ("." * dots).ljust(3), flush=True, end = "")
+            sleep(spinner_step)
             ansi_wrapper.clear_line()
+            dots = (dots + 1) % 4
         self.player.visualize()
 
     def play(self):
         """ Main function to play the game with two remote players.
 
-        This method manages the game loop, where players take turns making moves,
-        checks for a winner, and visualizes the game board.
+        The game runs as an event loop (see input_events.py): the input of the local player and the
+        status of the game on the server (polled in a background thread) are handled as soon as they arrive.
+        The cursor can be moved while the opponent is thinking, and the opponent's move is shown without
+        waiting for a key press.
         """
         board = self.game.get_board()
         width = len(board)
         height = len(board[0])
+        # the remote game only exposes its board, the move order is reconstructed from the observed boards
+        tracker = MoveTracker(width, height) if self.record_path else None
+        if tracker is not None:
+            tracker.observe(board)
 
         status = self.game.get_status()
+        my_turn = status["active_player"] == self.player.icon
+        own_column = None # the column of the own move, until the server status shows it
+
+        mux = input_events.EventMux()
+        self.poll_scheduler.reset()
+        poller = input_events.StatusPoller(mux, self.game, self.poll_scheduler)
+        poller.last_status = status
+        source = self.player.input_source(mux)
+        poller.start()
+        if source is not None:
+            source.start()
+        try:
+            self.player.board = board
+            self.player.visualize(fetch_board=False)
+            while status["winner"] is None and status["turn_number"] < width * height:
+                if my_turn and own_column is None and source is None:
+                    # players without interactive input move directly
+                    own_column = self.player.make_move()
+                    poller.poke()
+
+                with instrumentation.span("Coordinator_Remote.wait", "idle"):
+                    events = mux.wait()
+                for kind, value in events:
+                    # one span per event, to see if a slow reaction comes from rendering, network or game logic
+                    with instrumentation.span("Coordinator_Remote.event", "coordinator", kind=kind):
+                        if kind == input_events.ERROR:
+                            raise value
+                        if kind == input_events.INPUT:
+                            if value == Action.abort:
+                                exit()
+                            self.poll_scheduler.touch() # the player is still there, restart the timeout
+                            # the cursor moves at any time, a coin is only dropped when the last status shows our turn:
+                            # otherwise the opponent may have moved already and the drop would land on a board
+                            # that was not observed yet (the record would get the moves in the wrong order)
+                            if value == Action.drop and not my_turn:
+                                poller.poke()
+                            elif own_column is None:
+                                own_column = self.player.handle_action(value)
+                                if own_column is not None:
+                                    poller.poke() # show the move (and the opponent's turn) right away
+                        elif kind == input_events.STATUS:
+                            previous_turn = status["turn_number"]
+                            status = value
+                            if status["turn_number"] != previous_turn or status["winner"] is not None:
+                                board = self.game.get_board()
+                                if tracker is not None:
+                                    tracker.observe(board, own_column, self.player.icon)
+                                own_column = None
+                                my_turn = status["active_player"] == self.player.icon
+                                self.player.board = board
+                                self.player.visualize(fetch_board=False)
+        finally:
+            poller.stop()
+            if source is not None:
+                source.stop()
+            mux.close()
+            if hasattr(self.player, "close"):
+                self.player.close() # e.g. stop pondering bots
+
         winner = status["winner"] # the UUID of the winner
-        turn_counter = status["turn_number"]
-        active_player = status["active_player"]
-
-        while not winner and turn_counter < width * height:
-            if active_player == self.player.icon:
-                self.player.make_move()
-                self.player.visualize() # visualize the move that was made
-
-            status = self.game.get_status()
-            winner = status["winner"] # the UUID of the winner
-            turn_counter = status["turn_number"]
-            active_player = status["active_player"]
-
-            if winner == str(self.player.id): # winner id's returned from the game are strings
-                self.player.celebrate_win()
-                exit()
-            if winner != None:
-                self.player.visualize()
-                print("Your opponent wins! sad times.")
-
-            # wait, in order to not overload the server with requests
-            sleep(0.5)
-        if turn_counter >= width*height:
+        if winner == str(self.player.id): # winner id's returned from the game are strings
+            self.save_record(tracker, winner_icon=self.player.icon)
+            self.player.celebrate_win()
+            exit()
+        if winner != None:
+            self.save_record(tracker, winner_icon='O' if self.player.icon == 'X' else 'X')
+            self.player.visualize()
+            print("Your opponent wins! sad times.")
+        else:
+            self.save_record(tracker)
             print('The game is a draw.')
 
+    def save_record(self, tracker:MoveTracker, winner_icon:str = None) -> None:
+        """
+        Append the record of the observed game to the record log (if a record_path was given)
+
+        Parameters:
+            tracker (MoveTracker):  the tracker that observed the game (None if recording is disabled)
+            winner_icon (str):      the icon of the winner, None for a draw
+        """
+        if tracker is None:
+            return
+        record = tracker.record((self.player.name, ""), self.player.icon, winner_icon)
+        append_record(self.record_path, record)
+
 # To start a game
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Play Connect 4 against a remote opponent")
+    instrumentation.add_arguments(parser)
+    polling.add_arguments(parser)
+    parser.add_argument("--bot", type=int, metavar="DEPTH", help="let a bot with this search depth play")
+    parser.add_argument("--time-limit", type=float, metavar="SECONDS", help="thinking time per move of the bot")
+    parser.add_argument("--ponder", action="store_true", help="let the bot think during the opponent's turn")
+    parser.add_argument("--workers", type=int, default=1, help="search processes of the bot (one per core)")
+    parser.add_argument("--vs-engine", type=int, metavar="DEPTH", help="play against an engine of the server")
+    parser.add_argument("--lobby", action="store_true", help="let the lobby of the server find an opponent")
+    args = parser.parse_args()
+    instrumentation.enable(args.trace, args.profile)
+
     server_location = input("""
  Where is the server?
  [1] - localhost:5000
@@ -132,5 +235,15 @@ if __name__ == "__main__":
     # pc_url = "http://127.0.1.1:5000"
 
     # Initialize the Coordinator
-    c_remote = Coordinator_Remote(api_url=api_url)
-    c_remote.play()
\ No newline at end of file
+    try:
+        player = None
+        if args.bot:
+            import functools
+            from player_bot import Player_Bot
+            player = functools.partial(Player_Bot, name="Bot", depth=args.bot, time_limit=args.time_limit,
+                                       ponder=args.ponder, workers=args.workers)
+        c_remote = Coordinator_Remote(api_url=api_url, poll_scheduler=polling.from_arguments(args), player=player,
+                                      engine_depth=args.vs_engine, lobby=args.lobby)
+        c_remote.play()
+    except TimeoutError as error:
+        print(f"\n{error}")
\ No newline at end of file
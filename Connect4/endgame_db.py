@@ -0,0 +1,222 @@
+"""
+Endgame database: exact results of all positions with few empty cells
+
+The generator enumerates the positions that can be reached with at most `empty` empty cells and solves them by
+retrograde analysis: the full boards are draws, and every level of positions (number of coins) is solved from the
+level above it, back down to the first stored level. No search is needed, every position is solved exactly once.
+
+Positions are enumerated either from the empty board (all reachable positions, practical for small boards like
+5x4 or 6x5) or from the positions of recorded games (the late game of the played games, for 7x6 and larger, where
+the full enumeration is far too big).
+
+File format (little endian, memory mappable):
+    header  "C4EG", width, height, empty (uint8 each), padding, number of positions (uint64)
+    keys    uint64 per position, sorted (the canonical key of bot.Position, mirrored positions are stored once)
+    values  int8 per position, from the view of the player to move: 1 win, 0 draw, -1 loss
+
+Usage:
+    python endgame_db.py --width 5 --height 4 --empty 20 --output 5x4.c4eg
+    python endgame_db.py --width 7 --height 6 --empty 12 --records games.ndjson --output 7x6.c4eg
+
+    db = EndgameDatabase("5x4.c4eg")
+    db.lookup(Position.from_moves([2, 2, 1], 5, 4))     # 1, 0, -1 or None if the position is not stored
+"""
+
+import argparse
+import struct
+import time
+
+import numpy as np
+
+from bot import Position
+from game_record import read_records
+
+MAGIC = b"C4EG"
+HEADER = struct.Struct("<4sBBBxQ")
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+
+def _canonical(position:Position) -> tuple:
+    """
+    Returns:
+        tuple:  (canonical key, position in the canonical orientation)
+    """
+    key, mirrored = position.canonical_key()
+    return key, (position.mirrored() if mirrored else position)
+
+
+def _expand(level:dict) -> dict:
+    """
+    Returns:
+        dict:   canonical key -> position of all positions one move later, in which the game is not over
+    """
+    following = {}
+    for position in level.values():
+        if position.is_full():
+            continue
+        for column in position.legal_columns():
+            if position.is_winning_move(column):
+                continue
+            child = position.copy()
+            child.play(column)
+            key, child = _canonical(child)
+            following.setdefault(key, child)
+    return following
+
+
+def _solve_level(level:dict, following:dict) -> dict:
+    """
+    Parameters:
+        level (dict):       canonical key -> position
+        following (dict):   canonical key -> value of the positions one move later
+
+    Returns:
+        dict:   canonical key -> value of the positions of the level
+    """
+    values = {}
+    for key, position in level.items():
+        if position.is_full():
+            values[key] = DRAW
+            continue
+        best = LOSS
+        for column in position.legal_columns():
+            if position.is_winning_move(column):
+                best = WIN
+                break
+            child = position.copy()
+            child.play(column)
+            best = max(best, -following[child.canonical_key()[0]])
+            if best == WIN:
+                break
+        values[key] = best
+    return values
+
+
+def generate(width:int, height:int, empty:int, roots = None, progress:bool = True) -> dict:
+    """
+    Enumerate and solve the positions with at most `empty` empty cells
+
+    Parameters:
+        width (int), height (int):  board size (width * (height + 1) must not exceed 64)
+        empty (int):                maximum number of empty cells of the stored positions
+        roots (iterable):           optional positions with exactly `empty` empty cells to start from
+                                    (default: all positions reachable from the empty board)
+
+    Returns:
+        dict:   canonical key -> value (from the view of the player to move)
+    """
+    if width * (height + 1) > 64:
+        raise ValueError("the keys of the board size don't fit into 64 bits")
+    cells = width * height
+    first = max(cells - empty, 0)
+    start = time.perf_counter()
+    if roots is None:
+        level = {Position(width, height).key(): Position(width, height)}
+        for moves in range(first):
+            level = _expand(level)
+            if progress:
+                print(f"\renumerating: {moves + 1} coins, {len(level)} positions", end="", flush=True)
+    else:
+        level = {}
+        for position in roots:
+            if position.moves != first or position.last_player_won():
+                continue
+            key, position = _canonical(position)
+            level[key] = position
+    levels = [level]
+    for moves in range(first, cells):
+        levels.append(_expand(levels[-1]))
+        if progress:
+            print(f"\renumerating: {moves + 1} coins, {len(levels[-1])} positions" + " " * 10, end="", flush=True)
+
+    values = {}
+    following = {}
+    for index in range(len(levels) - 1, -1, -1):
+        following = _solve_level(levels[index], following)
+        values.update(following)
+        levels[index] = None # free the positions of the solved level
+        if progress:
+            print(f"\rsolving: {first + index} coins, {len(values)} positions solved" + " " * 10, end="", flush=True)
+    if progress:
+        print(f"\n{len(values)} positions in {time.perf_counter() - start:.1f} s")
+    return values
+
+
+def roots_from_records(paths:list, width:int, height:int, empty:int):
+    """
+    Yields:
+        Position:   the position with `empty` empty cells of every recorded game of the board size
+    """
+    moves = width * height - empty
+    for path in paths:
+        for record in read_records(path):
+            columns = record.columns()
+            if record.width == width and record.height == height and len(columns) >= moves:
+                yield Position.from_moves(columns[:moves], width, height)
+
+
+def write_database(path:str, values:dict, width:int, height:int, empty:int) -> None:
+    keys = np.fromiter(values.keys(), dtype=np.uint64, count=len(values))
+    results = np.fromiter(values.values(), dtype=np.int8, count=len(values))
+    order = np.argsort(keys)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, width, height, empty, len(values)))
+        file.write(keys[order].tobytes())
+        file.write(results[order].tobytes())
+
+
+class EndgameDatabase:
+    """
+    Read only access to a database file (memory mapped, the file is not loaded into memory)
+
+    Attributes:
+        width (int), height (int):  board size
+        empty (int):                maximum number of empty cells of the stored positions
+        min_moves (int):            positions with fewer coins are not stored
+    """
+
+    def __init__(self, path:str) -> None:
+        with open(path, "rb") as file:
+            magic, self.width, self.height, self.empty, count = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an endgame database")
+        self.min_moves = self.width * self.height - self.empty
+        self.keys = np.memmap(path, dtype=np.uint64, mode="r", offset=HEADER.size, shape=(count,))
+        self.values = np.memmap(path, dtype=np.int8, mode="r", offset=HEADER.size + 8 * count, shape=(count,))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, position:Position):
+        """
+        Returns:
+            int:    1 (the player to move wins), 0 (draw), -1 (loss) or None if the position is not stored
+        """
+        if (position.width, position.height) != (self.width, self.height) or position.moves < self.min_moves:
+            return None
+        key = np.uint64(position.canonical_key()[0])
+        index = int(np.searchsorted(self.keys, key))
+        if index < len(self.keys) and self.keys[index] == key:
+            return int(self.values[index])
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a Connect 4 endgame database by retrograde analysis")
+    parser.add_argument("--width", type=int, default=7, help="board width")
+    parser.add_argument("--height", type=int, default=6, help="board height")
+    parser.add_argument("--empty", type=int, required=True, help="store all positions with at most this many empty cells")
+    parser.add_argument("--records", nargs="*", metavar="FILE",
+                        help="only the positions reachable from the recorded games (for large boards)")
+    parser.add_argument("--output", required=True, help="database file")
+    args = parser.parse_args()
+
+    roots = roots_from_records(args.records, args.width, args.height, args.empty) if args.records else None
+    values = generate(args.width, args.height, args.empty, roots)
+    write_database(args.output, values, args.width, args.height, args.empty)
+    counts = {name: sum(1 for value in values.values() if value == result)
+              for name, result in (("wins", WIN), ("draws", DRAW), ("losses", LOSS))}
+    print(f"{args.output}: {len(values)} positions ({counts['wins']} wins, {counts['draws']} draws, "
+          f"{counts['losses']} losses for the player to move)")
@@ -0,0 +1,213 @@
+"""
+Engine opponents of the server: the searches run in a pool of worker processes, not in the request threads
+
+A search of the bot takes up to seconds of CPU time. In a Flask request thread it would block that thread and, because
+of the GIL, slow down every other request. The EnginePool sends the position to a ProcessPoolExecutor and returns at
+once; when the worker found its move, a callback (in a thread of the executor) applies it to the game.
+
+The pool is bounded: at most `workers + max_queue` searches are pending. When it is full, `submit` raises
+EngineBusy, so the server can answer 503 instead of queueing an unlimited number of searches.
+If a worker process dies (or can't be started), the executor is broken for good: the pool then starts new
+workers and submits the affected searches again (at most `RESTARTS` times per search).
+
+Every worker process keeps its bots (and their transposition tables) between searches.
+The same pool type scores positions for the analysis of the server (submit_scores), the request thread only waits.
+
+    pool = EnginePool(workers=2, max_queue=16, depth=8)
+    pool.submit(position, lambda column: game.check_move(column, id=engine_id))
+    pool.submit_scores(position).result()     # scores of all columns, see Bot.score_moves
+"""
+
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
+import threading
+import time
+
+from bot import Bot, Position
+
+# bots of a worker process per (width, height, depth, time limit), with their transposition tables
+_bots = {}
+
+
+class EngineBusy(Exception):
+    """Raised by EnginePool.submit when the maximum number of pending searches is reached"""
+
+
+def _bot_and_position(width:int, height:int, current:int, mask:int, moves:int, depth:int, time_limit:float) -> tuple:
+    """the bot of the worker process for the settings and the position (runs in a worker process)"""
+    bot = _bots.get((width, height, depth, time_limit))
+    if bot is None:
+        bot = _bots[(width, height, depth, time_limit)] = Bot(depth, time_limit)
+    position = Position(width, height)
+    position.current, position.mask, position.moves = current, mask, moves
+    return bot, position
+
+
+def _think(width:int, height:int, current:int, mask:int, moves:int, depth:int, time_limit:float) -> tuple:
+    """
+    Search a position (runs in a worker process)
+
+    Returns:
+        tuple:  (column, seconds of the search)
+    """
+    start = time.perf_counter()
+    bot, position = _bot_and_position(width, height, current, mask, moves, depth, time_limit)
+    return bot.search(position)[0], time.perf_counter() - start
+
+
+def _score(width:int, height:int, current:int, mask:int, moves:int, depth:int) -> tuple:
+    """
+    Score every column of a position (runs in a worker process)
+
+    Returns:
+        tuple:  (list of scores, see Bot.score_moves, seconds of the search)
+    """
+    start = time.perf_counter()
+    bot, position = _bot_and_position(width, height, current, mask, moves, depth, None)
+    return bot.score_moves(position, depth), time.perf_counter() - start
+
+
+class EnginePool:
+    """
+    Bounded queue of engine searches, computed by worker processes
+
+    Attributes:
+        workers (int):      number of worker processes (started with the first search)
+        max_queue (int):    searches that may wait for a worker, in addition to the running ones
+        depth (int):        default search depth
+        time_limit (float): default seconds per search
+        pending (int):      number of submitted searches that are not finished
+        restarts (int):     number of times the workers were started again, after the executor broke
+        on_finished:        optional callback(wait seconds, search seconds) for every finished search (metrics)
+    """
+
+    # how often a search is submitted again after its executor broke
+    RESTARTS = 2
+
+    def __init__(self, workers:int = 2, max_queue:int = 16, depth:int = 8, time_limit:float = None,
+                 on_finished = None) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.depth = depth
+        self.time_limit = time_limit
+        self.on_finished = on_finished
+        self.pending = 0
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def full(self) -> bool:
+        with self._lock:
+            return self.pending >= self.workers + self.max_queue
+
+    def submit(self, position:Position, callback, depth:int = None, on_error = None) -> concurrent.futures.Future:
+        """
+        Search the position in a worker process
+
+        Parameters:
+            position (Position):    the position (the engine is the player to move)
+            callback:               called with the column when the search is finished (in a thread of the pool),
+                                    not called if the search failed
+            depth (int):            search depth (default: self.depth)
+            on_error:               optional, called with the exception if the search failed (also after the restarts)
+
+        Raises:
+            EngineBusy: if the maximum number of pending searches is reached
+        """
+        return self._submit(_think, (position.width, position.height, position.current, position.mask, position.moves,
+                                     self.depth if depth is None else depth, self.time_limit), callback, on_error)
+
+    def submit_scores(self, position:Position, depth:int = None) -> concurrent.futures.Future:
+        """
+        Score every column of the position in a worker process (see Bot.score_moves)
+
+        Returns:
+            Future: the list of scores, or the exception of the search
+
+        Raises:
+            EngineBusy: if the maximum number of pending searches is reached
+        """
+        result = concurrent.futures.Future()
+        self._submit(_score, (position.width, position.height, position.current, position.mask, position.moves,
+                              self.depth if depth is None else depth), result.set_result, result.set_exception)
+        return result
+
+    def _submit(self, function, args:tuple, callback, on_error = None) -> concurrent.futures.Future:
+        """
+        Run function(*args) -> (result, seconds) in a worker process, then callback(result) in a thread of the pool
+        (on_error(exception) if it failed)
+
+        Returns:
+            Future: the future of the first attempt (a search that is submitted again after a restart gets a new one)
+
+        Raises:
+            EngineBusy: if the maximum number of pending searches is reached
+        """
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                raise EngineBusy(f"{self.pending} engine searches are pending")
+            self.pending += 1
+        try:
+            return self._start(function, args, callback, on_error, time.perf_counter(), self.RESTARTS)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+            raise
+
+    def _start(self, function, args:tuple, callback, on_error, submitted:float, restarts:int) -> concurrent.futures.Future:
+        """submit an accepted search to the executor (pending was already counted)"""
+        with self._lock:
+            if self._executor is None:
+                # spawn instead of fork: the server has threads, whose locks must not be copied into the workers
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"))
+            executor = self._executor
+        try:
+            future = executor.submit(function, *args)
+        except concurrent.futures.process.BrokenProcessPool:
+            if restarts == 0:
+                raise
+            self._restart(executor)
+            return self._start(function, args, callback, on_error, submitted, restarts - 1)
+
+        def finished(future:concurrent.futures.Future) -> None:
+            error = concurrent.futures.CancelledError() if future.cancelled() else future.exception()
+            if isinstance(error, concurrent.futures.process.BrokenProcessPool) and restarts > 0:
+                # a worker died or could not be started: search again with new workers
+                self._restart(executor)
+                try:
+                    self._start(function, args, callback, on_error, submitted, restarts - 1)
+                    return # still pending
+                except Exception as e:
+                    error = e
+            with self._lock:
+                self.pending -= 1
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+                return
+            result, seconds = future.result()
+            if self.on_finished is not None:
+                # the time from the submission to the start of the search was spent waiting in the queue
+                self.on_finished(max(time.perf_counter() - submitted - seconds, 0.0), seconds)
+            callback(result)
+
+        future.add_done_callback(finished)
+        return future
+
+    def _restart(self, executor:concurrent.futures.ProcessPoolExecutor) -> None:
+        """drop the broken executor, the next search starts new workers (only once per broken executor)"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        """cancel the waiting searches and stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
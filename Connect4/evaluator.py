@@ -0,0 +1,158 @@
+"""
+Vectorized evaluation of many positions at once
+
+Every line of four cells on the board is a window. For a batch of boards the coins of both players are counted in
+all windows with one fancy-indexing operation (boards x windows x 4), so there is no Python loop per board or cell:
+    - open twos:    windows with two coins of a player and no coin of the opponent
+    - open threes:  windows with three coins of a player and an empty fourth cell
+    - threats:      open threes whose empty cell can be played right now (the cell below is filled)
+
+The boards are given in the layout of Connect4.get_board (board[x][y], y=0 is the bottom), either as strings
+('X', 'O', '', winning coins lowercase) or as bot.Position bitboards.
+
+    evaluator = BatchEvaluator(7, 6)
+    scores = evaluator.evaluate_boards([game.get_board() for game in games], 'X')
+"""
+
+import numpy as np
+
+# weights of the features (own minus opponent), a threat of the player to move is a win in one move
+DEFAULT_WEIGHTS = {"twos": 1.0, "threes": 4.0, "threats": 16.0}
+# score of a position in which the player to move can win immediately
+WIN_SCORE = 1000.0
+
+
+class BatchEvaluator:
+    """
+    Scores batches of positions of one board size
+
+    Attributes:
+        width (int), height (int):  board size
+        windows (np.ndarray):       (windows, 4) flat cell indices (x * height + y) of all lines of four
+        weights (dict):             weight per feature (see DEFAULT_WEIGHTS)
+    """
+
+    def __init__(self, width:int = 7, height:int = 6, weights:dict = None) -> None:
+        self.width = width
+        self.height = height
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        windows = []
+        for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+            for x in range(width):
+                for y in range(height):
+                    cells = [(x + i * dx, y + i * dy) for i in range(4)]
+                    if all(0 <= cx < width and 0 <= cy < height for cx, cy in cells):
+                        windows.append([cx * height + cy for cx, cy in cells])
+        self.windows = np.array(windows, dtype=np.intp)
+        self._window_x = self.windows // height
+        self._window_y = self.windows % height
+        # bit of every cell in the bitboards of bot.Position (height + 1 bits per column)
+        self._bit_shifts = np.array([x * (height + 1) + y for x in range(width) for y in range(height)], dtype=np.uint64)
+
+    def planes_from_boards(self, boards, icon:str) -> tuple:
+        """
+        Parameters:
+            boards (list):  boards in the layout of Connect4.get_board (all of this board size)
+            icon (str):     icon of the player to move
+
+        Returns:
+            tuple:  (own, opponent) boolean arrays (boards, width * height)
+        """
+        cells = np.char.upper(np.asarray(boards, dtype="<U1")).reshape(-1, self.width * self.height)
+        own = cells == icon.upper()
+        opponent = (cells != '') & ~own
+        return own, opponent
+
+    def planes_from_positions(self, positions:list) -> tuple:
+        """
+        Parameters:
+            positions (list):   bot.Position objects of this board size
+
+        Returns:
+            tuple:  (own, opponent) boolean arrays (positions, width * height), own is the player to move
+        """
+        current = np.array([position.current for position in positions], dtype=np.uint64)
+        mask = np.array([position.mask for position in positions], dtype=np.uint64)
+        own = ((current[:, None] >> self._bit_shifts) & np.uint64(1)).astype(bool)
+        filled = ((mask[:, None] >> self._bit_shifts) & np.uint64(1)).astype(bool)
+        return own, filled & ~own
+
+    def features(self, own:np.ndarray, opponent:np.ndarray) -> dict:
+        """
+        Count the features of both players
+
+        Parameters:
+            own (np.ndarray):       (boards, width * height) coins of the player to move
+            opponent (np.ndarray):  (boards, width * height) coins of the other player
+
+        Returns:
+            dict:   per feature ("twos", "threes", "threats") a pair of arrays (own counts, opponent counts)
+        """
+        own_counts = own[:, self.windows].sum(axis=2)          # (boards, windows)
+        opponent_counts = opponent[:, self.windows].sum(axis=2)
+        # a cell is playable, if it is empty and the cell below is filled (or it is on the bottom row)
+        filled = (own | opponent).reshape(-1, self.width, self.height)
+        heights = filled.sum(axis=2)                            # (boards, width)
+        empty_in_window = ~(own | opponent)[:, self.windows]    # (boards, windows, 4)
+        playable = (heights[:, self._window_x] == self._window_y) & empty_in_window
+        window_playable = playable.any(axis=2)
+
+        result = {}
+        for name, counts, other in (("own", own_counts, opponent_counts), ("opponent", opponent_counts, own_counts)):
+            open_windows = other == 0
+            threes = open_windows & (counts == 3)
+            result.setdefault("twos", []).append((open_windows & (counts == 2)).sum(axis=1))
+            result.setdefault("threes", []).append(threes.sum(axis=1))
+            result.setdefault("threats", []).append((threes & window_playable).sum(axis=1))
+        return {name: tuple(values) for name, values in result.items()}
+
+    def evaluate(self, own:np.ndarray, opponent:np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray:     score per board from the view of the player to move
+        """
+        features = self.features(own, opponent)
+        scores = np.zeros(own.shape[0])
+        for name, (own_counts, opponent_counts) in features.items():
+            scores += self.weights[name] * (own_counts - opponent_counts)
+        # the player to move wins with an immediate threat
+        scores[features["threats"][0] > 0] = WIN_SCORE
+        return scores
+
+    def evaluate_boards(self, boards, icon:str) -> np.ndarray:
+        """scores of boards in the layout of Connect4.get_board, from the view of icon (the player to move)"""
+        return self.evaluate(*self.planes_from_boards(boards, icon))
+
+    def evaluate_positions(self, positions:list) -> np.ndarray:
+        """scores of bot.Position objects, from the view of the player to move"""
+        return self.evaluate(*self.planes_from_positions(positions))
+
+    def evaluate_children(self, position) -> list:
+        """
+        Score all moves of a position in one batch
+
+        Parameters:
+            position (Position):    bot.Position
+
+        Returns:
+            list:   score per column from the view of the player to move (None for full columns,
+                    WIN_SCORE for winning moves)
+        """
+        scores = [None] * self.width
+        children = []
+        columns = []
+        for column in range(self.width):
+            if not position.can_play(column):
+                continue
+            if position.is_winning_move(column):
+                scores[column] = WIN_SCORE
+                continue
+            child = position.copy()
+            child.play(column)
+            children.append(child)
+            columns.append(column)
+        if children:
+            # the children are scored from the view of the opponent
+            for column, score in zip(columns, -self.evaluate_positions(children)):
+                scores[column] = float(score)
+        return scores
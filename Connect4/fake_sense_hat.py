@@ -0,0 +1,218 @@
+"""
+In-process stand-in for the Sense HAT, to run and measure the Raspberry Pi code paths without hardware
+
+FakeSenseHat implements the parts of sense_hat.SenseHat the players use (LED matrix and joystick):
+    - the LED framebuffer is kept in memory and every write can be recorded
+    - joystick events come from a scripted queue (stick.push / stick.script)
+    - every LED write can be delayed by a configurable latency, modelling the cost of the I2C bus
+    - the number and the duration of the writes and the input latency (time between an event being queued
+      and the player receiving it) are measured
+
+create_sense_hat selects the Sense HAT when a coordinator starts:
+    CONNECT4_SENSE_HAT=auto     (default) the real Sense HAT if one is attached, otherwise none (terminal players)
+    CONNECT4_SENSE_HAT=real     always the real Sense HAT
+    CONNECT4_SENSE_HAT=fake     the FakeSenseHat, configured with
+                                    CONNECT4_SENSE_SCRIPT           joystick events, e.g. "right,right,middle"
+                                    CONNECT4_SENSE_CALL_LATENCY     seconds per LED write call
+                                    CONNECT4_SENSE_PIXEL_LATENCY    seconds per written pixel
+    CONNECT4_SENSE_HAT=none     no Sense HAT
+"""
+
+import collections
+import os
+import threading
+import time
+
+# same as sense_hat.stick.InputEvent
+InputEvent = collections.namedtuple("InputEvent", ("timestamp", "direction", "action"))
+
+DIRECTION_UP = "up"
+DIRECTION_DOWN = "down"
+DIRECTION_LEFT = "left"
+DIRECTION_RIGHT = "right"
+DIRECTION_MIDDLE = "middle"
+ACTION_PRESSED = "pressed"
+ACTION_RELEASED = "released"
+ACTION_HELD = "held"
+
+# file that exists if a HAT is attached to the Raspberry Pi
+# https://raspberrypi.stackexchange.com/questions/39153/how-to-detect-what-kind-of-hat-or-gpio-board-is-plugged-in-if-any
+HAT_PRODUCT_FILE = r"/proc/device-tree/hat/product"
+
+
+class FakeStick:
+    """
+    Joystick with a scripted event queue (same interface as sense_hat.stick.SenseStick)
+
+    Attributes:
+        input_latencies (list):     seconds between queueing and delivering each event
+    """
+
+    def __init__(self) -> None:
+        self._events = collections.deque()
+        self._condition = threading.Condition()
+        self.input_latencies = []
+
+    def push(self, direction:str, action:str = ACTION_PRESSED) -> None:
+        """queue a single event (can be called from another thread while a player waits for input)"""
+        with self._condition:
+            self._events.append(InputEvent(time.time(), direction, action))
+            self._condition.notify_all()
+
+    def script(self, directions) -> None:
+        """queue a press and a release for every direction, e.g. script(["right", "middle"])"""
+        for direction in directions:
+            self.push(direction, ACTION_PRESSED)
+            self.push(direction, ACTION_RELEASED)
+
+    def _take(self) -> InputEvent:
+        event = self._events.popleft()
+        self.input_latencies.append(time.time() - event.timestamp)
+        return event
+
+    def wait_for_event(self, emptybuffer:bool = False, timeout:float = None) -> InputEvent:
+        """
+        Block until an event is available (the real joystick has no timeout, the fake one has one to avoid hanging tests)
+
+        Returns:
+            InputEvent:     the next event, None if the timeout expired
+        """
+        with self._condition:
+            if emptybuffer:
+                self._events.clear()
+            if not self._condition.wait_for(lambda: self._events, timeout):
+                return None
+            return self._take()
+
+    def get_events(self) -> list:
+        """returns all queued events without blocking"""
+        with self._condition:
+            events = []
+            while self._events:
+                events.append(self._take())
+            return events
+
+    def pending(self) -> int:
+        """number of queued events"""
+        with self._condition:
+            return len(self._events)
+
+
+class FakeSenseHat:
+    """
+    Sense HAT with an in-memory LED framebuffer and a scripted joystick
+
+    Attributes:
+        stick (FakeStick):          the joystick
+        call_latency (float):       seconds every LED write call takes
+        pixel_latency (float):      additional seconds per written pixel
+        record_frames (bool):       store a copy of the framebuffer after every write in frames
+        frames (list):              recorded framebuffers (lists of 64 colors)
+        messages (list):            texts passed to show_message
+        stats (dict):               number of write calls, written pixels and seconds spent writing
+    """
+
+    def __init__(self, call_latency:float = 0.0, pixel_latency:float = 0.0, record_frames:bool = False,
+                 script = None) -> None:
+        self.stick = FakeStick()
+        self.call_latency = call_latency
+        self.pixel_latency = pixel_latency
+        self.record_frames = record_frames
+        self.frames = []
+        self.messages = []
+        self.low_light = False
+        self.rotation = 0
+        self._pixels = [(0, 0, 0)] * 64
+        self._lock = threading.Lock()
+        self.stats = {"set_pixels_calls": 0, "set_pixel_calls": 0, "pixels_written": 0, "write_seconds": 0.0}
+        if script:
+            self.stick.script(script)
+
+    def _write(self, pixels:int, kind:str) -> None:
+        """simulates the bus latency and updates the statistics"""
+        start = time.perf_counter()
+        delay = self.call_latency + pixels * self.pixel_latency
+        if delay > 0:
+            time.sleep(delay)
+        self.stats[kind] += 1
+        self.stats["pixels_written"] += pixels
+        self.stats["write_seconds"] += time.perf_counter() - start
+        if self.record_frames:
+            self.frames.append(list(self._pixels))
+
+    @staticmethod
+    def _color(pixel) -> tuple:
+        if len(pixel) != 3 or any(not 0 <= value <= 255 for value in pixel):
+            raise ValueError(f"pixel {pixel} must be a (r, g, b) with values from 0 to 255")
+        return tuple(int(value) for value in pixel)
+
+    def set_pixels(self, pixel_list:list) -> None:
+        if len(pixel_list) != 64:
+            raise ValueError("pixel lists must have 64 elements")
+        with self._lock:
+            self._pixels = [self._color(pixel) for pixel in pixel_list]
+            self._write(64, "set_pixels_calls")
+
+    def set_pixel(self, x:int, y:int, *args) -> None:
+        pixel = args[0] if len(args) == 1 else args
+        if not (0 <= x < 8 and 0 <= y < 8):
+            raise ValueError("x and y must be between 0 and 7")
+        with self._lock:
+            self._pixels[y * 8 + x] = self._color(pixel)
+            self._write(1, "set_pixel_calls")
+
+    def get_pixels(self) -> list:
+        with self._lock:
+            return [list(pixel) for pixel in self._pixels]
+
+    def get_pixel(self, x:int, y:int) -> list:
+        with self._lock:
+            return list(self._pixels[y * 8 + x])
+
+    def clear(self, *args) -> None:
+        color = (0, 0, 0) if not args else (args[0] if len(args) == 1 else args)
+        self.set_pixels([color] * 64)
+
+    def show_message(self, text_string:str, *args, **kwargs) -> None:
+        self.messages.append(text_string)
+
+    def set_rotation(self, r:int = 0, redraw:bool = True) -> None:
+        self.rotation = r
+
+    def report(self) -> dict:
+        """
+        Returns:
+            dict:   the write statistics and the input latency (mean and max in ms)
+        """
+        latencies = self.stick.input_latencies
+        return dict(self.stats,
+                    events=len(latencies),
+                    input_latency_mean_ms=1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                    input_latency_max_ms=1000 * max(latencies) if latencies else 0.0)
+
+
+def create_sense_hat(mode:str = None):
+    """
+    Select the Sense HAT for a coordinator
+
+    Parameters:
+        mode (str):     "auto", "real", "fake" or "none" (default: environment variable CONNECT4_SENSE_HAT or "auto")
+
+    Returns:
+        SenseHat / FakeSenseHat / None:     None if the game should run in the terminal only
+    """
+    mode = mode or os.environ.get("CONNECT4_SENSE_HAT", "auto")
+    if mode == "auto":
+        # check if a SenseHat is connected. If not, the game will run in the Terminal, where this script was started.
+        mode = "real" if os.path.isfile(HAT_PRODUCT_FILE) else "none" # a Hat is attached, most likely a senseHat
+    if mode == "real":
+        from sense_hat import SenseHat #type: ignore # this commend makes pylance accept, that sense_hat does not need to be installed on windows
+        return SenseHat()
+    if mode == "fake":
+        script = os.environ.get("CONNECT4_SENSE_SCRIPT")
+        return FakeSenseHat(call_latency=float(os.environ.get("CONNECT4_SENSE_CALL_LATENCY", 0)),
+                            pixel_latency=float(os.environ.get("CONNECT4_SENSE_PIXEL_LATENCY", 0)),
+                            script=script.split(",") if script else None)
+    if mode == "none":
+        return None
+    raise ValueError(f"unknown Sense HAT mode '{mode}' (auto, real, fake or none)")
@@ -3,6 +3,8 @@ import random
 
 import numpy as np
 
+from instrumentation import traced
+
 
 class Connect4:
     """
@@ -21,13 +23,15 @@ class Connect4:
             -> executes the methods of a Game object
     """
     
-    def __init__(self, width:int = 8, height:int = 7) -> None:
+    def __init__(self, width:int = 8, height:int = 7, verbose:bool = True) -> None:
         """ 
         Init a Connect 4 Game
 
         Parameters
         - width (int) default 8       The width of the connect 4 board
         - height (int) defalut 7      The height of the connect 4 board
+        - verbose (bool) default True Print game events (e.g. the start of the game) to the console.
+                                      Set to False when many games are played in bulk (replays, analysis)
 
         Attributes:
         - Board (np array)          height x width numpy array of strings
@@ -36,6 +40,7 @@ class Connect4:
         - activeplayer (int)        the index of the active player in players
         - turn_counter (int)        which turn it is (-1 = game has not yet started)
         - winner (uuid/None)        None, when no winner is present. The winners uuid, when the game ended with a winner
+        - moves (list)              the columns of all successful moves in the order they were played (used for game records)
         """
         self.board = np.empty((width, height), dtype=str)    # Board 8x7 with zeros representing empty cells
         self.player_info = {}                       # Dictionary to map player UUID to a tuple with icon and name
@@ -43,13 +48,52 @@ class Connect4:
         self.activeplayer = 0                       # index of the active player in the list 
         self.turn_counter = -1                       # To keep track of whose turn it is
         self.winner = None                          # Holds the winner's ID when a win is detected
+        self.moves = []                             # columns of all moves played, in order (see game_record.py)
         self.width = width
         self.height = height
+        self.verbose = verbose
+
+
+    def reset(self, keep_players:bool = False, swap_players:bool = False) -> None:
+        """
+        Start a new game with the same board size, reusing this object (e.g. when many games are played in a row)
+
+        Parameters:
+        - keep_players (bool) default False   keep the registered players and their icons, the new game starts immediately
+        - swap_players (bool) default False   with keep_players: the player that moved second, moves first in the new game
+        """
+        self.board[:, :] = ''
+        self.activeplayer = 0
+        self.winner = None
+        self.moves = []
+        if keep_players and len(self.players) == 2:
+            if swap_players:
+                self.players.reverse()
+            self.turn_counter = 0
+        else:
+            self.player_info = {}
+            self.players = []
+            self.turn_counter = -1
+
+    def forfeit(self, player_id) -> bool:
+        """
+        End a running game: the player loses (e.g. ran out of time), the opponent is the winner
+
+        Parameters:
+        - player_id (uuid)  the player that forfeits
 
+        Returns:
+        - bool  True if the game was running and the player is part of it
+        """
+        if self.winner is not None or len(self.players) != 2 or player_id not in self.players:
+            return False
+        self.winner = self.players[1] if self.players[0] == player_id else self.players[0]
+        return True
 
     """
     Methods to be exposed to the API later on
     """
+    @traced("Connect4.get_status", "engine")
     def get_status(self) -> tuple:
         """
         Get the game's status.
@@ -68,7 +112,8 @@ class Connect4:
                 "turn_number":self.turn_counter}
 
 
-    def register_player(self, player_id: uuid.UUID, name: str) -> str:
+    @traced("Connect4.register_player", "engine")
+    def register_player(self, player_id: uuid.UUID, name: str, icon: str = None) -> str:
         """ 
         Register a player with a unique ID
             Save his ID as one of the local players
@@ -76,13 +121,18 @@ class Connect4:
         Parameters:
             -  player_id (UUID)    Unique ID
             -  name (str)          the Name of the player
+            -  icon (str)          Optional: request a specific icon ('X' or 'O'), e.g. to replay a recorded game.
+                                   If None, the icon is chosen randomly for the first player
 
         Returns:
             icon (str)       Player Icon for the registering player (or None if failed)
         """
         if len(self.player_info) < 2:
-            icon = ''
-            if len(self.player_info) < 1:
+            if icon is not None:
+                # a requested icon has to be valid and must not be taken by the other player
+                if icon not in ('X', 'O') or any(info[0] == icon for info in self.player_info.values()):
+                    return None
+            elif len(self.player_info) < 1:
                 choice = np.random.rand()
                 if choice > 0.5:
                     icon = 'X'
@@ -94,12 +144,14 @@ class Connect4:
             self.player_info[player_id] = (icon, name)
             self.players.append(player_id)
             if len(self.player_info) == 2:
-                print("two players make a party")
+                if self.verbose:
+                    print("two players make a party")
                 self.turn_counter = 0
             return icon
         return None
 
 
+    @traced("Connect4.get_board", "engine")
     def get_board(self)-> np.ndarray:
         """ 
         Return the current board state (For Example an Array of all Elements)
@@ -110,6 +162,7 @@ class Connect4:
         return self.board
 
 
+    @traced("Connect4.check_move", "engine")
     def check_move(self, column:int, id:str = None, icon:str = None) -> bool:
         """ 
         Check move of a certain player is legal
@@ -132,6 +185,7 @@ class Connect4:
         for i in range(len(self.board[column])):
             if self.board[column][i] == '':
                 self.board[column][i] = icon
+                self.moves.append(column)
                 self.__update_status()
                 return True
         else:
@@ -152,6 +206,7 @@ class Connect4:
         self.turn_counter += 1
     
 
+    @traced("Connect4.detect_win", "engine")
     def __detect_win(self)->bool:
         """ 
         Detect if someone has won the game (4 consecutive same pieces).
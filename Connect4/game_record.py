@@ -0,0 +1,321 @@
+"""
+Compact game records
+
+A record consists of a small header (board size, player names, who started, the result)
+and a move string with one character per move (the column, see MOVE_CHARACTERS).
+Records can be appended to two kinds of logs:
+    - NDJSON (.ndjson / .jsonl):    one json object per line, human readable
+    - binary (every other suffix):  a fixed size header followed by the names and the moves packed as nibbles
+
+Both formats can be read back one record at a time, so logs of arbitrary size can be streamed (see record_analyzer.py).
+"""
+
+import json
+import struct
+import time
+
+from game import Connect4
+
+# one character per column. Supports boards up to 36 columns in the NDJSON format
+MOVE_CHARACTERS = "0123456789abcdefghijklmnopqrstuvwxyz"
+_MOVE_VALUES = {character: column for column, character in enumerate(MOVE_CHARACTERS)}
+
+# result codes of a record
+RESULT_UNFINISHED = None
+RESULT_DRAW = 0
+RESULT_FIRST_WINS = 1
+RESULT_SECOND_WINS = 2
+
+# binary layout: magic, width, height, flags, length of name 1, length of name 2, number of moves, unix time
+# flags: bit 0-1 result (0 unfinished, 1 first wins, 2 second wins, 3 draw), bit 2 set if the first player is 'O'
+BINARY_MAGIC = b"C4"
+BINARY_HEADER = struct.Struct("<2sBBBBBHI")
+_BINARY_RESULT = {RESULT_UNFINISHED: 0, RESULT_FIRST_WINS: 1, RESULT_SECOND_WINS: 2, RESULT_DRAW: 3}
+_BINARY_RESULT_DECODE = {value: key for key, value in _BINARY_RESULT.items()}
+
+
+class GameRecord:
+    """
+    Header and move string of a single game
+
+    Attributes:
+        width (int):        width of the board
+        height (int):       height of the board
+        players (tuple):    names of the (first, second) player. The first player made the first move
+        first_icon (str):   icon of the first player ('X' or 'O')
+        moves (str):        the played columns, one character per move (see MOVE_CHARACTERS)
+        result (int/None):  RESULT_FIRST_WINS, RESULT_SECOND_WINS, RESULT_DRAW or None if the game did not finish
+        timestamp (int):    unix time at which the record was created
+    """
+
+    __slots__ = ("width", "height", "players", "first_icon", "moves", "result", "timestamp")
+
+    def __init__(self, width:int, height:int, moves:str, players:tuple = ("", ""),
+                 first_icon:str = 'X', result:int = RESULT_UNFINISHED, timestamp:int = None) -> None:
+        self.width = width
+        self.height = height
+        self.players = tuple(players)
+        self.first_icon = first_icon
+        self.moves = moves
+        self.result = result
+        self.timestamp = int(time.time()) if timestamp is None else timestamp
+
+    @classmethod
+    def from_game(cls, game:Connect4) -> "GameRecord":
+        """
+        Create a record of a local Connect4 game (finished or not)
+
+        Parameters:
+            game (Connect4):    the game to record. The game needs to have two registered players
+
+        Returns:
+            GameRecord:         the record of the game
+        """
+        first_id, second_id = game.players
+        if game.winner is None:
+            result = RESULT_DRAW if game.turn_counter >= game.width * game.height else RESULT_UNFINISHED
+        elif str(game.winner) == str(first_id):
+            result = RESULT_FIRST_WINS
+        else:
+            result = RESULT_SECOND_WINS
+        return cls(width=game.width, height=game.height,
+                   moves=encode_moves(game.moves),
+                   players=(game.player_info[first_id][1], game.player_info[second_id][1]),
+                   first_icon=game.player_info[first_id][0],
+                   result=result)
+
+    def columns(self) -> list:
+        """
+        Returns:
+            list:   the played columns as integers
+        """
+        return decode_moves(self.moves)
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict:   the record as a json serializable dictionary (one line of an NDJSON log)
+        """
+        return {"width": self.width, "height": self.height,
+                "players": list(self.players), "first": self.first_icon,
+                "result": self.result, "time": self.timestamp,
+                "moves": self.moves}
+
+    @classmethod
+    def from_dict(cls, data:dict) -> "GameRecord":
+        """
+        Inverse of to_dict
+        """
+        return cls(width=data["width"], height=data["height"], moves=data["moves"],
+                   players=data.get("players", ("", "")), first_icon=data.get("first", 'X'),
+                   result=data.get("result"), timestamp=data.get("time", 0))
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns:
+            bytes:  the record in the binary log format
+        """
+        if self.width > 16:
+            raise ValueError("the binary record format supports boards with up to 16 columns")
+        # names are limited to 255 bytes (cut without splitting a multi byte character)
+        name1, name2 = (name.encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8") for name in self.players)
+        flags = _BINARY_RESULT[self.result] | (4 if self.first_icon == 'O' else 0)
+        header = BINARY_HEADER.pack(BINARY_MAGIC, self.width, self.height, flags,
+                                    len(name1), len(name2), len(self.moves), self.timestamp)
+        return header + name1 + name2 + _pack_nibbles(self.columns())
+
+    @classmethod
+    def from_bytes(cls, header:bytes, body:bytes) -> "GameRecord":
+        """
+        Inverse of to_bytes, split into the fixed size header and the variable size body
+        (use binary_body_size to find out how many bytes the body has)
+        """
+        magic, width, height, flags, len1, len2, n_moves, timestamp = BINARY_HEADER.unpack(header)
+        if magic != BINARY_MAGIC:
+            raise ValueError("not a binary game record (wrong magic bytes)")
+        name1 = body[:len1].decode("utf-8")
+        name2 = body[len1:len1 + len2].decode("utf-8")
+        moves = encode_moves(_unpack_nibbles(body[len1 + len2:], n_moves))
+        return cls(width=width, height=height, moves=moves, players=(name1, name2),
+                   first_icon='O' if flags & 4 else 'X',
+                   result=_BINARY_RESULT_DECODE[flags & 3], timestamp=timestamp)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"GameRecord({self.width}x{self.height}, players={self.players}, result={self.result}, moves='{self.moves}')"
+
+
+def encode_moves(columns) -> str:
+    """
+    Encode a sequence of columns as a move string
+    """
+    return "".join(MOVE_CHARACTERS[column] for column in columns)
+
+
+def decode_moves(moves:str) -> list:
+    """
+    Decode a move string to a list of columns
+    """
+    return [_MOVE_VALUES[character] for character in moves]
+
+
+def binary_body_size(header:bytes) -> int:
+    """
+    Returns:
+        int:    the number of bytes following the given binary header
+    """
+    _, _, _, _, len1, len2, n_moves, _ = BINARY_HEADER.unpack(header)
+    return len1 + len2 + (n_moves + 1) // 2
+
+
+def _pack_nibbles(columns:list) -> bytes:
+    """packs two columns (0-15) into each byte"""
+    if len(columns) % 2:
+        columns = columns + [0]
+    return bytes((columns[i] << 4) | columns[i + 1] for i in range(0, len(columns), 2))
+
+
+def _unpack_nibbles(data:bytes, count:int) -> list:
+    """inverse of _pack_nibbles"""
+    columns = []
+    for byte in data:
+        columns.append(byte >> 4)
+        columns.append(byte & 15)
+    return columns[:count]
+
+
+def is_ndjson(path:str) -> bool:
+    """
+    Returns:
+        bool:   True if the log at path uses the NDJSON format (decided by the file suffix)
+    """
+    return path.endswith(".ndjson") or path.endswith(".jsonl")
+
+
+class GameRecordWriter:
+    """
+    Appends game records to a log file. The format is chosen by the file suffix (see is_ndjson)
+
+    Can be used as a context manager:
+        with GameRecordWriter("games.ndjson") as writer:
+            writer.write(GameRecord.from_game(game))
+    """
+
+    def __init__(self, path:str) -> None:
+        """
+        Parameters:
+            path (str):     the log file. It is created if it does not exist, otherwise records are appended
+        """
+        self.path = path
+        self.ndjson = is_ndjson(path)
+        self.file = open(path, "a", encoding="utf-8") if self.ndjson else open(path, "ab")
+
+    def write(self, record:GameRecord) -> None:
+        """appends a single record to the log"""
+        if self.ndjson:
+            self.file.write(json.dumps(record.to_dict(), separators=(",", ":")) + "\n")
+        else:
+            self.file.write(record.to_bytes())
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "GameRecordWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def append_record(path:str, record:GameRecord) -> None:
+    """
+    Append a single record to the log at path (opens and closes the file)
+    """
+    with GameRecordWriter(path) as writer:
+        writer.write(record)
+
+
+def read_records(path:str):
+    """
+    Read a log one record at a time
+
+    Parameters:
+        path (str):     the log file (NDJSON or binary, decided by the file suffix)
+
+    Yields:
+        GameRecord:     the records in the order they were written
+    """
+    if is_ndjson(path):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield GameRecord.from_dict(json.loads(line))
+        return
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(BINARY_HEADER.size)
+            if not header:
+                return
+            if len(header) < BINARY_HEADER.size:
+                raise ValueError(f"truncated game record at the end of {path}")
+            yield GameRecord.from_bytes(header, file.read(binary_body_size(header)))
+
+
+class MoveTracker:
+    """
+    Reconstructs the move order of a game that is only observed through its board (e.g. a remote game).
+
+    The own moves are reported explicitly, all other new coins found on the board are attributed to the opponent.
+    As long as the board is observed at least once per opponent move, the order is exact.
+    """
+
+    def __init__(self, width:int, height:int) -> None:
+        self.width = width
+        self.height = height
+        self.columns = []               # the columns of all moves in order
+        self.icons = []                 # the icon that made each move
+        self.heights = [0] * width      # number of coins per column that are already accounted for
+
+    def observe(self, board, own_column:int = None, own_icon:str = None) -> None:
+        """
+        Account for all coins on the board that were not seen before
+
+        Parameters:
+            board (Array):      the board in the layout of Connect4.get_board (board[x][y], y=0 is the bottom)
+            own_column (int):   the column of an own move made since the last observation (recorded first)
+            own_icon (str):     the icon of the own player
+        """
+        if own_column is not None:
+            self.columns.append(own_column)
+            self.icons.append(own_icon)
+            self.heights[own_column] += 1
+        for x in range(self.width):
+            while self.heights[x] < self.height and board[x][self.heights[x]] != '':
+                self.columns.append(x)
+                self.icons.append(str(board[x][self.heights[x]]).upper()) # winning coins are lowercase
+                self.heights[x] += 1
+
+    def record(self, players:tuple, own_icon:str, winner_icon:str = None) -> GameRecord:
+        """
+        Create a record of the observed game
+
+        Parameters:
+            players (tuple):        names of the (own player, opponent)
+            own_icon (str):         the icon of the own player
+            winner_icon (str):      icon of the winner, None if there is none (yet)
+        """
+        first_icon = self.icons[0] if self.icons else own_icon
+        if first_icon != own_icon:
+            players = (players[1], players[0])
+        if winner_icon is not None:
+            result = RESULT_FIRST_WINS if winner_icon == first_icon else RESULT_SECOND_WINS
+        elif len(self.columns) >= self.width * self.height:
+            result = RESULT_DRAW
+        else:
+            result = RESULT_UNFINISHED
+        return GameRecord(self.width, self.height, encode_moves(self.columns),
+                          players=players, first_icon=first_icon, result=result)
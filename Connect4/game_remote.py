@@ -3,19 +3,105 @@ import numpy as np
 import requests
 import json # used to read ip's from file
 import os # used to read ip's from file
+import time # deadline of the lobby, waiting for Retry-After
+
+from instrumentation import traced
+
+
+def decode_board(returned_board:list) -> np.ndarray:
+    """
+    Convert a board in the format of the api (list of rows, row 0 is the top) to the layout of Connect4.get_board
+
+    Parameters:
+        returned_board (list):  the board as returned by /connect4/board
+
+    Returns:
+        board (Array):          board[x][y], y=0 is the bottom
+    """
+    # in the specification, the y axis 0 position is at the top. ours is at the bottom. that's why they have to be flipped.
+    # x and y get switched too
+    board = np.array(
+        [
+            [returned_board[row][collumn] for row in range(len(returned_board)-1, -1, -1)] # construct a collumn (flipping the entries, to make zero at the bottom of the board)
+            for collumn in range(len(returned_board[0]))
+        ]
+    )
+    return board
+
+
+def send_request(method:str, url:str, max_retries:int = 5, **kwargs) -> requests.Response:
+    """
+    Send a request. If the server asks to come back later (429 or 503 with Retry-After),
+    wait the given time and send the request again (at most max_retries times)
+
+    Returns:
+        Response:   the last response
+    """
+    for attempt in range(max_retries + 1):
+        response = requests.request(method, url, **kwargs)
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code not in (429, 503) or retry_after is None or attempt == max_retries:
+            return response
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            delay = 1.0 # Retry-After can also be a http date
+        response.close()
+        time.sleep(delay)
+    return response
+
+
+def check_response(response) -> None:
+    """
+    Raises:
+        RuntimeError: if the status code is not in the 2xx range, with the description of the server
+    """
+    if response.status_code < 200 or response.status_code > 299:
+        print(r"a error occurred during server lookup -.- check https://developer.mozilla.org/en-US/docs/Web/HTTP/Status for more information (#notsponsored)")
+        try:
+            description = response.json().get("description")
+        except:
+            description = "the server did not return an error description"
+        raise RuntimeError(f"Server response {response.status_code, description}")
+
 
 class Connect4_remote:
     """
     Talks to a game instance on a remote server through api calls
     Other scripts can interact with this class the same way they can with the game class (after it was initiated)
     """
-    def __init__(self, url:str) -> None:
+    def __init__(self, url:str, game_id:str = None, lobby:bool = False, max_retries:int = 5) -> None:
         """
         Parameters:
             url (str)       the url of the game server
+            game_id (str)   Optional: the game on the server (default: the default game of the server)
+            lobby (bool)    Optional: register_player waits in the lobby of the server for an opponent
+                            and plays in the game the lobby creates (see join_lobby)
+            max_retries (int)   Optional: how often a request is repeated, if the server answers with 429 (rate limit)
+                            or 503 (busy) and a Retry-After header
         """
         self.url = url
+        self.game_id = game_id
+        self.lobby = lobby
+        self.max_retries = max_retries
+        self.player_id = None   # the last registered player, sent with get_status / get_board
 
+    def _params(self) -> dict:
+        """the query parameters / json fields that select the game"""
+        return {} if self.game_id is None else {"game_id": self.game_id}
+
+    def _query(self) -> dict:
+        """the query parameters of get_status / get_board: the game and the player (rate limited per player)"""
+        params = self._params()
+        if self.player_id is not None:
+            params["player_id"] = self.player_id
+        return params
+
+    def _request(self, method:str, path:str, **kwargs) -> requests.Response:
+        """send a request to the server, honouring Retry-After (see send_request)"""
+        return send_request(method, self.url + path, self.max_retries, **kwargs)
+
+    @traced("Connect4_remote.get_status", "http")
     def get_status(self) -> tuple:
         """
         Get the game's status.
@@ -24,7 +110,7 @@ class Connect4_remote:
             - what turn is it?
                 <-1> means the game hasn't started yet
         """
-        response = requests.get(self.url+"/connect4/status")
+        response = self._request("GET", "/connect4/status", params=self._query())
         self.__check_response(response)
         active_player = response.json().get("active_player")
         active_id = response.json().get("active_id")
@@ -35,6 +121,7 @@ class Connect4_remote:
                 "winner":winner,
                 "turn_number":turn_number}
 
+    @traced("Connect4_remote.register_player", "http")
     def register_player(self, player_id:uuid.UUID, name: str = None):
         """ 
         Register a player with a unique ID
@@ -47,13 +134,17 @@ class Connect4_remote:
         Returns:
             icon:       Player Icon (or None if failed)
         """
-        Player = {"player_id" : str(player_id), "name" : name}
+        if self.lobby:
+            return self.join_lobby(player_id, name)
+        Player = {"player_id" : str(player_id), "name" : name, **self._params()}
 
-        response = requests.post(self.url+"/connect4/register", json=Player)
+        response = self._request("POST", "/connect4/register", json=Player)
         self.__check_response(response)
+        self.player_id = str(player_id)
         return response.json().get("icon")
 
 
+    @traced("Connect4_remote.get_board", "http")
     def get_board(self)-> np.ndarray:
         """ 
         Return the current board state
@@ -61,19 +152,11 @@ class Connect4_remote:
         Returns:
             board (Array)
         """
-        response = requests.get(self.url+"/connect4/board")
+        response = self._request("GET", "/connect4/board", params=self._query())
         self.__check_response(response)
-        returned_board = response.json().get("board")
-        # in the specification, the y axis 0 position is at the top. ours is at the bottom. that's why they have to be flipped.
-        # x and y get switched too
-        board = np.array(
-            [
-                [returned_board[row][collumn] for row in range(len(returned_board)-1, -1, -1)] # construct a collumn (flipping the entries, to make zero at the bottom of the board)
-                for collumn in range(len(returned_board[0]))
-            ]
-        )
-        return board
+        return decode_board(response.json().get("board"))
 
+    @traced("Connect4_remote.check_move", "http")
     def check_move(self, column:int, player_id:uuid) -> bool:
         """ 
         Check move of a certain player is legal
@@ -87,8 +170,8 @@ class Connect4_remote:
         Returns:
             bool    True if the move was valid, false otherwise
         """
-        move = {"column":column, "player_id":str(player_id)}
-        response = requests.post(self.url+"/connect4/check_move", json=move)
+        move = {"column":column, "player_id":str(player_id), **self._params()}
+        response = self._request("POST", "/connect4/check_move", json=move)
         if response.status_code == 400:
             return False
         if response.status_code == 200:
@@ -98,6 +181,85 @@ class Connect4_remote:
         # this is undefined behaviour, thus we raise an error
         raise RuntimeError(f"Server response not as specified by the api: {response.status_code}")
 
+    @traced("Connect4_remote.add_engine", "http")
+    def add_engine(self, depth:int = None) -> str:
+        """
+        Let an engine of the server join the game as opponent ("play vs computer")
+
+        Parameters:
+            depth (int):    search depth of the engine (default: the depth configured on the server)
+
+        Returns:
+            icon:   the icon of the engine
+        """
+        engine = self._params() if depth is None else {"depth": depth, **self._params()}
+        response = self._request("POST", "/connect4/engine", json=engine)
+        self.__check_response(response)
+        return response.json().get("icon")
+
+    @traced("Connect4_remote.join_lobby", "http")
+    def join_lobby(self, player_id:uuid.UUID, name:str = None, timeout:float = None, poll_timeout:float = 25) -> str:
+        """
+        Wait in the lobby of the server until it paired this player with an opponent in a new game.
+        Every request waits on the server until the pairing happened (long poll), so there is no polling.
+        The following requests of this object go to the new game.
+
+        Parameters:
+            timeout (float):        give up after this many seconds (default: wait until paired)
+            poll_timeout (float):   seconds the server holds a single request open
+
+        Returns:
+            icon:   Player Icon in the new game
+
+        Raises:
+            TimeoutError: if no opponent was found within the timeout (the player leaves the lobby)
+        """
+        response = self._request("POST", "/connect4/lobby", json={"player_id": str(player_id), "name": name})
+        self.__check_response(response)
+        ticket = response.json()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while ticket.get("status") != "matched":
+            remaining = poll_timeout if deadline is None else min(poll_timeout, deadline - time.monotonic())
+            if remaining <= 0:
+                self._request("DELETE", "/connect4/lobby", params={"player_id": str(player_id)})
+                raise TimeoutError("no opponent found in the lobby")
+            response = self._request("GET", "/connect4/lobby", params={"player_id": str(player_id), "timeout": remaining},
+                                     timeout=remaining + 10)
+            self.__check_response(response)
+            ticket = response.json()
+        self.game_id = ticket["game_id"]
+        self.player_id = str(player_id)
+        return ticket["icon"]
+
+    def spectate(self):
+        """
+        Watch the game: the server pushes every change (Server-Sent Events of /connect4/spectate), no polling needed.
+        The first event is the current state. The stream ends if the server drops this spectator for reading too slowly.
+
+        Yields:
+            tuple:  (event name, data), data contains the board (decoded, see decode_board), the status and
+                    the fields of the event (e.g. column and icon of a move)
+        """
+        response = self._request("GET", "/connect4/spectate", params=self._params(), stream=True)
+        self.__check_response(response)
+        with response:
+            event, data = "message", []
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    field, _, value = line.partition(":")
+                    if field == "event":
+                        event = value.strip()
+                    elif field == "data":
+                        data.append(value.strip())
+                    continue
+                # an empty line ends a message (comment lines like the heartbeat have no data)
+                if data:
+                    message = json.loads("\n".join(data))
+                    if "board" in message:
+                        message["board"] = decode_board(message["board"])
+                    yield event, message
+                event, data = "message", []
+
     def __check_response(self, response):
         """
         Validate the HTTP response from the server.
@@ -115,13 +277,87 @@ class Connect4_remote:
             RuntimeError: Raised if the status code is not in the 2xx range, 
                         with an appropriate error message.
         """
-        if response.status_code < 200 or response.status_code > 299:
-            print(r"a error occurred during server lookup -.- check https://developer.mozilla.org/en-US/docs/Web/HTTP/Status for more information (#notsponsored)")
-            try:
-                description = response.json().get("description")
-            except:
-                description = "the server did not return an error description"
-            raise RuntimeError(f"Server response {response.status_code, description}")
+        check_response(response)
+
+
+class Connect4_remote_batch:
+    """
+    Talks to many games on one server with few api calls (/connect4/batch), for clients that play many games
+    at once (e.g. a farm of bots): one request fetches the state of all games, one request sends all moves.
+    """
+    def __init__(self, url:str, max_retries:int = 5, batch_size:int = 256) -> None:
+        """
+        Parameters:
+            url (str)           the url of the game server
+            max_retries (int)   Optional: how often a request (or an item answered with 429 or 503) is repeated
+            batch_size (int)    Optional: games / moves per request, larger batches are split
+                                (at most the batch_limit of the server)
+        """
+        self.url = url
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+
+    @traced("Connect4_remote_batch.get_states", "http")
+    def get_states(self, game_ids:list) -> dict:
+        """
+        Get the status and board of many games
+
+        Parameters:
+            game_ids (list):    ids of the games (None: the default game)
+
+        Returns:
+            dict:   game id -> {"status", "board" (decoded, see decode_board), "clock" (with time control)},
+                    None for unknown games
+        """
+        states = {}
+        for start in range(0, len(game_ids), self.batch_size):
+            chunk = list(game_ids[start:start + self.batch_size])
+            response = send_request("POST", self.url+"/connect4/batch/state", self.max_retries, json={"game_ids": chunk})
+            check_response(response)
+            for game_id, game in zip(chunk, response.json()["games"]):
+                if game.get("code") != 200:
+                    states[game_id] = None
+                    continue
+                game["board"] = decode_board(game["board"])
+                states[game_id] = game
+        return states
+
+    @traced("Connect4_remote_batch.check_moves", "http")
+    def check_moves(self, moves:list) -> list:
+        """
+        Make moves in many games. Every move is checked on its own, like with Connect4_remote.check_move.
+        Moves against a busy engine (503) and moves of a rate limited player (429) are sent again after the time
+        the server asks for.
+
+        Parameters:
+            moves (list):   (game id, column, player id) per move
+
+        Returns:
+            list:   result per move: {"game_id", "ok" (True if the move was applied), "code" (as check_move would have
+                    been answered: 200, 400 illegal move, 404 unknown game, 429 rate limited, 503 engine busy),
+                    "description"}
+        """
+        items = [{"game_id": game_id, "column": column, "player_id": str(player_id)}
+                 for game_id, column, player_id in moves]
+        results = [None] * len(items)
+        pending = list(range(len(items)))
+        for attempt in range(self.max_retries + 1):
+            retry, retry_after = [], 0.0
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                response = send_request("POST", self.url+"/connect4/batch/moves", self.max_retries,
+                                        json={"moves": [items[index] for index in chunk]})
+                check_response(response)
+                for index, result in zip(chunk, response.json()["results"]):
+                    results[index] = result
+                    if result.get("code") in (429, 503) and "retry_after" in result:
+                        retry.append(index)
+                        retry_after = max(retry_after, result["retry_after"])
+            if not retry or attempt == self.max_retries:
+                break
+            pending = retry
+            time.sleep(retry_after)
+        return results
 
 if __name__ == "__main__":
     adresspath = "ip_address.json"
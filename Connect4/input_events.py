@@ -0,0 +1,231 @@
+"""
+Event driven input
+
+The EventMux waits for all event sources of a client at once with a selector:
+    - readable file descriptors (the keyboard on a Linux terminal)
+    - events posted by background threads (sources that can only block, like the Sense HAT joystick or
+      the keyboard on Windows, and the StatusPoller that watches the game on the server with adaptive polling)
+Threads wake the selector up through a socket pair, so waiting for events costs no CPU and every event is handled
+as soon as it arrives, no matter if it is a key press or a change of the game state.
+
+Events are tuples (kind, value), e.g. ("input", Action.left) or ("status", {...}).
+"""
+
+import collections
+import os
+import selectors
+import socket
+import sys
+import threading
+
+from polling import PollScheduler
+
+INPUT = "input"
+STATUS = "status"
+ERROR = "error"
+
+
+class EventMux:
+    """
+    Multiplexes file descriptors and events posted from threads
+    """
+
+    def __init__(self) -> None:
+        self.selector = selectors.DefaultSelector()
+        self._posted = collections.deque()
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._wakeup_sender.setblocking(False)
+        self.selector.register(self._wakeup_receiver, selectors.EVENT_READ, None)
+
+    def add_reader(self, fileobj, callback) -> None:
+        """
+        Watch a file object
+
+        Parameters:
+            fileobj:            file object or descriptor that supports select (on Windows: sockets only)
+            callback:           called with the file object when it is readable, returns a list of events
+        """
+        self.selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fileobj) -> None:
+        self.selector.unregister(fileobj)
+
+    def post(self, kind:str, value = None) -> None:
+        """queue an event (thread safe) and wake up wait"""
+        self._posted.append((kind, value))
+        try:
+            self._wakeup_sender.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass # the buffer is full, wait will wake up anyway
+
+    def wait(self, timeout:float = None) -> list:
+        """
+        Wait until at least one event is available
+
+        Parameters:
+            timeout (float):    maximum time to wait in seconds (None: wait forever)
+
+        Returns:
+            list:   the events (kind, value), empty if the timeout expired
+        """
+        events = []
+        if not self._posted:
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self._drain_wakeup()
+                else:
+                    events.extend(key.data(key.fileobj) or [])
+        while self._posted:
+            events.append(self._posted.popleft())
+        return events
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._wakeup_receiver.recv(1024):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self) -> None:
+        self.selector.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+
+
+class ThreadSource:
+    """
+    Runs a blocking read function in a background thread and posts every result as event
+
+    Used for inputs that can't be selected (Sense HAT joystick, keyboard on Windows).
+    """
+
+    def __init__(self, mux:EventMux, read, kind:str = INPUT) -> None:
+        """
+        Parameters:
+            mux (EventMux):     where the events are posted to
+            read:               blocking function without arguments that returns the next value
+            kind (str):         kind of the posted events
+        """
+        self.mux = mux
+        self.read = read
+        self.kind = kind
+        self.running = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.running = True
+        self.thread.start()
+
+    def stop(self) -> None:
+        # the thread can't be interrupted while it blocks in read, it is a daemon thread and ends with the program
+        self.running = False
+
+    def _run(self) -> None:
+        while self.running:
+            try:
+                value = self.read()
+            except Exception as error:
+                self.mux.post(ERROR, error)
+                return
+            if self.running and value is not None:
+                self.mux.post(self.kind, value)
+
+
+class TerminalSource:
+    """
+    Reads the keyboard of a (Linux) terminal through the selector
+
+    The terminal is switched to cbreak mode (keys are available immediately, without enter) while the source is running.
+    """
+
+    def __init__(self, mux:EventMux, decode, stream = None) -> None:
+        """
+        Parameters:
+            mux (EventMux):     the selector to register the terminal with
+            decode:             function that converts the read bytes to a list of values (e.g. Actions)
+            stream:             the terminal (default: sys.stdin)
+        """
+        self.mux = mux
+        self.decode = decode
+        self.stream = stream or sys.stdin
+        self._saved_mode = None
+
+    @staticmethod
+    def available(stream = None) -> bool:
+        """True if the terminal can be read with a selector (a tty on a posix system)"""
+        stream = stream or sys.stdin
+        return os.name == "posix" and hasattr(stream, "isatty") and stream.isatty()
+
+    def start(self) -> None:
+        import termios
+        import tty
+        descriptor = self.stream.fileno()
+        self._saved_mode = termios.tcgetattr(descriptor)
+        tty.setcbreak(descriptor)
+        self.mux.add_reader(descriptor, self._on_readable)
+
+    def stop(self) -> None:
+        import termios
+        descriptor = self.stream.fileno()
+        self.mux.remove_reader(descriptor)
+        if self._saved_mode is not None:
+            termios.tcsetattr(descriptor, termios.TCSADRAIN, self._saved_mode)
+            self._saved_mode = None
+
+    def _on_readable(self, descriptor) -> list:
+        data = os.read(descriptor, 64)
+        return [(INPUT, value) for value in self.decode(data)]
+
+
+class StatusPoller:
+    """
+    Polls the status of a game in a background thread and posts it whenever it changes
+
+    The interval between the polls adapts to the game (see polling.PollScheduler).
+    If the scheduler times out, a TimeoutError is posted as error event and the poller stops.
+    """
+
+    def __init__(self, mux:EventMux, game, scheduler:PollScheduler = None) -> None:
+        """
+        Parameters:
+            mux (EventMux):             where the status events are posted to
+            game:                       Connect4 or Connect4_remote
+            scheduler (PollScheduler):  decides when to poll (default: PollScheduler())
+        """
+        self.mux = mux
+        self.game = game
+        self.scheduler = scheduler or PollScheduler()
+        self.last_status = None
+        self._poke = threading.Event()
+        self._stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._poke.set()
+
+    def poke(self) -> None:
+        """poll immediately and quickly again (e.g. right after an own move)"""
+        self._poke.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._poke.clear()
+            try:
+                status = self.game.get_status()
+            except Exception as error:
+                self.mux.post(ERROR, error)
+                return
+            changed = status != self.last_status
+            if changed:
+                self.last_status = status
+                self.mux.post(STATUS, status)
+            elif self.scheduler.timed_out():
+                self.mux.post(ERROR, TimeoutError(f"the game did not change for {self.scheduler.timeout} seconds"))
+                return
+            if self._poke.wait(self.scheduler.next_delay(changed)):
+                self.scheduler.reset()
@@ -0,0 +1,174 @@
+"""
+Opt-in timing instrumentation
+
+Records timing spans of the coordinator loop, the player (input and rendering), the http calls to the server
+and the game engine, and writes them as a Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev).
+Optionally, the whole run is profiled with cProfile.
+
+Instrumentation is disabled by default. Enable it with environment variables:
+    CONNECT4_TRACE=trace.json       write the timing spans to trace.json when the program exits
+    CONNECT4_PROFILE=profile.prof   write a cProfile dump to profile.prof when the program exits (view it with pstats or snakeviz)
+or by calling enable() (the coordinators expose this as --trace / --profile).
+
+Usage in code:
+    @traced("Player_Local.visualize", "render")
+    def visualize(self): ...
+
+    with span("Coordinator_Remote.event", "coordinator", kind=kind):
+        ...
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+TRACE_ENV = "CONNECT4_TRACE"
+PROFILE_ENV = "CONNECT4_PROFILE"
+
+# upper bound of recorded spans, so a forgotten trace does not fill the memory of a long running server
+MAX_EVENTS = 1_000_000
+
+
+class Tracer:
+    """
+    Collects timing spans in the Chrome trace event format
+
+    Attributes:
+        path (str):         file the trace is written to
+        events (list):      the recorded trace events
+        dropped (int):      number of spans that were not recorded, because MAX_EVENTS was reached
+    """
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        self.events = []
+        self.dropped = 0
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name:str, category:str, start:float, end:float, args:dict = None) -> None:
+        """
+        Record a span
+
+        Parameters:
+            name (str):         name of the span
+            category (str):     category (e.g. "http", "engine", "render")
+            start (float):      time.perf_counter() at the start of the span
+            end (float):        time.perf_counter() at the end of the span
+            args (dict):        additional values that are shown with the span
+        """
+        event = {"name": name, "cat": category, "ph": "X",
+                 "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6,
+                 "pid": self.pid, "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        with self._lock:
+            if len(self.events) >= MAX_EVENTS:
+                self.dropped += 1
+                return
+            self.events.append(event)
+
+    def write(self) -> None:
+        """writes all recorded spans to the trace file"""
+        with self._lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms",
+                     "otherData": {"dropped_events": self.dropped}}
+        with open(self.path, "w") as file:
+            json.dump(trace, file)
+
+
+_tracer = None      # the active Tracer (None if tracing is disabled)
+_profiler = None    # the active cProfile.Profile (None if profiling is disabled)
+
+
+def enable(trace_path:str = None, profile_path:str = None) -> None:
+    """
+    Enable tracing and / or profiling. The results are written when the program exits.
+
+    Parameters:
+        trace_path (str):       file for the Chrome trace (None: no tracing)
+        profile_path (str):     file for the cProfile dump (None: no profiling)
+    """
+    global _tracer, _profiler
+    if trace_path and _tracer is None:
+        _tracer = Tracer(trace_path)
+        atexit.register(_tracer.write)
+    if profile_path and _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        atexit.register(_dump_profile, profile_path)
+
+
+def is_enabled() -> bool:
+    """
+    Returns:
+        bool:   True if timing spans are recorded
+    """
+    return _tracer is not None
+
+
+def _dump_profile(path:str) -> None:
+    _profiler.disable()
+    _profiler.dump_stats(path)
+
+
+class span:
+    """
+    Context manager that records the duration of its block as a span (does nothing if tracing is disabled)
+    """
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name:str, category:str = "", **args) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self) -> "span":
+        if _tracer is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # the tracer could have been enabled inside of the block, in that case there is no start time
+        if _tracer is not None and hasattr(self, "start"):
+            _tracer.add(self.name, self.category, self.start, time.perf_counter(), self.args)
+
+
+def traced(name:str = None, category:str = ""):
+    """
+    Decorator that records every call of the decorated function as a span.
+    If tracing is disabled, the only overhead is a single check per call.
+
+    Parameters:
+        name (str):         name of the span (default: the qualified name of the function)
+        category (str):     category of the span
+    """
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _tracer.add(span_name, category, start, time.perf_counter())
+        return wrapper
+    return decorator
+
+
+def add_arguments(parser) -> None:
+    """adds the --trace and --profile options to an argparse parser"""
+    parser.add_argument("--trace", metavar="FILE", help="write timing spans as a Chrome trace to FILE")
+    parser.add_argument("--profile", metavar="FILE", help="write a cProfile dump to FILE")
+
+
+# enable the instrumentation if requested by the environment
+enable(os.environ.get(TRACE_ENV), os.environ.get(PROFILE_ENV))
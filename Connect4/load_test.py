@@ -0,0 +1,333 @@
+"""
+Load generation for the Connect4Server
+
+Simulated players follow the same protocol as Coordinator_Remote (register, wait for the opponent,
+poll the status, fetch the board and submit a move when it is their turn) and choose their moves randomly or with the bot.
+Every request is timed. At the end, the throughput, the p50 / p99 latency per endpoint and the error rates are reported.
+
+Every game on the server has two seats, so the players are paired and every pair needs its own game:
+    - without --url, one local server per pair is started (each in its own process)
+    - with --url (can be given multiple times), pair i plays on url i
+    - with --lobby, all players use one server: they join its lobby, which pairs them into new games
+
+Usage:
+    python load_test.py --players 20 --poll-interval 0.1
+    python load_test.py --url http://10.147.17.27:5000 --players 2 --strategy bot
+    python load_test.py --lobby --players 200 --poll-interval 0.25
+"""
+
+import argparse
+import json
+import multiprocessing
+import socket
+import threading
+import time
+import uuid
+
+import requests
+
+from bot import Bot, random_move
+from game_remote import decode_board
+
+ENDPOINTS = ("register", "lobby", "status", "board", "check_move")
+
+
+class EndpointStats:
+    """
+    Latencies and outcomes of the requests to one endpoint (shared by all simulated players)
+
+    Attributes:
+        latencies (list):   duration of every answered request in seconds
+        errors (int):       requests that failed (connection errors and unexpected status codes)
+        rejected (int):     requests answered with 400 (e.g. illegal moves), which are part of the protocol
+        unanswered (int):   failed requests without a response (they have no latency)
+    """
+
+    def __init__(self) -> None:
+        self.latencies = []
+        self.errors = 0
+        self.rejected = 0
+        self.unanswered = 0
+        self.lock = threading.Lock()
+
+    def add(self, latency:float = None, error:bool = False, rejected:bool = False) -> None:
+        with self.lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            else:
+                self.unanswered += 1
+            self.errors += error
+            self.rejected += rejected
+
+    def summary(self, elapsed:float) -> dict:
+        """
+        Returns:
+            dict:   number of requests, requests per second, p50 / p99 latency (ms) and error rate
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            errors = self.errors
+            rejected = self.rejected
+            requests_total = len(latencies) + self.unanswered
+        return {"requests": requests_total,
+                "throughput": requests_total / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "errors": errors,
+                "rejected": rejected,
+                "error_rate": errors / requests_total if requests_total else 0.0}
+
+
+def percentile(values:list, percent:float) -> float:
+    """percentile of sorted values (nearest rank), 0 for an empty list"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(percent / 100 * len(values))) - 1))
+    return values[index]
+
+
+class SimulatedPlayer(threading.Thread):
+    """
+    A remote player that plays one game on a server
+
+    Attributes:
+        url (str):              the server
+        strategy (str):         "random" or "bot"
+        poll_interval (float):  seconds between two status requests
+        stats (dict):           EndpointStats per endpoint
+        result (str):           "win", "loss", "draw" or "aborted" after the game
+        lobby (bool):           join the lobby of the server instead of registering in the default game
+        game_id (str):          the game assigned by the lobby
+    """
+
+    def __init__(self, url:str, stats:dict, strategy:str = "random", poll_interval:float = 0.5,
+                 bot_depth:int = 4, deadline:float = None, lobby:bool = False) -> None:
+        super().__init__(daemon=True)
+        self.url = url
+        self.stats = stats
+        self.strategy = strategy
+        self.poll_interval = poll_interval
+        self.deadline = deadline
+        self.bot = Bot(depth=bot_depth) if strategy == "bot" else None
+        self.id = str(uuid.uuid4())
+        self.icon = None
+        self.result = "aborted"
+        self.cells = None # number of cells of the board, known after the first board request
+        self.lobby = lobby
+        self.game_id = None
+        self.session = requests.Session()
+
+    def request(self, endpoint:str, method:str, path:str, **kwargs):
+        """
+        Send a timed request
+
+        Returns:
+            Response:   the response, None if the request failed
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url + path, timeout=10, **kwargs)
+        except requests.RequestException:
+            self.stats[endpoint].add(error=True)
+            return None
+        latency = time.perf_counter() - start
+        if response.status_code == 400:
+            self.stats[endpoint].add(latency, rejected=True)
+        else:
+            self.stats[endpoint].add(latency, error=not 200 <= response.status_code < 300)
+        return response
+
+    def timed_out(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
+
+    def game_params(self) -> dict:
+        return {} if self.game_id is None else {"game_id": self.game_id}
+
+    def join_lobby(self) -> bool:
+        """joins the lobby and waits (long poll) until it paired this player. Returns True if a game was assigned"""
+        response = self.request("lobby", "POST", "/connect4/lobby", json={"player_id": self.id, "name": "load test"})
+        if response is None or response.status_code not in (200, 202):
+            return False
+        ticket = response.json()
+        while ticket.get("status") != "matched":
+            if self.timed_out():
+                return False
+            response = self.request("lobby", "GET", "/connect4/lobby", params={"player_id": self.id, "timeout": 5})
+            if response is None or response.status_code != 200:
+                return False
+            ticket = response.json()
+        self.game_id = ticket["game_id"]
+        self.icon = ticket["icon"]
+        return True
+
+    def run(self) -> None:
+        if self.lobby:
+            if not self.join_lobby():
+                return
+        else:
+            response = self.request("register", "POST", "/connect4/register", json={"player_id": self.id, "name": "load test"})
+            if response is None or response.status_code != 200:
+                return
+            self.icon = response.json().get("icon")
+        while not self.timed_out():
+            status = self.request("status", "GET", "/connect4/status", params=self.game_params())
+            if status is None or status.status_code != 200:
+                time.sleep(self.poll_interval)
+                continue
+            status = status.json()
+            if status["winner"] is not None:
+                self.result = "win" if status["winner"] == self.id else "loss"
+                return
+            if self.cells is not None and status["turn_number"] >= self.cells:
+                self.result = "draw"
+                return
+            if status["turn_number"] >= 0 and status["active_id"] == self.id:
+                if self.make_move():
+                    continue # check the status immediately after the own move
+            time.sleep(self.poll_interval)
+
+    def make_move(self) -> bool:
+        """fetches the board, chooses a column and submits it. Returns True if the move was accepted"""
+        response = self.request("board", "GET", "/connect4/board", params=self.game_params())
+        if response is None or response.status_code != 200:
+            return False
+        board = decode_board(response.json()["board"])
+        self.cells = board.shape[0] * board.shape[1]
+        if self.bot is not None:
+            column = self.bot.choose_move(board, self.icon)
+        else:
+            column = random_move(board)
+        response = self.request("check_move", "POST", "/connect4/check_move",
+                                json={"column": column, "player_id": self.id, **self.game_params()})
+        return response is not None and response.status_code == 200
+
+
+def _serve(port:int) -> None:
+    """process target: runs a Connect4Server without debug mode and reloader"""
+    import logging
+    from server import Connect4Server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR) # don't log every request
+    server = Connect4Server(ip_rate=None) # all simulated players share one ip
+    server.app.run(host="127.0.0.1", port=port, debug=False, threaded=True)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_local_servers(count:int, timeout:float = 15.0) -> tuple:
+    """
+    Starts servers in separate processes (so they don't compete with the simulated players for the GIL)
+
+    Returns:
+        tuple:  (list of urls, list of processes)
+    """
+    processes = []
+    urls = []
+    for _ in range(count):
+        port = _free_port()
+        process = multiprocessing.Process(target=_serve, args=(port,), daemon=True)
+        process.start()
+        processes.append(process)
+        urls.append(f"http://127.0.0.1:{port}")
+    deadline = time.time() + timeout
+    for url in urls:
+        while True:
+            try:
+                requests.get(url + "/", timeout=1)
+                break
+            except requests.RequestException:
+                if time.time() > deadline:
+                    raise RuntimeError(f"local server {url} did not start")
+                time.sleep(0.1)
+    return urls, processes
+
+
+def run_load_test(urls:list, players:int, strategy:str = "random", poll_interval:float = 0.5,
+                  bot_depth:int = 4, duration:float = None, lobby:bool = False) -> dict:
+    """
+    Let pairs of simulated players play one game per url (or all on the first url, paired by its lobby)
+
+    Parameters:
+        urls (list):            one server url per pair of players
+        players (int):          number of simulated players (must be even)
+        strategy (str):         "random" or "bot"
+        poll_interval (float):  seconds between status requests of each player
+        bot_depth (int):        search depth of the bot strategy
+        duration (float):       abort the games after this many seconds (None: until all games are finished)
+        lobby (bool):           all players join the lobby of the first url
+
+    Returns:
+        dict:   the report (see EndpointStats.summary) per endpoint and in total
+    """
+    if players % 2:
+        raise ValueError("the number of players must be even (two players per game)")
+    if lobby:
+        urls = urls[:1] * (players // 2)
+    if len(urls) < players // 2:
+        raise ValueError(f"{players} players need {players // 2} games, but only {len(urls)} server url(s) were given")
+    stats = {endpoint: EndpointStats() for endpoint in ENDPOINTS}
+    deadline = time.time() + duration if duration else None
+    simulated = [SimulatedPlayer(urls[index // 2], stats, strategy, poll_interval, bot_depth, deadline, lobby)
+                 for index in range(players)]
+    start = time.perf_counter()
+    for player in simulated:
+        player.start()
+    for player in simulated:
+        player.join()
+    elapsed = time.perf_counter() - start
+
+    total = EndpointStats()
+    for endpoint_stats in stats.values():
+        total.latencies.extend(endpoint_stats.latencies)
+        total.errors += endpoint_stats.errors
+        total.rejected += endpoint_stats.rejected
+        total.unanswered += endpoint_stats.unanswered
+    results = {}
+    for player in simulated:
+        results[player.result] = results.get(player.result, 0) + 1
+    return {"elapsed_s": elapsed,
+            "players": players,
+            "games": players // 2,
+            "results": results,
+            "endpoints": {endpoint: endpoint_stats.summary(elapsed) for endpoint, endpoint_stats in stats.items()},
+            "total": total.summary(elapsed)}
+
+
+def print_report(report:dict) -> None:
+    """prints the report as a table"""
+    print(f"{report['players']} players, {report['games']} games in {report['elapsed_s']:.2f} s, results: {report['results']}")
+    print(f"{'endpoint':<12}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'400s':>8}{'err %':>8}")
+    for name, summary in list(report["endpoints"].items()) + [("total", report["total"])]:
+        print(f"{name:<12}{summary['requests']:>10}{summary['throughput']:>10.1f}{summary['p50_ms']:>10.2f}"
+              f"{summary['p99_ms']:>10.2f}{summary['errors']:>8}{summary['rejected']:>8}{summary['error_rate'] * 100:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the Connect4Server")
+    parser.add_argument("--url", action="append", default=[], help="server url (one per pair of players). Default: start local servers")
+    parser.add_argument("--players", type=int, default=10, help="number of simulated players (even)")
+    parser.add_argument("--strategy", choices=("random", "bot"), default="random", help="how the simulated players choose their moves")
+    parser.add_argument("--bot-depth", type=int, default=4, help="search depth of the bot strategy")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds between two status requests of a player")
+    parser.add_argument("--lobby", action="store_true", help="all players use one server and are paired by its lobby")
+    parser.add_argument("--duration", type=float, default=None, help="abort the games after this many seconds")
+    parser.add_argument("--json", metavar="FILE", help="also write the report as json to FILE")
+    args = parser.parse_args()
+
+    processes = []
+    urls = args.url
+    if not urls:
+        urls, processes = start_local_servers(1 if args.lobby else args.players // 2)
+    try:
+        report = run_load_test(urls, args.players, args.strategy, args.poll_interval, args.bot_depth, args.duration,
+                               args.lobby)
+    finally:
+        for process in processes:
+            process.terminate()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
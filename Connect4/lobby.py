@@ -0,0 +1,185 @@
+"""
+Matchmaking lobby: players wait in a queue and are paired into new games by the server
+
+Players join the lobby and then wait for their game with a long poll: the request is held open until the player
+was paired (or a timeout passes), so a waiting player costs one idle connection instead of polling the status.
+The pairing runs in batches: a single thread wakes up every `batch_interval` seconds (only while players are
+waiting) and pairs all waiting players in the order they joined. Players that want a different board size
+are only paired with each other.
+
+    lobby = Lobby(create_game)                  # create_game(tickets) -> (game id, {player id: icon})
+    lobby.join(player_id, "Alice")
+    ticket = lobby.wait(player_id, timeout=25)  # ticket.game_id is None while the player is still waiting
+"""
+
+import threading
+import time
+
+
+class Ticket:
+    """
+    A player in the lobby
+
+    Attributes:
+        player_id (str), name (str):    the player
+        board_size (tuple):             (width, height) of the requested game
+        joined (float):                 time.monotonic() when the player joined
+        game_id (str), icon (str):      the game and icon of the player, None while waiting
+        matched_at (float):             time.monotonic() when the player was paired, None while waiting
+    """
+    __slots__ = ("player_id", "name", "board_size", "joined", "game_id", "icon", "matched_at", "matched")
+
+    def __init__(self, player_id:str, name:str, board_size:tuple) -> None:
+        self.player_id = player_id
+        self.name = name
+        self.board_size = board_size
+        self.joined = time.monotonic()
+        self.game_id = None
+        self.icon = None
+        self.matched_at = None
+        self.matched = threading.Event()
+
+    def to_dict(self) -> dict:
+        if self.game_id is None:
+            return {"status": "waiting", "waiting_s": round(time.monotonic() - self.joined, 3)}
+        return {"status": "matched", "game_id": self.game_id, "icon": self.icon}
+
+
+class Lobby:
+    """
+    Queue of waiting players, paired in batches by one background thread
+
+    Attributes:
+        batch_interval (float):     seconds between two pairing rounds
+        ticket_ttl (float):         seconds a ticket is kept after the match (so a late long poll still gets the game)
+        on_matched:                 optional callback(seconds waited) for every paired player (metrics)
+    """
+
+    def __init__(self, create_game, batch_interval:float = 0.25, ticket_ttl:float = 300.0, on_matched = None) -> None:
+        """
+        Parameters:
+            create_game:    callable(list of two tickets) -> (game id, {player id: icon}), creates the game and
+                            registers the players (the first ticket is registered first)
+        """
+        self.create_game = create_game
+        self.batch_interval = batch_interval
+        self.ticket_ttl = ticket_ttl
+        self.on_matched = on_matched
+        self._tickets = {}      # player id -> Ticket (waiting and recently matched)
+        self._waiting = []      # waiting tickets in the order they joined
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def waiting(self) -> int:
+        with self._condition:
+            return len(self._waiting)
+
+    def join(self, player_id:str, name:str = None, board_size:tuple = None) -> Ticket:
+        """
+        Add a player to the queue (a player that is already waiting keeps its ticket,
+        a player that was matched before gets a new one for the next game)
+
+        Returns:
+            Ticket: the ticket of the player
+        """
+        with self._condition:
+            ticket = self._tickets.get(player_id)
+            if ticket is not None and ticket.game_id is None:
+                return ticket
+            ticket = self._tickets[player_id] = Ticket(player_id, name, board_size)
+            self._waiting.append(ticket)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lobby", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+            return ticket
+
+    def wait(self, player_id:str, timeout:float):
+        """
+        Wait until the player was paired or the timeout passed (long poll)
+
+        Returns:
+            Ticket: the ticket (game_id is None if the player is still waiting), None if the player is not in the lobby
+        """
+        with self._condition:
+            ticket = self._tickets.get(player_id)
+        if ticket is not None:
+            ticket.matched.wait(timeout)
+        return ticket
+
+    def leave(self, player_id:str) -> bool:
+        """
+        Returns:
+            bool:   True if the player was waiting and left the queue
+        """
+        with self._condition:
+            ticket = self._tickets.get(player_id)
+            if ticket is None or ticket not in self._waiting: # matched (or being paired right now)
+                return False
+            del self._tickets[player_id]
+            self._waiting.remove(ticket)
+            ticket.matched.set() # wake a pending long poll
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                # sleep until at least two players are waiting, then collect the joins of one batch interval
+                while len(self._waiting) < 2 and not self._closed:
+                    self._condition.wait(self.ticket_ttl)
+                    self._expire()
+                if self._closed:
+                    return
+            time.sleep(self.batch_interval)
+            self.pair_batch()
+
+    def pair_batch(self) -> int:
+        """
+        Pair all waiting players (in the order they joined, per board size)
+
+        Returns:
+            int:    number of created games
+        """
+        with self._condition:
+            by_size = {}
+            for ticket in self._waiting:
+                by_size.setdefault(ticket.board_size, []).append(ticket)
+            pairs = []
+            for tickets in by_size.values():
+                pairs.extend(tickets[index:index + 2] for index in range(0, len(tickets) - 1, 2))
+            paired = {id(ticket) for pair in pairs for ticket in pair}
+            self._waiting = [ticket for ticket in self._waiting if id(ticket) not in paired]
+            self._expire()
+        # the games are created outside of the lock, joins and long polls are not blocked meanwhile
+        for pair in pairs:
+            try:
+                game_id, icons = self.create_game(pair)
+            except Exception:
+                with self._condition:
+                    self._waiting[:0] = pair # try again in the next batch
+                continue
+            now = time.monotonic()
+            for ticket in pair:
+                with self._condition:
+                    ticket.game_id, ticket.icon, ticket.matched_at = game_id, icons[ticket.player_id], now
+                ticket.matched.set()
+                if self.on_matched is not None:
+                    self.on_matched(now - ticket.joined)
+        return len(pairs)
+
+    def _expire(self) -> None:
+        """forget tickets ticket_ttl after their match (called with the lock held), waiting tickets are kept"""
+        limit = time.monotonic() - self.ticket_ttl
+        expired = [player_id for player_id, ticket in self._tickets.items()
+                   if ticket.matched_at is not None and ticket.matched_at < limit]
+        for player_id in expired:
+            del self._tickets[player_id]
+
+    def close(self) -> None:
+        """stop the pairing thread and wake all waiting long polls"""
+        with self._condition:
+            self._closed = True
+            for ticket in self._waiting:
+                ticket.matched.set()
+            self._condition.notify_all()
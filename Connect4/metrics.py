@@ -0,0 +1,212 @@
+"""
+Minimal Prometheus metrics (text exposition format 0.0.4)
+
+Supports counters, gauges (set directly or computed by a callback when scraped) and histograms,
+each optionally split by labels. All metric types are thread safe, because Flask serves requests from several threads.
+"""
+
+import bisect
+import threading
+import time
+
+# latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(label_names:tuple, label_values:tuple, extra:str = "") -> str:
+    """formats labels as {name="value",...}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_value(value:float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Base class of all metrics
+
+    Attributes:
+        name (str):             the metric name
+        documentation (str):    help text
+        label_names (tuple):    names of the labels (may be empty)
+    """
+    type_name = ""
+
+    def __init__(self, name:str, documentation:str, label_names:tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}   # label values (tuple) -> value
+        if not self.label_names and self.type_name != "histogram":
+            self._values[()] = 0 # metrics without labels are reported from the start
+
+    def _key(self, labels:dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects the labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> list:
+        """
+        Returns:
+            list:   the lines of the text exposition format for this metric
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            samples = sorted(self._values.items())
+        for label_values, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only goes up (requests, errors, ...)"""
+    type_name = "counter"
+
+    def inc(self, amount:float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down.
+    If a callback is given, the value is computed by calling it when the metrics are rendered.
+    The callback returns a number (no labels) or a dictionary {label values (tuple): number}
+    """
+    type_name = "gauge"
+
+    def __init__(self, name:str, documentation:str, label_names:tuple = (), callback=None) -> None:
+        super().__init__(name, documentation, label_names)
+        self.callback = callback
+
+    def set(self, value:float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount:float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount:float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> list:
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+            with self._lock:
+                self._values = {tuple(str(value) for value in key): number for key, number in values.items()}
+        return super().render()
+
+
+class Histogram(_Metric):
+    """
+    Counts observations (e.g. request latencies) in cumulative buckets
+    """
+    type_name = "histogram"
+
+    def __init__(self, name:str, documentation:str, label_names:tuple = (), buckets:tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value:float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # counts per bucket (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """
+        Context manager that observes the duration of its block:
+            with histogram.time(route="status"):
+                ...
+        """
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            samples = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for label_values, (counts, total, count) in samples:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    """Context manager returned by Histogram.time"""
+
+    def __init__(self, histogram:Histogram, labels:dict) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics that are rendered together (the content of the /metrics endpoint)
+    """
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self.metrics = []
+
+    def register(self, metric:_Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name:str, documentation:str, label_names:tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name:str, documentation:str, label_names:tuple = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, label_names, callback))
+
+    def histogram(self, name:str, documentation:str, label_names:tuple = (), buckets:tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """
+        Returns:
+            str:    all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
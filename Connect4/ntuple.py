@@ -0,0 +1,255 @@
+"""
+N-tuple network: a learned evaluation from lookup tables indexed by board patterns
+
+An n-tuple is a fixed set of cells (e.g. a line of four, a 2x3 rectangle). Every cell is empty, own (player to move)
+or opponent, so the cells of a tuple form a number with n ternary digits, which indexes a lookup table.
+The value of a position is tanh of the sum of the looked up weights of all tuples, from the view of the player to
+move (+1 win, -1 loss). Mirrored tuples share their table, so the network is symmetric.
+
+The weights are learned by self-play with temporal difference updates: a batch of games is played in lockstep,
+all positions and all their children are evaluated in one batched call per move, and the value of every position
+is moved towards the value of its best move (or the result, if the move ends the game).
+
+    python ntuple.py train --games 20000 --output ntuple.npz
+    python ntuple.py evaluate ntuple.npz --games 200            # greedy network vs random moves
+
+    network = NTupleNetwork.load("ntuple.npz")
+    values = network.evaluate_positions(positions)               # batched inference
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from bot import Position
+from evaluator import BatchEvaluator
+
+
+def default_tuples(width:int, height:int) -> list:
+    """
+    Returns:
+        list:   all lines of four and all 2x3 / 3x2 rectangles, as lists of flat cell indices (x * height + y)
+    """
+    tuples = [list(window) for window in BatchEvaluator(width, height).windows]
+    for size_x, size_y in ((2, 3), (3, 2)):
+        for x in range(width - size_x + 1):
+            for y in range(height - size_y + 1):
+                tuples.append([(x + dx) * height + y + dy for dx in range(size_x) for dy in range(size_y)])
+    return tuples
+
+
+class NTupleNetwork:
+    """
+    Attributes:
+        width (int), height (int):  board size
+        tuples (list):              cell indices per tuple (one table per tuple, shared with the mirrored tuple)
+        weights (np.ndarray):       all lookup tables in one float32 array
+    """
+
+    def __init__(self, width:int = 7, height:int = 6, tuples:list = None, weights:np.ndarray = None) -> None:
+        self.width = width
+        self.height = height
+        self.tuples = [list(cells) for cells in (tuples or default_tuples(width, height))]
+        self._planes = BatchEvaluator(width, height)
+        sizes = [3 ** len(cells) for cells in self.tuples]
+        self.offsets = np.cumsum([0] + sizes[:-1])
+        self.weights = np.zeros(sum(sizes), dtype=np.float32) if weights is None else weights.astype(np.float32)
+        if len(self.weights) != sum(sizes):
+            raise ValueError("the weights don't match the tuples")
+
+        # every tuple is sampled twice: as it is and mirrored (same table, cells in mirrored order)
+        length = max(len(cells) for cells in self.tuples)
+        padding = width * height # an extra cell that is always empty, pads the shorter tuples
+        samples = []
+        for cells in self.tuples:
+            mirrored = [(width - 1 - cell // height) * height + cell % height for cell in cells]
+            for variant in (cells, mirrored):
+                samples.append(variant + [padding] * (length - len(variant)))
+        self._sample_cells = np.array(samples, dtype=np.intp)                      # (samples, length)
+        self._sample_offsets = np.repeat(self.offsets, 2)                          # (samples,)
+        self._powers = 3 ** np.arange(length)
+
+    def indices(self, own:np.ndarray, opponent:np.ndarray) -> np.ndarray:
+        """
+        Parameters:
+            own, opponent (np.ndarray):     (positions, width * height) coins of the player to move / the other player
+
+        Returns:
+            np.ndarray:     (positions, samples) indices into weights
+        """
+        states = own.astype(np.int64) + 2 * opponent.astype(np.int64)
+        states = np.concatenate([states, np.zeros((states.shape[0], 1), dtype=np.int64)], axis=1)
+        return self._sample_offsets + (states[:, self._sample_cells] * self._powers).sum(axis=2)
+
+    def value(self, indices:np.ndarray) -> np.ndarray:
+        return np.tanh(self.weights[indices].sum(axis=1))
+
+    def evaluate_positions(self, positions:list) -> np.ndarray:
+        """values (-1...1) of bot.Position objects, from the view of the player to move"""
+        return self.value(self.indices(*self._planes.planes_from_positions(positions)))
+
+    def evaluate_boards(self, boards, icon:str) -> np.ndarray:
+        """values (-1...1) of boards in the layout of Connect4.get_board, from the view of icon (the player to move)"""
+        return self.value(self.indices(*self._planes.planes_from_boards(boards, icon)))
+
+    def choose_move(self, position:Position) -> int:
+        """the column with the best value after one move (a winning move if there is one)"""
+        children = []
+        columns = []
+        for column in position.legal_columns():
+            if position.is_winning_move(column):
+                return column
+            child = position.copy()
+            child.play(column)
+            children.append(child)
+            columns.append(column)
+        values = -self.evaluate_positions(children)
+        return columns[int(np.argmax(values))]
+
+    def save(self, path:str) -> None:
+        lengths = [len(cells) for cells in self.tuples]
+        np.savez_compressed(path, width=self.width, height=self.height, weights=self.weights,
+                            tuple_cells=np.concatenate(self.tuples), tuple_lengths=lengths)
+
+    @classmethod
+    def load(cls, path:str) -> "NTupleNetwork":
+        data = np.load(path)
+        cells = data["tuple_cells"].tolist()
+        tuples = []
+        for length in data["tuple_lengths"].tolist():
+            tuples.append(cells[:length])
+            cells = cells[length:]
+        return cls(int(data["width"]), int(data["height"]), tuples, data["weights"])
+
+
+def train(network:NTupleNetwork, games:int, batch:int = 256, alpha:float = 0.5, epsilon:float = 0.1,
+          seed:int = None, progress:bool = True) -> NTupleNetwork:
+    """
+    Self-play training with TD(0)
+
+    Parameters:
+        games (int):        number of games to play
+        batch (int):        games that are played in lockstep (one evaluation call per move for all of them)
+        alpha (float):      learning rate (divided by the number of sampled tuples)
+        epsilon (float):    probability of a random move (exploration)
+    """
+    generator = random.Random(seed)
+    rate = alpha / network._sample_cells.shape[0]
+    size = len(network.weights)
+    played = 0
+    start = time.perf_counter()
+    while played < games:
+        positions = [Position(network.width, network.height) for _ in range(min(batch, games - played))]
+        while positions:
+            # children of all running games (winning moves and full boards are not evaluated)
+            children = []
+            owners = []
+            targets = [None] * len(positions)
+            moves = [None] * len(positions)
+            for index, position in enumerate(positions):
+                columns = position.legal_columns()
+                winning = [column for column in columns if position.is_winning_move(column)]
+                if winning:
+                    targets[index] = 1.0
+                    moves[index] = winning[0]
+                    continue
+                for column in columns:
+                    child = position.copy()
+                    child.play(column)
+                    children.append(child)
+                    owners.append((index, column))
+
+            # one batch for the positions and their children
+            own, opponent = network._planes.planes_from_positions(positions + children)
+            indices = network.indices(own, opponent)
+            values = network.value(indices)
+            best = {}
+            for (index, column), child, value in zip(owners, children, -values[len(positions):]):
+                # a move that fills the board without winning is a draw
+                value = 0.0 if child.is_full() else float(value)
+                if index not in best or value > best[index][0]:
+                    best[index] = (value, column)
+            for index, position in enumerate(positions):
+                if targets[index] is None:
+                    targets[index], moves[index] = best[index]
+                    if generator.random() < epsilon:
+                        moves[index] = generator.choice(position.legal_columns())
+
+            # TD update: move the value of every position towards the value of its best move. A weight that is
+            # used by many positions of the batch (e.g. the empty pattern) gets their average, not their sum
+            current = values[:len(positions)]
+            errors = (np.array(targets) - current) * (1 - current ** 2) * rate
+            samples = indices[:len(positions)].ravel()
+            sums = np.bincount(samples, weights=np.repeat(errors, indices.shape[1]), minlength=size)
+            hits = np.bincount(samples, minlength=size)
+            network.weights += (sums / np.maximum(hits, 1)).astype(np.float32)
+
+            running = []
+            for position, column in zip(positions, moves):
+                if position.is_winning_move(column):
+                    continue
+                position.play(column)
+                if not position.is_full():
+                    running.append(position)
+            positions = running
+        played += min(batch, games - played)
+        if progress:
+            print(f"\r{played}/{games} games ({played / (time.perf_counter() - start):.0f} games/s)", end="", flush=True)
+    if progress:
+        print()
+    return network
+
+
+def evaluate_against_random(network:NTupleNetwork, games:int, seed:int = 0) -> dict:
+    """
+    Returns:
+        dict:   wins, draws and losses of the greedy network against random moves (colours alternating)
+    """
+    generator = random.Random(seed)
+    results = {"wins": 0, "draws": 0, "losses": 0}
+    for game in range(games):
+        position = Position(network.width, network.height)
+        network_to_move = game % 2 == 0
+        while True:
+            if network_to_move:
+                column = network.choose_move(position)
+            else:
+                column = generator.choice(position.legal_columns())
+            if position.is_winning_move(column):
+                results["wins" if network_to_move else "losses"] += 1
+                break
+            position.play(column)
+            if position.is_full():
+                results["draws"] += 1
+                break
+            network_to_move = not network_to_move
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train an n-tuple network by self-play")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="train (or continue training) a network")
+    train_parser.add_argument("--games", type=int, default=10000, help="self-play games")
+    train_parser.add_argument("--batch", type=int, default=256, help="games played in lockstep")
+    train_parser.add_argument("--alpha", type=float, default=0.5, help="learning rate")
+    train_parser.add_argument("--epsilon", type=float, default=0.1, help="probability of exploration moves")
+    train_parser.add_argument("--width", type=int, default=7, help="board width")
+    train_parser.add_argument("--height", type=int, default=6, help="board height")
+    train_parser.add_argument("--seed", type=int, default=None, help="seed of the exploration moves")
+    train_parser.add_argument("--weights", metavar="FILE", help="continue training these weights")
+    train_parser.add_argument("--output", required=True, metavar="FILE", help="where the weights are saved (.npz)")
+    evaluate_parser = commands.add_parser("evaluate", help="play the greedy network against random moves")
+    evaluate_parser.add_argument("weights", help="weights file (.npz)")
+    evaluate_parser.add_argument("--games", type=int, default=200, help="number of games")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        network = NTupleNetwork.load(args.weights) if args.weights else NTupleNetwork(args.width, args.height)
+        train(network, args.games, args.batch, args.alpha, args.epsilon, args.seed)
+        network.save(args.output)
+        print(f"saved {len(network.weights)} weights to {args.output}")
+    else:
+        print(evaluate_against_random(NTupleNetwork.load(args.weights), args.games))
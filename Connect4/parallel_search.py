@@ -0,0 +1,217 @@
+"""
+Parallel game tree search (lazy SMP)
+
+Python threads can't run the search on several cores at once, so the ParallelBot starts helper processes.
+All processes search the same root position with iterative deepening and share one transposition table in
+multiprocessing.shared_memory. Nothing is sent between the processes during a search: the helpers fill the table
+with results, and the main process finds them when it reaches the same positions (and the other way around).
+The helpers search with different depth offsets, so they don't all walk through the tree in the same order.
+Only the root position (a few integers) is sent to the helpers at the start of a search.
+
+The table is lockless: every entry stores its key xor its data, so an entry that was torn by two processes
+writing at the same time doesn't match its key anymore and is ignored.
+
+    with ParallelBot(depth=12, time_limit=2, workers=8) as bot:
+        column = bot.choose_move(board, 'X')
+"""
+
+import multiprocessing
+import os
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from bot import Bot, Position, WIN_SCORE
+
+_MASK64 = (1 << 64) - 1
+# an entry is three 64 bit words: key check (low key bits xor data), high key bits, data
+_WORDS = 3
+
+
+def _pack(depth:int, flag:int, score:int, move:int) -> int:
+    return (depth & 0xFFFF) | (flag & 0xFF) << 16 | (move & 0xFF) << 24 | (score + WIN_SCORE * 2) << 32
+
+
+def _unpack(data:int) -> tuple:
+    return (data & 0xFFFF, (data >> 16) & 0xFF, (data >> 32) - WIN_SCORE * 2, (data >> 24) & 0xFF)
+
+
+class SharedTranspositionTable:
+    """
+    Transposition table in shared memory, with the interface of bot.TranspositionTable
+
+    Entries are stored at a hash of the key (the keys are bitboards, their low bits only depend on the first
+    columns). A new entry replaces the stored one, unless the stored entry
+    is of the same position and was searched deeper.
+
+    Attributes:
+        capacity (int):     number of entries
+        name (str):         name of the shared memory block (to attach to it from another process)
+    """
+
+    def __init__(self, capacity:int = 1 << 20, name:str = None) -> None:
+        """
+        Parameters:
+            capacity (int):     number of entries (24 bytes each)
+            name (str):         attach to the existing table with this name instead of creating a new one
+        """
+        self.capacity = capacity
+        self._owner = name is None
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=capacity * _WORDS * 8)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+        self.entries = np.ndarray((capacity, _WORDS), dtype=np.uint64, buffer=self._memory.buf)
+        if self._owner:
+            self.entries[:] = 0
+        # the shared memory is released, even if close is never called
+        self._finalizer = weakref.finalize(self, SharedTranspositionTable._release, self._memory, self._owner)
+
+    @staticmethod
+    def _release(memory, owner:bool) -> None:
+        memory.close()
+        if owner:
+            memory.unlink()
+
+    def _index(self, key:int) -> int:
+        # multiplicative hashing, the high bits of the product depend on all bits of the key
+        return (((key ^ key >> 64) * 0x9E3779B97F4A7C15 & _MASK64) >> 24) % self.capacity
+
+    def get(self, key:int):
+        """
+        Returns:
+            tuple:  (depth, flag, score, move) or None if the position is not stored
+        """
+        check, high, data = self.entries[self._index(key)].tolist()
+        if data == 0 or check ^ data != key & _MASK64 or high != key >> 64:
+            return None
+        return _unpack(data)
+
+    def store(self, key:int, depth:int, flag:int, score:int, move:int) -> None:
+        row = self.entries[self._index(key)]
+        check, high, data = row.tolist()
+        if data and check ^ data == key & _MASK64 and high == key >> 64 and (data & 0xFFFF) > depth:
+            return # keep the deeper result of the same position
+        data = _pack(depth, flag, score, move)
+        row[:] = (key & _MASK64 ^ data, key >> 64, data)
+
+    def clear(self) -> None:
+        self.entries[:] = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.entries[:, 2]))
+
+    def close(self) -> None:
+        """detach from the shared memory (the creating table also frees it)"""
+        self.entries = None
+        self._finalizer()
+
+
+class _HelperBot(Bot):
+    """bot of a helper process, that stops searching when the main process finished its search"""
+
+    def __init__(self, table:SharedTranspositionTable, stop_event) -> None:
+        self._stop_event = stop_event
+        super().__init__(table=table)
+
+    @property
+    def stop_requested(self) -> bool:
+        return self._stop_event.is_set()
+
+    @stop_requested.setter
+    def stop_requested(self, value:bool) -> None:
+        pass
+
+
+def _helper(table_name:str, capacity:int, tasks, done, stop_event) -> None:
+    """main loop of a helper process: search the roots sent by the main process until it sends None"""
+    table = SharedTranspositionTable(capacity, name=table_name)
+    bot = _HelperBot(table, stop_event)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            width, height, current, mask, moves, depth, offset = task
+            position = Position(width, height)
+            position.current, position.mask, position.moves = current, mask, moves
+            bot.search(position, depth + offset)
+            done.put(True)
+    finally:
+        table.close()
+
+
+class ParallelBot(Bot):
+    """
+    Bot that searches with helper processes on a shared transposition table (lazy SMP)
+
+    The helper processes are started with the first search and run until close is called
+    (or the bot is used as context manager).
+
+    Attributes:
+        workers (int):      number of searching processes, including the main process
+    """
+
+    def __init__(self, depth:int = 6, time_limit:float = None, randomness:float = 0.0, workers:int = None,
+                 table_size:int = 1 << 20, seed:int = None) -> None:
+        """
+        Parameters:
+            workers (int):      searching processes including this one (default: number of cores)
+            table_size (int):   entries of the shared transposition table
+        """
+        super().__init__(depth, time_limit, randomness, SharedTranspositionTable(table_size), seed)
+        self.workers = workers or os.cpu_count()
+        self._helpers = []
+        self._context = multiprocessing.get_context()
+        self._stop_event = self._context.Event()
+        self._done = self._context.Queue()
+
+    def _start_helpers(self) -> None:
+        for _ in range(self.workers - 1):
+            tasks = self._context.Queue()
+            process = self._context.Process(target=_helper, daemon=True,
+                                            args=(self.table.name, self.table.capacity, tasks, self._done, self._stop_event))
+            process.start()
+            self._helpers.append((process, tasks))
+
+    def search(self, position:Position, depth:int = None, time_limit:float = None) -> tuple:
+        """
+        Iterative deepening search of this process, while the helpers search the same position
+
+        Returns:
+            tuple:  (best column, score, reached depth)
+        """
+        if self.workers > 1 and not self._helpers:
+            self._start_helpers()
+        depth = self.depth if depth is None else depth
+        self._stop_event.clear()
+        for index, (_, tasks) in enumerate(self._helpers):
+            # every second helper searches one ply deeper, so the helpers spread over different parts of the tree
+            tasks.put((position.width, position.height, position.current, position.mask, position.moves,
+                       depth, index % 2))
+        try:
+            return super().search(position, depth, time_limit)
+        finally:
+            # stop the helpers and wait until they are idle, so they don't compete with the next search
+            self._stop_event.set()
+            for _ in self._helpers:
+                self._done.get()
+
+    def close(self) -> None:
+        """stop the helper processes and free the shared table"""
+        for process, tasks in self._helpers:
+            tasks.put(None)
+        for process, _ in self._helpers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._helpers = []
+        self.table.close()
+
+    def __enter__(self) -> "ParallelBot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
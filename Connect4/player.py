@@ -63,6 +63,15 @@ class Player(ABC):
         """
         raise NotImplementedError("Subclasses must implement 'make_move'")
 
+    def input_source(self, mux):
+        """
+        Source that posts the player's input actions to the event loop of a coordinator (see input_events.py).
+
+        Returns:
+            None, if the player has no interactive input and makes its moves in make_move.
+        """
+        return None
+
     @abstractmethod
     def visualize(self)->None:
         """
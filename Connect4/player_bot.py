@@ -0,0 +1,207 @@
+import random
+from abc import abstractmethod
+
+from game import Connect4
+from player import Player
+from bot import Bot, Ponderer, Position
+from instrumentation import traced
+
+
+class Player_Headless(Player):
+    """
+    Base of players without input or output (bots, scripted move lists).
+
+    They never ask for a name, never render and make their move in make_move without waiting,
+    so many games can be played in one process (see Coordinator_Local, headless mode).
+    """
+
+    def __init__(self, game:Connect4, **kwargs) -> None:
+        """
+        Parameters:
+            game (Connect4): Instance of the Connect4 game to which the player is linked.
+            name (str):      Optional keyword argument. Name of the player (default: the class name).
+            icon (str):      Optional keyword argument. Requested icon ('X' or 'O'), see Connect4.register_player.
+        """
+        super().__init__()
+        self.game = game
+        self.name = kwargs.get("name") or type(self).__name__
+        self.requested_icon = kwargs.get("icon")
+        self.icon = self.register_in_game()
+
+    def register_in_game(self) -> str:
+        if self.requested_icon is None:
+            return self.game.register_player(self.id, self.name)
+        return self.game.register_player(self.id, self.name, icon=self.requested_icon)
+
+    def is_my_turn(self) -> bool:
+        return str(self.game.get_status()["active_id"]) == str(self.id)
+
+    def get_game_status(self) -> dict:
+        return self.game.get_status()
+
+    @abstractmethod
+    def choose_column(self, board) -> int:
+        """
+        Parameters:
+            board (Array):  board in the layout of Connect4.get_board
+
+        Returns:
+            int: The column to play.
+        """
+        raise NotImplementedError("Subclasses must implement 'choose_column'")
+
+    def make_move(self) -> int:
+        """
+        Choose a column and play it.
+
+        Returns:
+            int: The played column.
+
+        Raises:
+            ValueError: If the game rejects the move.
+        """
+        column = self.choose_column(self.game.get_board())
+        if not self.game.check_move(column, self.id):
+            raise ValueError(f"{self.name} tried the illegal move {column}")
+        return column
+
+    def new_game(self) -> None:
+        """called by the coordinator before the next game on the same game object"""
+
+    def visualize(self, fetch_board:bool = True, write_turn:bool = True) -> None:
+        pass
+
+    def celebrate_win(self) -> None:
+        pass
+
+
+class Player_Bot(Player_Headless):
+    """
+    Player that uses the alpha-beta search of bot.py.
+    """
+
+    def __init__(self, game:Connect4, **kwargs) -> None:
+        """
+        Parameters:
+            bot (Bot):          Optional keyword argument. The search to use (default: a new Bot with the following options).
+            depth (int):        Optional keyword argument. Search depth in plies (default: 6).
+            time_limit (float): Optional keyword argument. Seconds per move.
+            randomness (float): Optional keyword argument. Probability of a random move.
+            seed (int):         Optional keyword argument. Seed of the random moves.
+            ponder (bool):      Optional keyword argument. Search the opponent's likely replies in a background
+                                thread while the opponent thinks (see bot.Ponderer). Default: False.
+            ponder_replies (int): Optional keyword argument. Number of replies to ponder (default: all).
+            workers (int):      Optional keyword argument. Search with this many processes (see parallel_search.py).
+            endgame (str):      Optional keyword argument. Path of an endgame database (see endgame_db.py).
+        """
+        options = dict(depth=kwargs.get("depth", 6), time_limit=kwargs.get("time_limit"),
+                       randomness=kwargs.get("randomness", 0.0), seed=kwargs.get("seed"))
+        if kwargs.get("bot"):
+            self.bot = kwargs["bot"]
+        elif kwargs.get("workers", 1) > 1:
+            from parallel_search import ParallelBot
+            self.bot = ParallelBot(workers=kwargs["workers"], **options)
+        else:
+            self.bot = Bot(**options)
+        if kwargs.get("endgame"):
+            from endgame_db import EndgameDatabase
+            self.bot.endgame = EndgameDatabase(kwargs["endgame"])
+        self.ponderer = Ponderer(self.bot, kwargs.get("ponder_replies")) if kwargs.get("ponder") else None
+        self._position_after_move = None
+        super().__init__(game, **kwargs)
+
+    @traced("Player_Bot.choose_column", "player")
+    def choose_column(self, board) -> int:
+        position = Position.from_board(board, self.icon)
+        column = None
+        if self.ponderer is not None:
+            pondered = self.ponderer.take(position)
+            # the pondered search already reached the full depth, no need to search again
+            if pondered is not None and pondered[2] >= self.bot.depth and not self.bot.randomness:
+                column = pondered[0]
+        if column is None:
+            column = self.bot.best_move(position)
+        self._position_after_move = position.copy()
+        self._position_after_move.play(column)
+        return column
+
+    def make_move(self) -> int:
+        column = super().make_move()
+        if self.ponderer is not None:
+            self.ponderer.start(self._position_after_move)
+        return column
+
+    def new_game(self) -> None:
+        if self.ponderer is not None:
+            self.ponderer.stop()
+
+    def close(self) -> None:
+        """stop pondering and the search processes (at the end of the last game)"""
+        if self.ponderer is not None:
+            self.ponderer.stop()
+        if hasattr(self.bot, "close"):
+            self.bot.close()
+
+
+class Player_NTuple(Player_Headless):
+    """
+    Player that plays the move with the best value of a trained n-tuple network (see ntuple.py), without search.
+    """
+
+    def __init__(self, game:Connect4, **kwargs) -> None:
+        """
+        Parameters:
+            weights (str):  Keyword argument. Path of the weights file (.npz).
+        """
+        from ntuple import NTupleNetwork
+        self.network = NTupleNetwork.load(kwargs["weights"])
+        super().__init__(game, **kwargs)
+
+    def choose_column(self, board) -> int:
+        return self.network.choose_move(Position.from_board(board, self.icon))
+
+
+class Player_Random(Player_Headless):
+    """
+    Player that plays random legal moves.
+    """
+
+    def __init__(self, game:Connect4, **kwargs) -> None:
+        """
+        Parameters:
+            seed (int): Optional keyword argument. Seed of the random generator.
+        """
+        self.random = random.Random(kwargs.get("seed"))
+        super().__init__(game, **kwargs)
+
+    def choose_column(self, board) -> int:
+        top = len(board[0]) - 1
+        return self.random.choice([x for x in range(len(board)) if board[x][top] == ''])
+
+
+class Player_Scripted(Player_Headless):
+    """
+    Player that plays a fixed list of columns (e.g. to reproduce a reported game).
+    """
+
+    def __init__(self, game:Connect4, **kwargs) -> None:
+        """
+        Parameters:
+            moves (list):   Keyword argument. The columns to play, in order.
+            repeat (bool):  Optional keyword argument. Play the same moves again in every new game (default: True).
+        """
+        self.moves = list(kwargs.get("moves", []))
+        self.repeat = kwargs.get("repeat", True)
+        self.next_index = 0
+        super().__init__(game, **kwargs)
+
+    def choose_column(self, board) -> int:
+        if self.next_index >= len(self.moves):
+            raise ValueError(f"{self.name} has no moves left")
+        column = self.moves[self.next_index]
+        self.next_index += 1
+        return column
+
+    def new_game(self) -> None:
+        if self.repeat:
+            self.next_index = 0
@@ -5,7 +5,10 @@ from player import Player
 import numpy as np
 from enum import Enum
 import ansi_wrapper
+import terminal_renderer
 import sys
+from instrumentation import traced
+import input_events
 
 #because msvcrt only runs on windows, getch needs to be imported, when running on linux
 if sys.platform.startswith('win'): #type: ignore #to suppress the pylance warning on linux
@@ -46,10 +49,12 @@ class Action(Enum):
         right (int):    Move to the right (value: 0).
         left (int):     Move to the left (value: 1).
         drop (int):     Drop a piece into the current column (value: 2).
+        abort (int):    Quit the game (value: 3).
     """
     right = 0
     left = 1
     drop = 2
+    abort = 3
 
 # used to decode Windows keycodes
 # should contain the same keys as Windows_Keycodes
@@ -153,6 +158,9 @@ class Player_Local(Player):
 
         Parameters:
             game (Connect4): Instance of the Connect4 game to which the player is linked.
+            name (str):      Optional keyword argument. If given, the player is not asked for a name.
+            renderer (FrameRenderer): Optional keyword argument. The renderer of the terminal (default: the renderer of stdout)
+            palette (Palette):        Optional keyword argument. The glyphs of the board (default: detected from stdout)
 
         Attributes:
             game (Connect4): Stores the provided Connect4 game instance.
@@ -161,6 +169,10 @@ class Player_Local(Player):
         """
         super().__init__()  # Initialize id and icon from the abstract Player class
         self.game = game
+        self.name = kwargs.get("name", "")
+        # players in the same terminal share a renderer, so it knows what is currently on the screen
+        self.renderer = kwargs.get("renderer") or terminal_renderer.default_renderer()
+        self.palette = kwargs.get("palette") or ansi_wrapper.get_palette()
         self.icon = self.register_in_game()
         self.board = None # variable to hold the board, to reduce server calls
 
@@ -172,7 +184,8 @@ class Player_Local(Player):
         Returns:
             str: The icon assigned to the player during registration.
         """
-        self.name = input("Enter your name: ")
+        if not self.name:
+            self.name = input("Enter your name: ")
         return self.game.register_player(self.id, self.name)
 
 
@@ -202,7 +215,7 @@ class Player_Local(Player):
         return self.game.get_status()
 
 
-    def get_action(self) -> Action:
+    def read_action(self) -> Action:
         """
         Reads input from the user until a valid action for the game is detected.
 
@@ -213,9 +226,7 @@ class Player_Local(Player):
 
         Returns:
             Action: The action corresponding to the user's input, such as `Action.left`, 
-                    `Action.right`, or `Action.drop`.
-
-        Exits the program if Ctrl+C (abort) is pressed.
+                    `Action.right`, `Action.drop` or `Action.abort`.
         """
         # gets user input until a key that does something is pressed
         while True:
@@ -231,7 +242,7 @@ class Player_Local(Player):
 
             # if the user presses ctrl + c, end the program
             if user_input == keycodes.abort.value:
-                exit()
+                return Action.abort
             elif user_input == keycodes.is_special.value:
                 if isLinux:
                     _ = getch() # the linux leader key returns two characters. skip the second with this line
@@ -249,6 +260,97 @@ class Player_Local(Player):
             elif user_input == keycodes.enter.value:
                 return Action.drop
 
+    @staticmethod
+    def decode_keys(data:bytes) -> list:
+        """
+        Decodes the bytes read from a Linux terminal in cbreak mode (see input_events.TerminalSource).
+
+        Parameters:
+            data (bytes):   the bytes that were available on stdin (can contain several keys)
+
+        Returns:
+            list: The actions of the keys that do something, in the order they were pressed.
+        """
+        actions = []
+        index = 0
+        while index < len(data):
+            user_input = data[index]
+            index += 1
+            if user_input == Linux_Keycodes.abort.value:
+                actions.append(Action.abort)
+            elif user_input == Linux_Keycodes.is_special.value:
+                # the leader is followed by '[' and the code of the key
+                if index + 1 < len(data):
+                    second_input = data[index + 1]
+                    index += 2
+                    if second_input == Linux_Keycodes.l_left.value:
+                        actions.append(Action.left)
+                    elif second_input == Linux_Keycodes.l_right.value:
+                        actions.append(Action.right)
+                else:
+                    index = len(data) # incomplete sequence, ignore it
+            elif user_input == Linux_Keycodes.a.value:
+                actions.append(Action.left)
+            elif user_input == Linux_Keycodes.d.value:
+                actions.append(Action.right)
+            elif user_input == Linux_Keycodes.enter.value:
+                actions.append(Action.drop)
+        return actions
+
+    @traced("Player_Local.get_action", "input")
+    def get_action(self) -> Action:
+        """
+        Blocks until the user presses a key that does something (see read_action).
+
+        Returns:
+            Action: `Action.left`, `Action.right` or `Action.drop`.
+
+        Exits the program if Ctrl+C (abort) is pressed.
+        """
+        action = self.read_action()
+        if action == Action.abort:
+            exit()
+        return action
+
+    def input_source(self, mux:input_events.EventMux):
+        """
+        Create the source that posts the actions of this player to an event loop, instead of blocking in get_action.
+
+        On a Linux terminal the keyboard is read through the selector of the mux,
+        otherwise (Windows, no tty) a background thread waits for the keys.
+
+        Parameters:
+            mux (EventMux): The event loop of the coordinator.
+
+        Returns:
+            TerminalSource or ThreadSource: The (not yet started) source.
+        """
+        if input_events.TerminalSource.available():
+            return input_events.TerminalSource(mux, self.decode_keys)
+        return input_events.ThreadSource(mux, self.read_action)
+
+    def handle_action(self, action:Action):
+        """
+        Apply a single action: move the drop position or try to drop the coin.
+
+        Parameters:
+            action (Action): The action to apply (uses the stored board).
+
+        Returns:
+            int or None: The column, if a coin was dropped successfully, otherwise None.
+        """
+        width = len(self.board)
+        if action == Action.drop:
+            if self.game.check_move(self.drop_position, self.id):
+                return self.drop_position
+        elif action == Action.right and self.drop_position < width-1:
+            self.drop_position += 1
+        elif action == Action.left and self.drop_position > 0:
+            self.drop_position -=1
+        self.visualize(fetch_board=False)
+        return None
+
+    @traced("Player_Local.make_move", "player")
     def make_move(self) -> int:
         """ 
         Prompt the physical player to enter a move via the console.
@@ -256,20 +358,14 @@ class Player_Local(Player):
         Returns:
             int: The column chosen by the player for the move.
         """
-        board = self.game.get_board()
-        self.board = board
-        width = len(board)
+        self.board = self.game.get_board()
+        self.visualize(fetch_board=False)
         while True:
-            self.visualize(fetch_board=False)
-            action = self.get_action()
-            if action == Action.drop:
-                if self.game.check_move(self.drop_position, self.id):
-                    return self.drop_position
-            elif action == Action.right and self.drop_position < width-1:
-                self.drop_position += 1
-            elif action == Action.left and self.drop_position > 0:
-                self.drop_position -=1
+            column = self.handle_action(self.get_action())
+            if column is not None:
+                return column
     
+    @traced("Player_Local.visualize", "render")
     def visualize(self, fetch_board = True, write_turn = True) -> None:
         """
         Visualize the current state of the Connect 4 board by printing it to the console.
@@ -287,59 +383,35 @@ class Player_Local(Player):
             board = self.game.get_board()
         else:
             board = self.board
-        width = len(board)
-        emptyIcon = ansi_wrapper.colorprint(" ⬤ ",ansi_wrapper.TerminalColors.Black, background_color=ansi_wrapper.TerminalColors.Blue, background_bright=True)
-        icon1 = ansi_wrapper.colorprint(" ⬤ ",ansi_wrapper.TerminalColors.Yellow, background_color=ansi_wrapper.TerminalColors.Blue, background_bright = True)
-        icon2 = ansi_wrapper.colorprint(" ⬤ ",ansi_wrapper.TerminalColors.Red, background_color=ansi_wrapper.TerminalColors.Blue, background_bright=True)
-
-        winner_icon1 = ansi_wrapper.colorprint(" ⬤ ",ansi_wrapper.TerminalColors.Green, background_color=ansi_wrapper.TerminalColors.Blue, background_bright = True)
-        winner_icon2 = ansi_wrapper.colorprint(" ⬤ ",ansi_wrapper.TerminalColors.Orange, background_color=ansi_wrapper.TerminalColors.Blue, background_bright = True)
-
         width = len(board)
         height = len(board[0])
-        output = ""
-        myIcon = ""
-        if self.icon == "X":
-            myIcon = ansi_wrapper.colorprint(" ⬤ ",ansi_wrapper.TerminalColors.Yellow, background_bright = True)
-        else:
-            myIcon = ansi_wrapper.colorprint(" ⬤ ",ansi_wrapper.TerminalColors.Red, background_bright=True)
-        # range from width (exclusive) to 0 (inclusive) because the board position 0,0 is at the bottom left
+        # the glyphs are precomputed once per terminal (see ansi_wrapper.Palette)
+        icons = self.palette.cells
+        myIcon = self.palette.cursors.get(self.icon, self.palette.unknown)
+        my_turn = self.is_my_turn()
+        # the frame is a list of lines. The renderer only redraws the cells that changed since the last frame
+        frame = []
         # only print the header, when the game is not yet over or it is my turn
-        if self.drop_position >= 0 and self.is_my_turn():
-            output_header = ["   "]*(width+1)
+        if self.drop_position >= 0 and my_turn:
+            output_header = [self.palette.blank]*width
             output_header[self.drop_position] = myIcon
-            output_header = ''.join(output_header)
-            output += output_header + "\n"
+            frame.append(tuple(output_header))
         else:
-            output += "\n"
+            frame.append("")
+        # range from width (exclusive) to 0 (inclusive) because the board position 0,0 is at the bottom left
         for y in range(height-1,-1,-1):
-            for x in range(width):
-                if board[x,y] == BoardIcon.empty.value:
-                    output += emptyIcon
-                elif board[x,y] == BoardIcon.player1.value:
-                    output += icon1
-                elif board[x,y] == BoardIcon.player2.value:
-                    output += icon2
-                elif board[x,y] == BoardIcon.player1_winning.value:
-                    output += winner_icon1
-                elif board[x,y] == BoardIcon.player2_winning.value:
-                    output += winner_icon2
-                else:
-                    # if we don't know what the number in the array is supposed to represent,
-                    # we could raise a exception, but this way funnier,
-                    # and such a thing doesn't necessarily need to crash the game
-                    output += "💩"
-            output += "\n"
-        ansi_wrapper.clear_screen()
-        ansi_wrapper.set_cursorpos(0,0) # sets the cursor position to the top
-        print(output)
-        if not write_turn:
-            return
-        if self.is_my_turn():
-            print(f"{self.name}! it is your turn!")
-            print("select in which row you want to place your coin, by pressing <a>/<d> or <right arrow> / <Left arrow>")
-        else:
-            print("waiting for the opponent to play")
+            # if we don't know what the symbol in the array is supposed to represent,
+            # we could raise a exception, but this way funnier,
+            # and such a thing doesn't necessarily need to crash the game
+            frame.append(tuple(icons.get(board[x,y], self.palette.unknown) for x in range(width)))
+        frame.append("")
+        if write_turn:
+            if my_turn:
+                frame.append(f"{self.name}! it is your turn!")
+                frame.append("select in which row you want to place your coin, by pressing <a>/<d> or <right arrow> / <Left arrow>")
+            else:
+                frame.append("waiting for the opponent to play")
+        self.renderer.render(frame)
 
     def celebrate_win(self) -> None:
         """
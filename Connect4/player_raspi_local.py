@@ -1,11 +1,17 @@
 import time
 
-from sense_hat import SenseHat #type: ignore
+try:
+    from sense_hat import SenseHat #type: ignore
+except ImportError:
+    # only used for type hints. Without the sense_hat package, the player runs with a FakeSenseHat (see fake_sense_hat.py)
+    SenseHat = None
 
 from game import Connect4
 from player_local import Player_Local
 from player_local import Action
-from player_local import BoardIcon
+from instrumentation import traced
+from sensehat_renderer import SenseHatRenderer
+import input_events
 
 
 class Player_Raspi_Local(Player_Local):
@@ -22,6 +28,7 @@ class Player_Raspi_Local(Player_Local):
         Parameters:
             game (Connect4): Game instance.
             sense (SenseHat): Shared SenseHat instance for all players. (if SHARED option is used)
+            cli_mirror (bool): Optional, default True. Also visualize the board in the terminal
         
         Raises:
             ValueError: If 'sense' is not provided in kwargs.
@@ -36,6 +43,9 @@ class Player_Raspi_Local(Player_Local):
             self.sense: SenseHat = kwargs["sense"]
         except KeyError:
             raise ValueError(f"{type(self).__name__} requires a 'sense' (SenseHat instance) attribute")
+        # players sharing a SenseHat share its renderer, so it knows which pixels are shown
+        self.sense_renderer = SenseHatRenderer.shared(self.sense)
+        self.cli_mirror = kwargs.get("cli_mirror", True)
     
     def register_in_game(self):
         """
@@ -51,13 +61,14 @@ class Player_Raspi_Local(Player_Local):
         self.name = "Raspberry"
         return self.game.register_player(self.id, name=self.name)
 
+    @traced("Player_Raspi_Local.visualize", "render")
     def visualize(self, fetch_board = True, write_turn = True) -> None:
         """
         Override the visualization of the local player, also visualizing on the Raspberry Pi.
 
         This function updates the LED matrix on the Raspberry Pi with the current state of the game board.
         It highlights the selected column, updates the board with player icons, and shows winning icons 
-        for players if applicable.
+        for players if applicable. Only the pixels that changed are written (see sensehat_renderer.py).
 
         Parameters:
             fetch_board (bool): If True, fetches the board from the game; otherwise, uses the cached board.
@@ -66,57 +77,25 @@ class Player_Raspi_Local(Player_Local):
         Returns:
             None
         """
-        # Define colors
-        nonboard = [0,0,0] # black for cells above the board
-        emptyIcon = [155, 155, 155]  # White for empty cells
-        icon1 = [255, 255, 0]  # Yellow for Player 1
-        icon2 = [255, 0, 0]  # Red for Player 2
-
-        winner_icon1 = [0, 255, 0] # Green for win Player 1
-        winner_icon2 = [255, 128, 0] # Orange for win Player 1
-
-        # Prepare the LED matrix (8x8)
-        matrix = [[nonboard for _ in range(8)] for _ in range(8)]
-        
         if fetch_board or self.board is None:
             board = self.game.get_board()
+            self.board = board # the CLI visualization below reuses the board instead of fetching it again
         else:
             board = self.board
 
         # visualize the choice on the top of the board
+        cursor_column = None
         if self.drop_position >= 0 and self.is_my_turn():
-            if self.icon == BoardIcon.player1.value:
-                highlight = [255, 255, 0]  # Yellow for Player 1
-            elif self.icon == BoardIcon.player2.value:
-                highlight = [255, 0, 0]  # Red for Player 2
-            top_row = [highlight if col == self.drop_position else nonboard for col in range(8)]
-
-            matrix[7-len(board[0])] = top_row 
-
-        # Map the Connect4 board onto the LED matrix
-        for x in range(len(board)):
-            for y in range(len(board[0])):
-                if board[x][y] == BoardIcon.player1.value:
-                    matrix[7 - y][x] = icon1
-                elif board[x][y] == BoardIcon.player2.value:
-                    matrix[7 - y][x] = icon2
-                elif board[x][y] == BoardIcon.player1_winning.value:
-                    matrix[7 - y][x] = winner_icon1
-                elif board[x][y] == BoardIcon.player2_winning.value:
-                    matrix[7 - y][x] = winner_icon2
-                elif board[x][y] == BoardIcon.empty.value:
-                    matrix[7-y][x] = emptyIcon
-
-        # Flatten the matrix and send it to the Sense HAT
-        flattened_matrix = [pixel for row in matrix for pixel in row]
-        self.sense.set_pixels(flattened_matrix)
-
-        # Also update the column selection
-        #self.visualize_choice(self.drop_position)
+            cursor_column = self.drop_position
+
+        # only the pixels that changed since the last frame are sent to the Sense HAT
+        self.sense_renderer.render(self.sense_renderer.frame(board, cursor_column, self.icon))
 
         # OPTIONAL: Visualize on CLI
-        super().visualize(fetch_board, write_turn)
+        if self.cli_mirror:
+            super().visualize(False, write_turn)
 
+    @traced("Player_Raspi_Local.get_action", "input")
     def get_action(self) -> int:
         """
         Override make_move for Raspberry Pi input using the Sense HAT joystick.
@@ -136,6 +115,18 @@ class Player_Raspi_Local(Player_Local):
                 elif event.direction == 'middle':
                     return Action.drop  
     
+    def input_source(self, mux:input_events.EventMux) -> input_events.ThreadSource:
+        """
+        The joystick can't be selected, a background thread waits for its events and posts the actions.
+
+        Parameters:
+            mux (EventMux): The event loop of the coordinator.
+
+        Returns:
+            ThreadSource: The (not yet started) source.
+        """
+        return input_events.ThreadSource(mux, self.get_action)
+
     def celebrate_win(self) -> None:
         """
         Celebrate CLI win of Raspberry Pi player.
@@ -0,0 +1,88 @@
+"""
+Adaptive polling of the server
+
+Clients can only learn about changes of the game by polling the server. The PollScheduler decides how long
+to wait before the next poll:
+    - after a change the next poll comes quickly (min_interval), the opponent might answer right away
+    - every poll without a change doubles the interval (exponential backoff) up to max_interval,
+      so idle clients (waiting for an opponent, opponent thinking) cause little load
+    - every interval is randomly stretched or shortened by the jitter, so many clients that started
+      at the same time don't poll the server in sync
+    - if nothing changed for timeout seconds, timed_out() returns True
+"""
+
+import random
+import time
+
+
+class PollScheduler:
+    """
+    Interval between two polls, with exponential backoff and jitter
+
+    Attributes:
+        min_interval (float):   seconds between polls right after a change
+        max_interval (float):   upper limit of the interval
+        factor (float):         growth of the interval per poll without change
+        jitter (float):         relative random deviation of every interval (0.2: +-20%)
+        timeout (float):        seconds without change after which timed_out() is True (None: never)
+        interval (float):       the current interval (without jitter)
+    """
+
+    def __init__(self, min_interval:float = 0.25, max_interval:float = 2.0, factor:float = 2.0,
+                 jitter:float = 0.2, timeout:float = None, seed:int = None) -> None:
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("intervals must satisfy 0 < min_interval <= max_interval")
+        if factor < 1 or not 0 <= jitter < 1:
+            raise ValueError("factor must be at least 1 and jitter between 0 and 1")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self.reset()
+
+    def reset(self) -> None:
+        """something changed (or will change soon, e.g. after an own move): poll quickly again"""
+        self.interval = self.min_interval
+        self.last_change = time.monotonic()
+
+    def touch(self) -> None:
+        """local activity (e.g. a key press): restart the timeout, but keep the interval"""
+        self.last_change = time.monotonic()
+
+    def next_delay(self, changed:bool = False) -> float:
+        """
+        Parameters:
+            changed (bool):     True if the last poll returned something new
+
+        Returns:
+            float:  seconds to wait before the next poll
+        """
+        if changed:
+            self.reset()
+        delay = self.interval * (1 + self.jitter * self._random.uniform(-1, 1))
+        self.interval = min(self.interval * self.factor, self.max_interval)
+        return delay
+
+    def idle_time(self) -> float:
+        """seconds since the last change"""
+        return time.monotonic() - self.last_change
+
+    def timed_out(self) -> bool:
+        return self.timeout is not None and self.idle_time() > self.timeout
+
+
+def add_arguments(parser) -> None:
+    """adds the --poll-min, --poll-max and --poll-timeout options to an argparse parser"""
+    parser.add_argument("--poll-min", type=float, default=0.25, metavar="SECONDS",
+                        help="interval between polls of the server right after a change")
+    parser.add_argument("--poll-max", type=float, default=2.0, metavar="SECONDS",
+                        help="longest interval between polls while nothing changes")
+    parser.add_argument("--poll-timeout", type=float, default=None, metavar="SECONDS",
+                        help="give up if the game did not change for this long (default: wait forever)")
+
+
+def from_arguments(args) -> PollScheduler:
+    """creates the scheduler from the options added by add_arguments"""
+    return PollScheduler(args.poll_min, args.poll_max, timeout=args.poll_timeout)
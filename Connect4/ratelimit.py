@@ -0,0 +1,117 @@
+"""
+Rate limiting and load shedding for the server
+
+RateLimiter: a token bucket per key (player id or client ip). A bucket holds up to `burst` tokens and refills with
+`rate` tokens per second, every request takes one token. A request that finds the bucket empty is rejected with the
+time until the next token is available (the Retry-After of the 429 answer), so a client that loops without pause
+only gets its fair share and the other games are not slowed down.
+The buckets are kept in an OrderedDict in the order they were last used: a lookup moves the bucket to the end,
+buckets that were idle long enough to be full again are dropped from the front (a full bucket is the same as
+no bucket), and there are never more than `max_keys` buckets. Every request costs O(1) time and the memory is bounded.
+
+ConcurrencyLimiter: the number of requests that are handled at the same time. A request that finds all slots taken
+waits a moment for a free one and is rejected (503, "try again later") otherwise, instead of queueing up
+behind the others until every request is slow.
+
+    limiter = RateLimiter(rate=20, burst=40)
+    retry_after = limiter.acquire(player_id)    # 0.0: allowed, otherwise seconds until the next token
+"""
+
+import collections
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token buckets per key, in a bounded LRU
+
+    Attributes:
+        rate (float):       tokens added per second
+        burst (float):      maximum number of tokens of a bucket (requests allowed at once after a pause)
+        max_keys (int):     maximum number of buckets (the least recently used one is dropped)
+        rejected (int):     number of rejected requests
+    """
+
+    def __init__(self, rate:float, burst:float = None, max_keys:int = 10000) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else 2 * rate
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets = collections.OrderedDict() # key -> [tokens, time.monotonic() of the last refill]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+    def acquire(self, key, cost:float = 1.0) -> float:
+        """
+        Take tokens from the bucket of the key
+
+        Returns:
+            float:  0.0 if the request is allowed, otherwise the seconds until enough tokens are available
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+            self._expire(now)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            self.rejected += 1
+            return (cost - bucket[0]) / self.rate
+
+    def _expire(self, now:float) -> None:
+        """drop the buckets that are full again and the least recently used ones beyond max_keys (lock held)"""
+        refill_time = self.burst / self.rate # an empty bucket is full again after this time
+        while self._buckets:
+            # the front bucket is the least recently used one, if it is not expired, no later one is
+            key, (_, last) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now - last < refill_time:
+                break
+            del self._buckets[key]
+
+
+class ConcurrencyLimiter:
+    """
+    Limits the number of requests handled at the same time
+
+    Attributes:
+        limit (int):        maximum number of concurrent requests
+        wait (float):       seconds a request waits for a free slot before it is rejected
+        active (int):       requests in progress
+        rejected (int):     number of rejected requests
+    """
+
+    def __init__(self, limit:int, wait:float = 0.05) -> None:
+        self.limit = limit
+        self.wait = wait
+        self.active = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """
+        Returns:
+            bool:   True if the request got a slot (release it with release), False if it should be rejected
+        """
+        if not self._slots.acquire(timeout=self.wait):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.active += 1
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
@@ -0,0 +1,185 @@
+"""
+Streaming analysis of game record logs (see game_record.py)
+
+The analysis is a chain of generators, so only one record is held in memory at a time:
+    read_records  ->  replay (optional, validates every record with the Connect4 engine)  ->  RecordStatistics.add
+
+Usage:
+    python record_analyzer.py games.ndjson more_games.bin [--no-replay] [--json]
+"""
+
+import argparse
+import json
+from collections import Counter
+
+from game import Connect4
+import game_record
+from game_record import GameRecord
+
+
+class ReplayError(ValueError):
+    """Raised when a record contains an illegal move or its stored result does not match the replay"""
+
+
+def replay(records, strict:bool = False):
+    """
+    Replays every record through the Connect4 engine.
+
+    The result stored in a record is replaced by the result of the replay, so corrupted records
+    can't distort the statistics.
+
+    Parameters:
+        records (iterable):     GameRecords
+        strict (bool):          raise a ReplayError for invalid records instead of skipping them
+
+    Yields:
+        GameRecord:             the valid records
+    """
+    first_id, second_id = "first", "second"
+    for record in records:
+        game = Connect4(record.width, record.height, verbose=False)
+        game.register_player(first_id, record.players[0], icon=record.first_icon)
+        game.register_player(second_id, record.players[1])
+        try:
+            for column in record.columns():
+                if game.winner is not None or not 0 <= column < record.width:
+                    raise ReplayError(f"illegal move in {record}")
+                if not game.check_move(column, id=first_id if game.activeplayer == 0 else second_id):
+                    raise ReplayError(f"illegal move in {record}")
+            replayed = GameRecord.from_game(game).result
+            if record.result is not None and replayed != record.result:
+                raise ReplayError(f"stored result {record.result} does not match the replay ({replayed}) in {record}")
+        except ReplayError:
+            if strict:
+                raise
+            continue
+        record.result = replayed
+        yield record
+
+
+class RecordStatistics:
+    """
+    Aggregated statistics over a stream of game records (constant memory: only counters are kept)
+
+    Attributes:
+        games (int):                number of analyzed records
+        results (Counter):          number of games per result code (see game_record.RESULT_*)
+        lengths (Counter):          number of games per game length (number of moves)
+        first_moves (Counter):      how often each column was chosen as first move
+        first_move_results (dict):  results (Counter) per first move column
+        board_sizes (Counter):      number of games per (width, height)
+    """
+
+    def __init__(self) -> None:
+        self.games = 0
+        self.results = Counter()
+        self.lengths = Counter()
+        self.first_moves = Counter()
+        self.first_move_results = {}
+        self.board_sizes = Counter()
+
+    def add(self, record:GameRecord) -> None:
+        """adds a single record to the statistics"""
+        self.games += 1
+        self.results[record.result] += 1
+        self.lengths[len(record.moves)] += 1
+        self.board_sizes[(record.width, record.height)] += 1
+        if record.moves:
+            first_move = game_record.decode_moves(record.moves[0])[0]
+            self.first_moves[first_move] += 1
+            self.first_move_results.setdefault(first_move, Counter())[record.result] += 1
+
+    def consume(self, records) -> "RecordStatistics":
+        """adds all records of an iterable, returns itself"""
+        for record in records:
+            self.add(record)
+        return self
+
+    def win_rates(self, results:Counter = None) -> dict:
+        """
+        Parameters:
+            results (Counter):  the results to summarize (default: all games)
+
+        Returns:
+            dict:   fraction of first player wins, second player wins, draws and unfinished games
+        """
+        results = self.results if results is None else results
+        total = sum(results.values()) or 1
+        return {"first": results[game_record.RESULT_FIRST_WINS] / total,
+                "second": results[game_record.RESULT_SECOND_WINS] / total,
+                "draw": results[game_record.RESULT_DRAW] / total,
+                "unfinished": results[game_record.RESULT_UNFINISHED] / total}
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict:   json serializable summary of all statistics
+        """
+        total_moves = sum(length * count for length, count in self.lengths.items())
+        return {
+            "games": self.games,
+            "win_rates": self.win_rates(),
+            "length": {"mean": total_moves / self.games if self.games else 0,
+                       "min": min(self.lengths) if self.lengths else 0,
+                       "max": max(self.lengths) if self.lengths else 0,
+                       "histogram": {str(length): count for length, count in sorted(self.lengths.items())}},
+            "first_moves": {str(column): {"games": count,
+                                          "win_rates": self.win_rates(self.first_move_results[column])}
+                            for column, count in sorted(self.first_moves.items())},
+            "board_sizes": {f"{width}x{height}": count for (width, height), count in self.board_sizes.items()},
+        }
+
+
+def iter_logs(paths):
+    """
+    Yields:
+        GameRecord:     all records of all logs, one after another
+    """
+    for path in paths:
+        yield from game_record.read_records(path)
+
+
+def analyze(paths, replay_games:bool = True) -> RecordStatistics:
+    """
+    Analyze one or more record logs
+
+    Parameters:
+        paths (list):           paths to NDJSON or binary record logs
+        replay_games (bool):    validate each record by replaying it with the Connect4 engine
+
+    Returns:
+        RecordStatistics:       the aggregated statistics
+    """
+    records = iter_logs(paths)
+    if replay_games:
+        records = replay(records)
+    return RecordStatistics().consume(records)
+
+
+def print_summary(summary:dict) -> None:
+    """prints a summary (see RecordStatistics.summary) in a human readable form"""
+    print(f"games:            {summary['games']}")
+    rates = summary["win_rates"]
+    print(f"first player:     {rates['first']:.1%}")
+    print(f"second player:    {rates['second']:.1%}")
+    print(f"draws:            {rates['draw']:.1%}")
+    print(f"unfinished:       {rates['unfinished']:.1%}")
+    length = summary["length"]
+    print(f"game length:      mean {length['mean']:.1f}, min {length['min']}, max {length['max']}")
+    print("first moves:")
+    for column, stats in summary["first_moves"].items():
+        print(f"    column {column}: {stats['games']} games, first player wins {stats['win_rates']['first']:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statistics over Connect 4 game record logs")
+    parser.add_argument("logs", nargs="+", help="NDJSON (.ndjson/.jsonl) or binary record logs")
+    parser.add_argument("--no-replay", action="store_true", help="trust the stored results instead of replaying every game")
+    parser.add_argument("--json", action="store_true", help="print the summary as json")
+    args = parser.parse_args()
+
+    statistics = analyze(args.logs, replay_games=not args.no_replay)
+    if args.json:
+        print(json.dumps(statistics.summary(), indent=2))
+    else:
+        print_summary(statistics.summary())
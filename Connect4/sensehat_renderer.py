@@ -0,0 +1,128 @@
+"""
+Rendering of the board on the 8x8 LED matrix of the Sense HAT
+
+Writing to the LED matrix goes over I2C and is slow, so the SenseHatRenderer remembers the last frame
+and only writes the pixels that changed (or nothing at all, if the frame did not change).
+All colors are preallocated tuples and the pixel index of every board cell is computed once per board size.
+"""
+
+import weakref
+
+# colors (r, g, b)
+NONBOARD = (0, 0, 0)            # black for cells above the board
+EMPTY = (155, 155, 155)         # white for empty cells
+PLAYER1 = (255, 255, 0)         # yellow for player 1 ('X')
+PLAYER2 = (255, 0, 0)           # red for player 2 ('O')
+WINNER1 = (0, 255, 0)           # green for the winning coins of player 1
+WINNER2 = (255, 128, 0)         # orange for the winning coins of player 2
+
+# color per board value
+CELL_COLORS = {'': EMPTY, 'X': PLAYER1, 'O': PLAYER2, 'x': WINNER1, 'o': WINNER2}
+# color of the drop position per player icon
+CURSOR_COLORS = {'X': PLAYER1, 'O': PLAYER2}
+
+MATRIX_SIZE = 8
+
+
+class SenseHatRenderer:
+    """
+    Draws boards to the LED matrix of a Sense HAT, only writing the pixels that changed
+
+    Attributes:
+        sense (SenseHat):               the Sense HAT
+        full_update_threshold (int):    if more pixels changed, the whole matrix is written with one set_pixels call
+        previous (list):                the 64 colors currently shown (None: unknown)
+        pixels_written (int):           number of pixels written so far (for measurements)
+    """
+
+    # one renderer per Sense HAT, so players that share a Sense HAT know what is currently shown
+    _shared = weakref.WeakKeyDictionary()
+
+    def __init__(self, sense, full_update_threshold:int = 16) -> None:
+        self.sense = sense
+        self.full_update_threshold = full_update_threshold
+        self.previous = None
+        self.pixels_written = 0
+        self._layouts = {}
+
+    @classmethod
+    def shared(cls, sense) -> "SenseHatRenderer":
+        """
+        Returns:
+            SenseHatRenderer:   the renderer of the given Sense HAT (created on the first call)
+        """
+        renderer = cls._shared.get(sense)
+        if renderer is None:
+            renderer = cls._shared[sense] = cls(sense)
+        return renderer
+
+    def invalidate(self) -> None:
+        """forget the shown frame (e.g. after something else was drawn on the matrix)"""
+        self.previous = None
+
+    def _layout(self, width:int, height:int) -> tuple:
+        """
+        Returns:
+            tuple:  (pixel index per cell as [x][y], pixel index of the header row per column)
+        """
+        layout = self._layouts.get((width, height))
+        if layout is None:
+            cells = [[(MATRIX_SIZE - 1 - y) * MATRIX_SIZE + x for y in range(height)] for x in range(width)]
+            header_row = MATRIX_SIZE - 1 - height
+            header = [header_row * MATRIX_SIZE + x for x in range(width)] if header_row >= 0 else None
+            layout = self._layouts[(width, height)] = (cells, header)
+        return layout
+
+    def frame(self, board, cursor_column:int = None, cursor_icon:str = None) -> list:
+        """
+        Build the 64 colors of a board
+
+        Parameters:
+            board (Array):          board in the layout of Connect4.get_board (at most 8x7)
+            cursor_column (int):    column of the drop position, shown above the board (None: no cursor)
+            cursor_icon (str):      icon of the player whose drop position is shown
+
+        Returns:
+            list:   64 colors, row by row from the top left
+        """
+        width = len(board)
+        height = len(board[0])
+        cells, header = self._layout(width, height)
+        frame = [NONBOARD] * (MATRIX_SIZE * MATRIX_SIZE)
+        if cursor_column is not None and header is not None and cursor_icon in CURSOR_COLORS:
+            frame[header[cursor_column]] = CURSOR_COLORS[cursor_icon]
+        for x in range(width):
+            column = board[x]
+            indices = cells[x]
+            for y in range(height):
+                # unknown values stay black
+                frame[indices[y]] = CELL_COLORS.get(column[y], NONBOARD)
+        return frame
+
+    def render(self, frame:list) -> int:
+        """
+        Show a frame on the LED matrix
+
+        Parameters:
+            frame (list):   64 colors (see frame)
+
+        Returns:
+            int:    number of pixels that were written
+        """
+        previous = self.previous
+        if previous is not None and frame == previous:
+            return 0
+        if previous is None:
+            changed = None
+        else:
+            changed = [index for index in range(MATRIX_SIZE * MATRIX_SIZE) if frame[index] != previous[index]]
+        if changed is None or len(changed) > self.full_update_threshold:
+            self.sense.set_pixels(frame)
+            written = len(frame)
+        else:
+            for index in changed:
+                self.sense.set_pixel(index % MATRIX_SIZE, index // MATRIX_SIZE, frame[index])
+            written = len(changed)
+        self.previous = frame
+        self.pixels_written += written
+        return written
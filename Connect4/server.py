@@ -1,14 +1,112 @@
 import uuid
+import math # Retry-After in whole seconds
 import json # not needed, if names don't need to be generated
 import random # dito
 import os # dito
 import socket                                               # to get own IP
-from flask import Flask, request, jsonify, current_app                   # for api
+import time                                                 # for request latency metrics
+import threading                                            # the engine moves are applied from the threads of the engine pool
+from flask import Flask, request, jsonify, current_app, g, Response     # for api
 from flask_swagger_ui import get_swaggerui_blueprint        # for swagger documentation
 
 
 # local includes
 from game import Connect4
+from metrics import MetricsRegistry
+from spectators import SpectatorHub
+from analysis import Analyzer
+from bot import Position
+from engine_pool import EnginePool, EngineBusy
+from lobby import Lobby
+from clocks import TimerQueue, GameClock
+from ratelimit import RateLimiter, ConcurrencyLimiter
+
+# id of the game that is used when a request has no game_id (the single game of the original api)
+DEFAULT_GAME = "default"
+# endpoints without rate and concurrency limits (monitoring and documentation)
+UNLIMITED_ENDPOINTS = ("index", "get_metrics", "static")
+# endpoints that hold their connection open (streams, long polls), they don't take a concurrency slot
+LONG_LIVED_ENDPOINTS = ("spectate", "wait_in_lobby")
+# batch endpoints -> json field with the items, every item takes a token of the ip rate limit
+BATCH_ENDPOINTS = {"batch_state": "game_ids", "batch_moves": "moves"}
+
+
+def decode_board(rows:list) -> list:
+    """
+    Convert a board in the format of the api (list of rows, row 0 is the top) to the layout of Connect4.get_board
+
+    Returns:
+        board (list):   board[x][y], y=0 is the bottom
+    """
+    return [[rows[row][column] for row in range(len(rows)-1, -1, -1)] for column in range(len(rows[0]))]
+
+
+def retry_response(description:str, retry_after:float, code:int) -> Response:
+    """
+    Returns:
+        Response:   error response (429 or 503) with a Retry-After header (whole seconds, at least 1)
+    """
+    response = jsonify({"description": description, "details": f"retry after {retry_after:.2f} seconds"})
+    response.status_code = code
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def game_state(game:Connect4) -> str:
+    """
+    Returns:
+        str:    "waiting" (for players), "active" or "finished"
+    """
+    if game.turn_counter < 0:
+        return "waiting"
+    if game.winner is not None or game.turn_counter >= game.width * game.height:
+        return "finished"
+    return "active"
+
+
+def valid_game_id(game_id) -> bool:
+    """a game id of a request is a string, or None for the default game"""
+    return game_id is None or isinstance(game_id, str)
+
+
+def encode_board(board) -> list:
+    """
+    Convert a board in the layout of Connect4.get_board (board[x][y], y=0 is the bottom) to the format of the api
+
+    Returns:
+        board (list):   list of rows, row 0 is the top
+    """
+    # rearrange y positions so that 0 is at the top
+    return [
+            [board[collumn][row] for collumn in range(len(board))] # constructs a row of the board
+             for row in range(len(board[0])-1, -1, -1) # collummns get flipped because the zero point of the game is at the bottom, 
+                                                       #but the one that the server should return at the top
+             ]
+
+
+class GameSession:
+    """
+    One game of the server
+
+    Attributes:
+        game_id (str):              id of the game in the api
+        game (Connect4):            the game (with all game rules)
+        spectators (SpectatorHub):  streams every change of this game to the spectators of /connect4/spectate
+        lock (RLock):               held while the game is changed (by request threads, engine callbacks and timers)
+        clock (GameClock):          move clock of the game (None: no time control)
+        timer (Timer):              the pending timer of the game (move clock or reclaim), see Connect4Server.schedule_session
+    """
+
+    def __init__(self, game_id:str, width:int = 8, height:int = 7, max_spectators:int = None,
+                 spectator_buffer:int = 64, clock:GameClock = None) -> None:
+        self.game_id = game_id
+        # only the default game prints its events, the lobby creates many games
+        self.game = Connect4(width, height, verbose=game_id == DEFAULT_GAME)
+        self.spectators = SpectatorHub(spectator_buffer, max_spectators)
+        self.lock = threading.RLock()
+        self.clock = clock
+        self.timer = None
+        self.generation = 0 # counts the reschedules, a timer that fires after its game changed is ignored
 
 
 class Connect4Server:
@@ -17,19 +115,84 @@ class Connect4Server:
         Runs on Localhost
     
     Attributes
-        game (Connect4):    Local Instance of Connect4 Game (with all game rules)
+        games (dict):       game id -> GameSession. The game "default" always exists and is used by requests
+                            without game_id, the lobby adds a new game for every pair of players
+        game (Connect4):    Local Instance of the default Connect4 Game (with all game rules)
         app (Flask):        Web Server Instance
+        metrics (MetricsRegistry):  Request, game and move metrics, exposed in the Prometheus format on /metrics
+        analyzer (Analyzer):        Scores positions for /connect4/analyze, with a LRU cache of the results
+        analysis_pool (EnginePool): Worker processes for the searches of the analyzer
+        engine (EnginePool):        Computes the moves of engine opponents (/connect4/engine) in worker processes
+        engine_players (dict):      player id -> search depth of the engine players
+        lobby (Lobby):              Pairs the players waiting in /connect4/lobby into new games
+        timers (TimerQueue):        The move clocks and reclaim timers of all games, served by a single thread
+        player_limiter, ip_limiter (RateLimiter):   Token buckets per player id and per client ip (None: no limit)
+        concurrency (ConcurrencyLimiter):           Limits the requests handled at the same time (None: no limit)
 
     """
-    def __init__(self):
+    def __init__(self, max_spectators:int = None, spectator_buffer:int = 64,
+                 analysis_depth:int = 8, analysis_max_depth:int = 10, analysis_cache:int = 4096,
+                 analysis_workers:int = 1, analysis_queue:int = 4,
+                 engine_workers:int = 2, engine_queue:int = 16, engine_depth:int = 8, engine_max_depth:int = 12,
+                 lobby_batch_interval:float = 0.25, move_time:float = None, base_time:float = None,
+                 increment:float = 0.0, idle_timeout:float = 600.0, finished_ttl:float = 300.0,
+                 player_rate:float = 20.0, player_burst:float = 40.0, ip_rate:float = 200.0, ip_burst:float = 400.0,
+                 max_concurrent:int = 64, batch_limit:int = 256):
         """
         Create a Connect4 Server on localhost (127.0.0.1)
         - Add SWAGGER UI Documentation
         - Expose API Methods
+
+        Parameters:
+            max_spectators (int):   maximum number of spectator streams (None: no limit)
+            spectator_buffer (int): events buffered per spectator, a spectator that falls further behind is dropped
+            analysis_depth (int):   default search depth of /connect4/analyze (analysis_max_depth: maximum depth)
+            analysis_cache (int):   number of analyzed positions kept in the cache
+            analysis_workers (int): processes that search the positions of /connect4/analyze that are not cached
+            analysis_queue (int):   analyses that may wait for a worker (more: the request is answered with 503)
+            engine_workers (int):   processes that compute the moves of engine opponents
+            engine_queue (int):     engine searches that may wait for a worker (more: the request is answered with 503)
+            engine_depth (int):     default search depth of engine opponents (engine_max_depth: maximum depth)
+            lobby_batch_interval (float): seconds between two pairing rounds of the lobby
+            move_time (float):      seconds a player has for a move, a player that runs out of time
+                                    forfeits the game (None: no limit)
+            base_time (float):      seconds a player has for the whole game (None: no limit),
+                                    increment (float): seconds added after every move
+            idle_timeout (float):   seconds without a move after which the player to move of a game without
+                                    time control forfeits (e.g. disconnected), and a lobby game still waiting
+                                    for players is reclaimed (None or 0: never)
+            finished_ttl (float):   seconds a finished game is kept, before it is reclaimed.
+                                    The default game is reset instead of removed (None: never reclaim)
+            player_rate (float):    requests per second of a player id (player_burst: at once after a pause),
+                                    more are answered with 429 and Retry-After (None: no limit)
+            ip_rate (float):        requests per second of a client ip (ip_burst: at once), None: no limit
+            max_concurrent (int):   requests handled at the same time, more are answered with 503 and Retry-After
+                                    (streams and long polls don't count, None: no limit)
+            batch_limit (int):      maximum number of games / moves in one request of /connect4/batch
         """
 
-        self.game = Connect4(8,7)  # Connect4 game instance
         self.app = Flask(__name__)  # Flask app instance
+        self.max_spectators = max_spectators
+        self.spectator_buffer = spectator_buffer
+        self.games = {}
+        self.games_lock = threading.Lock()
+        self.analysis_pool = EnginePool(analysis_workers, analysis_queue, analysis_depth)
+        self.analyzer = Analyzer(analysis_depth, analysis_max_depth, analysis_cache, pool=self.analysis_pool)
+        self.engine = EnginePool(engine_workers, engine_queue, engine_depth, on_finished=self.observe_engine_search)
+        self.engine_max_depth = engine_max_depth
+        self.engine_players = {}
+        self.lobby = Lobby(self.create_lobby_game, lobby_batch_interval,
+                           on_matched=lambda seconds: self.lobby_wait.observe(seconds))
+        self.move_time = move_time
+        self.base_time = base_time
+        self.increment = increment
+        self.idle_timeout = idle_timeout or None
+        self.finished_ttl = finished_ttl
+        self.timers = TimerQueue("game-timers")
+        self.player_limiter = None if player_rate is None else RateLimiter(player_rate, player_burst)
+        self.ip_limiter = None if ip_rate is None else RateLimiter(ip_rate, ip_burst)
+        self.concurrency = None if max_concurrent is None else ConcurrencyLimiter(max_concurrent)
+        self.batch_limit = batch_limit
 
         # Swagger UI Configuration
         SWAGGER_URL = '/swagger/connect4/'
@@ -49,7 +212,506 @@ class Connect4Server:
 
 
         # Define API routes within the constructor
+        self.setup_metrics()
+        self.setup_limits()
         self.setup_routes()
+        self.create_game(DEFAULT_GAME)
+
+    @property
+    def game(self) -> Connect4:
+        """the default game (used by requests without game_id)"""
+        return self.games[DEFAULT_GAME].game
+
+    def create_game(self, game_id:str = None, width:int = 8, height:int = 7) -> GameSession:
+        """
+        Parameters:
+            game_id (str):  id of the new game (default: a new random id)
+
+        Returns:
+            GameSession:    the new game
+        """
+        session = GameSession(game_id or uuid.uuid4().hex[:12], width, height, self.max_spectators, self.spectator_buffer,
+                              self.make_clock())
+        with self.games_lock:
+            self.games[session.game_id] = session
+        with session.lock:
+            self.schedule_session(session)
+            self.publish_state(session, "state")
+        return session
+
+    def create_lobby_game(self, tickets:list) -> tuple:
+        """
+        Create a game for two players of the lobby and register them (called by the pairing thread of the lobby)
+
+        Returns:
+            tuple:  (game id, {player id: icon})
+        """
+        width, height = tickets[0].board_size or (8, 7)
+        session = self.create_game(width=width, height=height)
+        icons = {}
+        with session.lock:
+            for ticket in tickets:
+                icons[ticket.player_id] = session.game.register_player(ticket.player_id, ticket.name or "Player")
+                self.schedule_session(session)
+                self.publish_state(session, "register", icon=icons[ticket.player_id], name=ticket.name)
+        return session.game_id, icons
+
+    def get_session(self, game_id:str = None):
+        """
+        Returns:
+            GameSession:    the game with the id (the default game if game_id is None), None if there is none
+        """
+        with self.games_lock:
+            return self.games.get(game_id or DEFAULT_GAME)
+
+    def requested_session(self, data:dict = None):
+        """
+        Returns:
+            GameSession:    the game of the request (game_id in the json body or the query string), None if unknown
+        """
+        return self.get_session((data or {}).get("game_id") or request.args.get("game_id"))
+
+    def publish_state(self, session:GameSession, event:str, **fields) -> None:
+        """
+        Send the board and status to all spectators of the game, encoded once for all of them (see spectators.py)
+
+        Parameters:
+            event (str):    name of the event ("state", "register" or "move")
+            fields:         additional fields of the event (e.g. the played column)
+        """
+        state = self.game_snapshot(session)
+        state.update(fields)
+        session.spectators.publish(event, state)
+
+    def game_snapshot(self, session:GameSession) -> dict:
+        """
+        Returns:
+            dict:   game_id, board (in the format of /connect4/board), status (None before the first player registered)
+                    and clock (only with time control) of the game
+        """
+        with session.lock:
+            game = session.game
+            state = {"game_id": session.game_id,
+                     "board": encode_board(game.get_board()),
+                     "status": game.get_status() if game.players else None}
+            if session.clock is not None:
+                state["clock"] = self.clock_status(session)
+        return state
+
+    def apply_move(self, session:GameSession, column:int, player_id:str) -> bool:
+        """
+        Validate and apply a move of a player or an engine (through Connect4.check_move), notify the spectators
+        and start the search of an engine opponent, if it is its turn now
+
+        Returns:
+            bool:   True if the move was legal (False also after the game ended, e.g. by a forfeit)
+
+        Raises:
+            EngineBusy: if the opponent is an engine and the engine pool is full (the move is not applied)
+        """
+        with session.lock:
+            game = session.game
+            players = game.players
+            opponent = [player for player in players if player != player_id]
+            if game.winner is not None or player_id not in game.player_info:
+                return False # the game is over, or the player is not part of it (e.g. the game was reset)
+            if not 0 <= column < game.width:
+                return False
+            own_turn = len(players) == 2 and players[game.activeplayer] == player_id
+            if own_turn and opponent[0] in self.engine_players and self.engine.full():
+                raise EngineBusy("the engine can't reply now, try again later")
+            with self.move_latency.time():
+                legal = game.check_move(column, id=player_id)
+            if not legal:
+                return False
+            self.schedule_session(session)
+            self.publish_state(session, "move", column=column, icon=game.player_info[player_id][0])
+            self.start_engine_move(session)
+            return True
+
+    def apply_batch_move(self, move) -> dict:
+        """
+        Apply one move of /connect4/batch/moves, errors only concern this move
+
+        Parameters:
+            move (dict):    game_id, column and player_id
+
+        Returns:
+            dict:   game_id, ok (the move was applied), code (the status code a single /connect4/check_move would
+                    have answered with) and description if the move was not applied,
+                    retry_after (seconds) if the player is rate limited (429) or the engine is busy (503)
+        """
+        if not isinstance(move, dict):
+            return {"game_id": None, "ok": False, "code": 400, "description": "A move must be an object"}
+        game_id = move.get("game_id")
+        if not valid_game_id(game_id):
+            return {"game_id": None, "ok": False, "code": 400, "description": "game_id must be a string"}
+        result = {"game_id": game_id, "ok": False}
+        column, player_id = move.get("column"), move.get("player_id")
+        if column is None or player_id is None:
+            return {**result, "code": 400, "description": "Column and Player ID are required"}
+        try:
+            column = int(column)
+        except (TypeError, ValueError):
+            return {**result, "code": 400, "description": "Column must be an integer"}
+        if self.player_limiter is not None:
+            # every move of a batch counts for its player, like a single /connect4/check_move
+            retry_after = self.player_limiter.acquire(str(player_id))
+            if retry_after:
+                self.rate_limited_counter.inc(scope="player")
+                return {**result, "code": 429, "description": "Too many requests",
+                        "retry_after": round(retry_after, 3)}
+        session = self.get_session(game_id)
+        if session is None:
+            return {**result, "code": 404, "description": "Unknown game"}
+        try:
+            legal = self.apply_move(session, column, player_id)
+        except EngineBusy:
+            self.engine_busy_counter.inc()
+            return {**result, "code": 503, "description": "Engine busy", "retry_after": 0.5}
+        except Exception as e:
+            return {**result, "code": 500, "description": f"Failed to make move: {e}"}
+        if not legal:
+            self.illegal_move_counter.inc()
+            return {**result, "code": 400, "description": "Illegal move"}
+        return {**result, "ok": True, "code": 200}
+
+    def start_engine_move(self, session:GameSession) -> None:
+        """
+        Send the position to the engine pool, if an engine is the player to move in a running game.
+        The move is applied by the callback of the pool, if the game didn't change in the meantime.
+        If the pool is busy or the search fails, the search is started again later (by the timer queue),
+        the move that led to this position stays applied.
+        """
+        with session.lock:
+            game = session.game
+            if game.turn_counter < 0 or game.winner is not None or game.turn_counter >= game.width * game.height:
+                return
+            engine_id = game.players[game.activeplayer]
+            if engine_id not in self.engine_players:
+                return
+            position = Position.from_board(game.get_board(), game.player_info[engine_id][0])
+            turn = game.turn_counter
+
+            def play(column:int) -> None:
+                with session.lock:
+                    if game.turn_counter != turn:
+                        return
+                    try:
+                        self.apply_move(session, column, engine_id)
+                    except EngineBusy:
+                        # the opponent is an engine too and the pool is full, apply the move shortly
+                        self.timers.schedule(0.5, play, column)
+
+            def failed(error:Exception) -> None:
+                self.engine_error_counter.inc()
+                self.app.logger.error("engine search of game %s failed, trying again: %r", session.game_id, error)
+                self.timers.schedule(1.0, self.retry_engine_move, session, turn)
+
+            try:
+                self.engine.submit(position, play, self.engine_players[engine_id], on_error=failed)
+            except EngineBusy:
+                # the queue filled up since the move was accepted, try again shortly (rare)
+                self.timers.schedule(0.5, self.retry_engine_move, session, turn)
+            except Exception as e:
+                failed(e)
+
+    def retry_engine_move(self, session:GameSession, turn:int) -> None:
+        """start the search of an engine again (called by the timer queue), if the game is still at the same turn"""
+        with session.lock:
+            if session.game.turn_counter == turn:
+                self.start_engine_move(session)
+
+    def make_clock(self):
+        """
+        Returns:
+            GameClock:  the move clock for a new game, None if the server has no time control
+        """
+        if self.move_time is None and self.base_time is None:
+            return None
+        return GameClock(self.base_time, self.increment, self.move_time)
+
+    def schedule_session(self, session:GameSession) -> None:
+        """
+        Update the clock of the game and (re)arm its timer, after every change of the game (called with its lock held).
+        Every game has at most one pending timer:
+            - a running game with time control: the deadline of the player to move (see session_timeout)
+            - a running game without time control: the player to move forfeits after idle_timeout without a move
+            - a finished game: reclaim after finished_ttl
+            - a lobby game still waiting for players: reclaim after idle_timeout
+        The default game is never reclaimed while it waits for players or runs (its players would lose the game).
+        """
+        game = session.game
+        now = time.monotonic()
+        state = game_state(game)
+        clock = session.clock
+        if clock is not None:
+            to_move = game.players[game.activeplayer] if state == "active" else None
+            if clock.running != to_move:
+                clock.stop(now, increment=to_move is not None)
+                if to_move is not None:
+                    clock.start(to_move, now)
+        if session.timer is not None:
+            self.timers.cancel(session.timer)
+            session.timer = None
+        session.generation += 1
+        if state == "active" and clock is not None and clock.deadline() is not None:
+            deadline = clock.deadline()
+        elif state == "finished" and self.finished_ttl is not None:
+            deadline = now + self.finished_ttl
+        elif self.idle_timeout is not None and (state == "active" or
+                                                (state == "waiting" and session.game_id != DEFAULT_GAME)):
+            deadline = now + self.idle_timeout
+        else:
+            return
+        session.timer = self.timers.schedule_at(deadline, self.session_timeout, session, session.generation)
+
+    def session_timeout(self, session:GameSession, generation:int) -> None:
+        """
+        Timer of a game (called by the timer thread): the player to move ran out of time or didn't move for
+        idle_timeout (no time control) and forfeits, or the game is reclaimed (it was waiting or finished).
+        A running game always ends as a forfeit that the players and spectators see, it is never reset.
+        """
+        with session.lock:
+            if session.generation != generation:
+                return # the game changed after the timer was due
+            game = session.game
+            state = game_state(game)
+            if state == "active":
+                reason = "time" if session.clock is not None and session.clock.deadline() is not None else "idle"
+                loser = game.players[game.activeplayer]
+                icon = game.player_info[loser][0]
+                game.forfeit(loser)
+                self.forfeit_counter.inc(reason=reason)
+                if game.verbose:
+                    print(f"{icon} ran out of time" if reason == "time" else f"{icon} didn't move, the game is over")
+                self.schedule_session(session)
+                self.publish_state(session, "forfeit", icon=icon, reason=reason)
+                return
+            self.reclaim_game(session, state)
+
+    def reclaim_game(self, session:GameSession, state:str) -> None:
+        """
+        Free a finished game or a lobby game whose players never came (called with its lock held): the game is
+        removed and its spectators are disconnected. The finished default game is reset instead (it always exists).
+        """
+        self.reclaimed_counter.inc(state=state)
+        for player_id in session.game.players:
+            self.engine_players.pop(player_id, None)
+        if session.game_id == DEFAULT_GAME:
+            session.game.reset()
+            session.clock = self.make_clock()
+            self.schedule_session(session)
+            self.publish_state(session, "state")
+            return
+        with self.games_lock:
+            self.games.pop(session.game_id, None)
+        session.spectators.close()
+
+    def clock_status(self, session:GameSession) -> dict:
+        """
+        Returns:
+            dict:   remaining time per icon ("remaining", only with base_time) and the seconds the player to move
+                    has left for the move ("move_deadline_s", None if no clock runs)
+        """
+        clock = session.clock
+        now = time.monotonic()
+        info = session.game.player_info
+        deadline = clock.deadline()
+        return {"remaining": {info[player_id][0]: round(seconds, 3) for player_id, seconds in clock.remaining(now).items()},
+                "move_deadline_s": None if deadline is None else round(max(deadline - now, 0.0), 3)}
+
+    def observe_engine_search(self, wait:float, seconds:float) -> None:
+        """called by the engine pool for every finished search"""
+        self.engine_wait.observe(wait)
+        self.engine_search.observe(seconds)
+
+    def position_from_request(self, data:dict, game:Connect4) -> Position:
+        """
+        Read the position to analyze from the body of /connect4/analyze
+
+        Parameters:
+            data (dict):    one of
+                            - moves (list of columns from the empty board), optional width and height
+                              (default: the board size of the server game)
+                            - board (in the format of /connect4/board), optional active_player (the icon to move,
+                              default: the icon with fewer coins, 'X' if both have the same number)
+                            - nothing: the current position of the game
+
+        Raises:
+            ValueError: if the moves or the board are invalid (e.g. floating coins, impossible coin counts)
+        """
+        if data.get("moves") is not None:
+            width = int(data.get("width", game.width))
+            height = int(data.get("height", game.height))
+            if width * (height + 1) > 128:
+                raise ValueError("board too large")
+            return Position.from_moves([int(column) for column in data["moves"]], width, height)
+        if data.get("board") is not None:
+            rows = data["board"]
+            if not rows or not rows[0] or any(len(row) != len(rows[0]) for row in rows):
+                raise ValueError("the rows of the board must have the same length")
+            board = decode_board(rows)
+            if len(board) * (len(board[0]) + 1) > 128:
+                raise ValueError("board too large")
+            coins = [str(cell).upper() for column in board for cell in column if cell]
+            if any(coin not in ("X", "O") for coin in coins):
+                raise ValueError("the board may only contain 'X', 'O' and ''")
+            for column in board:
+                if any(column[y] and not column[y - 1] for y in range(1, len(column))):
+                    raise ValueError("a coin can't float above an empty cell")
+            if abs(coins.count("X") - coins.count("O")) > 1:
+                raise ValueError("impossible number of coins, the players take turns")
+            icon = data.get("active_player")
+            if icon is None:
+                icon = "O" if coins.count("X") > coins.count("O") else "X"
+            icon = str(icon).upper()
+            if icon not in ("X", "O"):
+                raise ValueError("active_player must be 'X' or 'O'")
+            if coins.count(icon) > coins.count("O" if icon == "X" else "X"):
+                raise ValueError(f"{icon} has more coins on the board and can't be the player to move")
+            return Position.from_board(board, icon)
+        icon = game.get_status()["active_player"] if game.players else "X"
+        return Position.from_board(game.get_board(), icon)
+
+    def setup_metrics(self):
+        """
+        Create the metrics and measure every request
+            - request count and latency per route
+            - errors (5xx responses) and illegal moves
+            - number of waiting, active and finished games
+            - time needed to apply a move (Connect4.check_move)
+        """
+        self.metrics = MetricsRegistry()
+        self.request_counter = self.metrics.counter(
+            "connect4_http_requests_total", "Number of HTTP requests", ("route", "method", "status"))
+        self.request_latency = self.metrics.histogram(
+            "connect4_http_request_duration_seconds", "Time needed to answer a HTTP request", ("route",))
+        self.error_counter = self.metrics.counter(
+            "connect4_http_errors_total", "Number of requests answered with a server error (5xx)", ("route",))
+        self.illegal_move_counter = self.metrics.counter(
+            "connect4_illegal_moves_total", "Number of rejected moves")
+        self.move_latency = self.metrics.histogram(
+            "connect4_move_apply_duration_seconds", "Time needed by Connect4.check_move to validate and apply a move",
+            buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+        self.metrics.gauge("connect4_games", "Number of games by state", ("state",), callback=self.count_games)
+        self.metrics.gauge("connect4_spectators", "Number of connected spectator streams",
+                           callback=lambda: sum(len(hub) for hub in self.spectator_hubs()))
+        self.metrics.gauge("connect4_spectator_events", "Number of events published to the spectators",
+                           callback=lambda: sum(hub.published for hub in self.spectator_hubs()))
+        self.lobby_wait = self.metrics.histogram(
+            "connect4_lobby_wait_seconds", "Time players waited in the lobby for an opponent",
+            buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+        self.metrics.gauge("connect4_lobby_waiting", "Number of players waiting in the lobby",
+                           callback=lambda: self.lobby.waiting())
+        self.engine_wait = self.metrics.histogram(
+            "connect4_engine_wait_seconds", "Time engine searches waited in the queue for a worker process")
+        self.engine_search = self.metrics.histogram(
+            "connect4_engine_search_seconds", "Time needed by the engine to find a move",
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+        self.engine_busy_counter = self.metrics.counter(
+            "connect4_engine_busy_total", "Number of requests rejected because the engine queue was full")
+        self.engine_error_counter = self.metrics.counter(
+            "connect4_engine_errors_total", "Number of failed engine searches (they are started again)")
+        self.metrics.gauge("connect4_engine_restarts", "Number of times the engine workers were started again after a crash",
+                           callback=lambda: self.engine.restarts)
+        self.metrics.gauge("connect4_engine_queue_depth", "Number of pending engine searches (running and waiting)",
+                           callback=lambda: self.engine.pending)
+        self.metrics.gauge("connect4_analysis_cache_entries", "Number of positions in the analysis cache",
+                           callback=lambda: len(self.analyzer.cache))
+        self.analysis_busy_counter = self.metrics.counter(
+            "connect4_analysis_busy_total", "Number of analyses rejected because the analysis queue was full (503)")
+        self.metrics.gauge("connect4_analysis_queue_depth", "Number of pending analysis searches (running and waiting)",
+                           callback=lambda: self.analysis_pool.pending)
+        self.metrics.gauge("connect4_analysis_cache_lookups", "Number of analysis cache lookups by result", ("result",),
+                           callback=lambda: {("hit",): self.analyzer.cache.hits, ("miss",): self.analyzer.cache.misses})
+        self.metrics.gauge("connect4_spectators_dropped", "Number of spectators dropped because they read too slowly",
+                           callback=lambda: sum(hub.drops for hub in self.spectator_hubs()))
+        self.forfeit_counter = self.metrics.counter(
+            "connect4_forfeits_total", "Number of games lost by forfeit", ("reason",))
+        self.reclaimed_counter = self.metrics.counter(
+            "connect4_games_reclaimed_total", "Number of finished or abandoned games that were removed (or reset)", ("state",))
+        self.metrics.gauge("connect4_timers_pending", "Number of pending move clock and reclaim timers",
+                           callback=lambda: len(self.timers))
+
+        @self.app.before_request
+        def start_timer():
+            g.request_start = time.perf_counter()
+
+        @self.app.after_request
+        def record_request(response):
+            # label by the route pattern (not the requested path), so unknown urls don't create new time series
+            route = request.url_rule.rule.removeprefix("/connect4/") if request.url_rule else "unmatched"
+            duration = time.perf_counter() - g.get("request_start", time.perf_counter())
+            self.request_counter.inc(route=route, method=request.method, status=response.status_code)
+            self.request_latency.observe(duration, route=route)
+            if response.status_code >= 500:
+                self.error_counter.inc(route=route)
+            return response
+
+    def setup_limits(self):
+        """
+        Check every request against the rate limits (per player id and per client ip) and the concurrency limit
+            - 429 Too Many Requests with Retry-After, if the token bucket of the player or the ip is empty
+            - 503 Service Unavailable with Retry-After, if too many requests are in progress
+        The checks run before the request is parsed by the endpoint, a rejected request costs almost nothing.
+        """
+        self.rate_limited_counter = self.metrics.counter(
+            "connect4_rate_limited_total", "Number of requests rejected by the rate limits (429)", ("scope",))
+        self.shed_counter = self.metrics.counter(
+            "connect4_shed_requests_total", "Number of requests rejected because too many were in progress (503)")
+        self.metrics.gauge("connect4_requests_in_flight", "Number of requests in progress (without streams and long polls)",
+                           callback=lambda: self.concurrency.active if self.concurrency else 0)
+        self.metrics.gauge("connect4_rate_limit_buckets", "Number of token buckets by scope", ("scope",),
+                           callback=lambda: {("player",): len(self.player_limiter or ()), ("ip",): len(self.ip_limiter or ())})
+
+        @self.app.before_request
+        def check_limits():
+            if request.endpoint in UNLIMITED_ENDPOINTS or request.blueprint:
+                return None # the swagger ui is a blueprint
+            if self.ip_limiter is not None:
+                cost = 1.0
+                if request.endpoint in BATCH_ENDPOINTS:
+                    # a batch costs as much as its single requests would (at most a full bucket, so it can pass)
+                    items = (request.get_json(silent=True) or {}).get(BATCH_ENDPOINTS[request.endpoint])
+                    cost = min(max(len(items) if isinstance(items, list) else 1, 1), self.ip_limiter.burst)
+                retry_after = self.ip_limiter.acquire(request.remote_addr, cost)
+                if retry_after:
+                    self.rate_limited_counter.inc(scope="ip")
+                    return retry_response("Too many requests", retry_after, 429)
+            if self.player_limiter is not None:
+                player_id = request.args.get("player_id") or (request.get_json(silent=True) or {}).get("player_id")
+                retry_after = self.player_limiter.acquire(str(player_id)) if player_id else 0.0
+                if retry_after:
+                    self.rate_limited_counter.inc(scope="player")
+                    return retry_response("Too many requests", retry_after, 429)
+            if self.concurrency is not None and request.endpoint not in LONG_LIVED_ENDPOINTS:
+                if not self.concurrency.acquire():
+                    self.shed_counter.inc()
+                    return retry_response("Server busy, try again later", 1.0, 503)
+                g.concurrency_slot = True
+            return None
+
+        @self.app.teardown_request
+        def release_slot(error):
+            if g.pop("concurrency_slot", False):
+                self.concurrency.release()
+
+    def spectator_hubs(self) -> list:
+        with self.games_lock:
+            return [session.spectators for session in self.games.values()]
+
+    def count_games(self) -> dict:
+        """
+        Returns:
+            dict:   number of games per state (waiting for players, active, finished), used by the connect4_games gauge
+        """
+        counts = {("waiting",): 0, ("active",): 0, ("finished",): 0}
+        with self.games_lock:
+            games = [session.game for session in self.games.values()]
+        for game in games:
+            counts[(game_state(game),)] += 1
+        return counts
 
     def setup_routes(self):
         """
@@ -58,19 +720,42 @@ class Connect4Server:
             - /connect4/register
             - /connect4/board
             - /connect4/check_move
+            - /connect4/spectate
+            - /connect4/analyze
+            - /connect4/engine
+            - /connect4/lobby
+            - /connect4/batch/state, /connect4/batch/moves
+            - /metrics
+
+        All game endpoints take an optional game_id (query parameter for GET, json field for POST),
+        without it they use the default game
         """
         # Overall Description
         @self.app.route('/')
         def index():
             return "Welcome to the Connect 4 API!"
 
+        # Metrics in the Prometheus text format
+        @self.app.route('/metrics', methods=['GET'])
+        def get_metrics():
+            return Response(self.metrics.render(), mimetype=None, content_type=MetricsRegistry.CONTENT_TYPE)
+
 
 
         # 1. Expose get_status method
         @self.app.route('/connect4/status', methods=['GET'])
         def get_status():
             try:
-                status = self.game.get_status()
+                session = self.requested_session()
+                if session is None:
+                    return jsonify({"description": "Unknown game"}), 404
+                with session.lock:
+                    if not session.game.players:
+                        # the game was not started yet (or the finished default game was reset)
+                        return jsonify({"active_player": None, "active_id": None, "winner": None, "turn_number": -1})
+                    status = session.game.get_status()
+                    if session.clock is not None:
+                        status["clock"] = self.clock_status(session)
                 return jsonify(status)
             except Exception as e:
                 return jsonify({"description": "Failed to get game status", "details": str(e)}), 500
@@ -106,10 +791,17 @@ class Connect4Server:
                 if not uuid:
                     print("No uuid provided")
                     return jsonify({"description": "No uuid provided"}), 400
-                icon = self.game.register_player(uuid, name)
-                if icon is None:
-                    print("Maximum number of players reached")
-                    return jsonify({"description": "Maximum number of players reached"}), 400
+                session = self.requested_session(data)
+                if session is None:
+                    return jsonify({"description": "Unknown game"}), 404
+                with session.lock:
+                    icon = session.game.register_player(uuid, name)
+                    if icon is None:
+                        print("Maximum number of players reached")
+                        return jsonify({"description": "Maximum number of players reached"}), 400
+                    self.schedule_session(session)
+                    self.publish_state(session, "register", icon=icon, name=name)
+                    self.start_engine_move(session) # the engine may have the first move
                 return jsonify({"icon":icon})
             except Exception as e:
                 return jsonify({"error": "Failed to register player", "details": str(e)}), 500
@@ -123,13 +815,10 @@ class Connect4Server:
             # but we don't care if the game crashes, when the game is finished
             # ERROR: the format of the board from get_board does not match the specification
             try:
-                board = self.game.get_board()
-                # rearrange y positions so that 0 is at the top
-                board = [
-                        [board[collumn][row] for collumn in range(len(board))] # constructs a row of the board
-                         for row in range(len(board[0])-1, -1, -1) # collummns get flipped because the zero point of the game is at the bottom, 
-                                                                   #but the one that the server should return at the top
-                         ]
+                session = self.requested_session()
+                if session is None:
+                    return jsonify({"description": "Unknown game"}), 404
+                board = encode_board(session.game.get_board())
                 return jsonify({"board":board})
             except Exception as e:
                 return jsonify({"description": "Failed to retrieve board: {e}", "details": str(e)}), 500
@@ -146,12 +835,159 @@ class Connect4Server:
                 if column is None or player_id is None:
                     return jsonify({"description": "Column and Player ID are required"}), 400
                 column = int(column)
-                check_move = self.game.check_move(column, id=player_id)
+                session = self.requested_session(data)
+                if session is None:
+                    return jsonify({"description": "Unknown game"}), 404
+                try:
+                    check_move = self.apply_move(session, column, player_id)
+                except EngineBusy:
+                    self.engine_busy_counter.inc()
+                    return retry_response("Engine busy", 0.5, 503)
                 if not check_move:
+                    self.illegal_move_counter.inc()
                     return jsonify({"description": "Illegal move"}), 400
                 return jsonify(check_move)
             except Exception as e:
                 return jsonify({"description": f"Failed to make move: {e}", "details": str(e)}), 500
+
+        # 5. Stream the game to spectators (Server-Sent Events), instead of polling the board
+        @self.app.route('/connect4/spectate', methods=['GET'])
+        def spectate():
+            session = self.requested_session()
+            if session is None:
+                return jsonify({"description": "Unknown game"}), 404
+            try:
+                subscriber = session.spectators.subscribe()
+            except ConnectionRefusedError as e:
+                return jsonify({"description": "Too many spectators", "details": str(e)}), 503
+            return Response(subscriber.stream(), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        # 6. Add an engine opponent to the game ("play vs computer"), its moves are computed by the engine pool
+        @self.app.route('/connect4/engine', methods=['POST'])
+        def add_engine():
+            try:
+                data = request.get_json(silent=True) or {}
+                depth = min(max(int(data.get("depth", self.engine.depth)), 1), self.engine_max_depth)
+                session = self.requested_session(data)
+                if session is None:
+                    return jsonify({"description": "Unknown game"}), 404
+                if self.engine.full():
+                    self.engine_busy_counter.inc()
+                    return retry_response("Engine busy, try again later", 0.5, 503)
+                engine_id = str(uuid.uuid4())
+                with session.lock:
+                    name = f"Engine (depth {depth})"
+                    icon = session.game.register_player(engine_id, name)
+                    if icon is None:
+                        return jsonify({"description": "Maximum number of players reached"}), 400
+                    self.engine_players[engine_id] = depth
+                    self.schedule_session(session)
+                    self.publish_state(session, "register", icon=icon, name=name)
+                    self.start_engine_move(session)
+                return jsonify({"player_id": engine_id, "icon": icon, "depth": depth})
+            except ValueError as e:
+                return jsonify({"description": "Invalid depth", "details": str(e)}), 400
+            except Exception as e:
+                return jsonify({"description": f"Failed to add engine: {e}", "details": str(e)}), 500
+
+        # 7. Score every column of a position (results are cached per position)
+        @self.app.route('/connect4/analyze', methods=['POST'])
+        def analyze():
+            try:
+                data = request.get_json(silent=True) or {}
+                session = self.requested_session(data)
+                if session is None:
+                    return jsonify({"description": "Unknown game"}), 404
+                try:
+                    with session.lock:
+                        position = self.position_from_request(data, session.game)
+                    depth = data.get("depth")
+                    analysis = self.analyzer.analyze(position, None if depth is None else int(depth))
+                except (ValueError, TypeError, IndexError) as e:
+                    return jsonify({"description": "Invalid position", "details": str(e)}), 400
+                except (EngineBusy, TimeoutError):
+                    self.analysis_busy_counter.inc()
+                    return retry_response("Analysis busy, try again later", 1.0, 503)
+                return jsonify(analysis)
+            except Exception as e:
+                return jsonify({"description": f"Failed to analyze: {e}", "details": str(e)}), 500
+
+        # 8. Matchmaking: join the lobby, wait for a game (long poll) or leave
+        @self.app.route('/connect4/lobby', methods=['POST'])
+        def join_lobby():
+            try:
+                data = request.get_json(silent=True) or {}
+                player_id = data.get("player_id")
+                if not player_id:
+                    return jsonify({"description": "No uuid provided"}), 400
+                board_size = None
+                if data.get("width") is not None or data.get("height") is not None:
+                    board_size = (int(data.get("width", 8)), int(data.get("height", 7)))
+                    if not (4 <= board_size[0] <= 16 and 4 <= board_size[1] <= 16):
+                        return jsonify({"description": "Board size must be between 4 and 16"}), 400
+                ticket = self.lobby.join(str(player_id), data.get("name"), board_size)
+                return jsonify(ticket.to_dict()), 202 if ticket.game_id is None else 200
+            except Exception as e:
+                return jsonify({"description": f"Failed to join the lobby: {e}", "details": str(e)}), 500
+
+        @self.app.route('/connect4/lobby', methods=['GET'])
+        def wait_in_lobby():
+            try:
+                player_id = request.args.get("player_id")
+                timeout = min(max(float(request.args.get("timeout", 25)), 0.0), 60.0)
+                ticket = self.lobby.wait(str(player_id), timeout)
+                if ticket is None:
+                    return jsonify({"description": "Player is not in the lobby"}), 404
+                return jsonify(ticket.to_dict())
+            except ValueError as e:
+                return jsonify({"description": "Invalid timeout", "details": str(e)}), 400
+            except Exception as e:
+                return jsonify({"description": f"Failed to wait in the lobby: {e}", "details": str(e)}), 500
+
+        @self.app.route('/connect4/lobby', methods=['DELETE'])
+        def leave_lobby():
+            player_id = request.args.get("player_id") or (request.get_json(silent=True) or {}).get("player_id")
+            if not self.lobby.leave(str(player_id)):
+                return jsonify({"description": "Player is not waiting in the lobby"}), 404
+            return jsonify({"status": "left"})
+
+        # 9. Batches for clients with many games: the state of many games, moves in many games, in one request
+        @self.app.route('/connect4/batch/state', methods=['POST'])
+        def batch_state():
+            try:
+                data = request.get_json(silent=True) or {}
+                game_ids = data.get("game_ids")
+                if not isinstance(game_ids, list) or not game_ids:
+                    return jsonify({"description": "game_ids (list) is required"}), 400
+                if len(game_ids) > self.batch_limit:
+                    return jsonify({"description": f"At most {self.batch_limit} games per request"}), 400
+                games = []
+                for game_id in game_ids:
+                    if not valid_game_id(game_id):
+                        games.append({"game_id": None, "code": 400, "description": "game_id must be a string"})
+                        continue
+                    session = self.get_session(game_id)
+                    if session is None:
+                        games.append({"game_id": game_id, "code": 404, "description": "Unknown game"})
+                    else:
+                        games.append({**self.game_snapshot(session), "code": 200})
+                return jsonify({"games": games})
+            except Exception as e:
+                return jsonify({"description": f"Failed to get the games: {e}", "details": str(e)}), 500
+
+        @self.app.route('/connect4/batch/moves', methods=['POST'])
+        def batch_moves():
+            try:
+                data = request.get_json(silent=True) or {}
+                moves = data.get("moves")
+                if not isinstance(moves, list) or not moves:
+                    return jsonify({"description": "moves (list) is required"}), 400
+                if len(moves) > self.batch_limit:
+                    return jsonify({"description": f"At most {self.batch_limit} moves per request"}), 400
+                return jsonify({"results": [self.apply_batch_move(move) for move in moves]})
+            except Exception as e:
+                return jsonify({"description": f"Failed to make the moves: {e}", "details": str(e)}), 500
         
 
 
@@ -168,5 +1004,19 @@ class Connect4Server:
 
 # If you want to run the server directly:
 if __name__ == '__main__':
-    server = Connect4Server()  # Initialize the Connect4Server
+    import argparse
+    parser = argparse.ArgumentParser(description="Connect 4 game server")
+    parser.add_argument("--move-time", type=float, metavar="SECONDS", help="time per move, a player that runs out of time forfeits")
+    parser.add_argument("--base-time", type=float, metavar="SECONDS", help="time per player for the whole game")
+    parser.add_argument("--increment", type=float, default=0.0, metavar="SECONDS", help="time added after every move")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, metavar="SECONDS",
+                        help="a player that doesn't move for this long forfeits (0: never)")
+    parser.add_argument("--player-rate", type=float, default=20.0, help="requests per second of a player (0: no limit)")
+    parser.add_argument("--ip-rate", type=float, default=200.0, help="requests per second of a client ip (0: no limit)")
+    parser.add_argument("--max-concurrent", type=int, default=64, help="requests handled at the same time (0: no limit)")
+    args = parser.parse_args()
+    server = Connect4Server(move_time=args.move_time, base_time=args.base_time, increment=args.increment,
+                            idle_timeout=args.idle_timeout, player_rate=args.player_rate or None,
+                            player_burst=2 * args.player_rate, ip_rate=args.ip_rate or None, ip_burst=2 * args.ip_rate,
+                            max_concurrent=args.max_concurrent or None)  # Initialize the Connect4Server
     server.run()               # Start the Flask app
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Spectator fan-out: every game event is encoded once and the same bytes are sent to all spectators
+
+Spectators subscribe to a SpectatorHub and receive Server-Sent Events (text/event-stream) instead of polling the board.
+The hub encodes an event once when it is published and appends the same bytes object to the buffer of every
+subscriber, so the cost of an event doesn't depend on how often the spectators would have polled, and it only
+grows with the number of spectators by one append each.
+
+Every subscriber has a bounded buffer. A spectator that doesn't read fast enough (its buffer is full when the next
+event is published) is dropped: it gets no more events and its stream ends, so one slow connection can't make the
+server buffer an unlimited number of events. A dropped spectator reconnects and starts again from the current state,
+because new subscribers first receive the last published event (every event carries the full state).
+
+    hub = SpectatorHub()
+    hub.publish("move", {"column": 3, "board": ...})       # from the thread that applied the move
+    subscriber = hub.subscribe()
+    for chunk in subscriber.stream():                       # bytes of the text/event-stream, e.g. in a Flask Response
+        ...
+"""
+
+import collections
+import json
+import threading
+import time
+
+# comment line sent when there was no event for a while, so proxies don't close an idle stream
+HEARTBEAT = b": keepalive\n\n"
+
+
+def encode_event(event:str, data:dict, event_id:int) -> bytes:
+    """
+    Returns:
+        bytes:  one message of the Server-Sent Events format
+    """
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscriber:
+    """
+    Buffer of one spectator
+
+    Attributes:
+        buffer_size (int):  maximum number of buffered events
+        dropped (bool):     True if the subscriber was dropped because its buffer was full
+        closed (bool):      True if the subscriber was dropped or unsubscribed
+    """
+
+    def __init__(self, hub:"SpectatorHub", buffer_size:int) -> None:
+        self.hub = hub
+        self.buffer_size = buffer_size
+        self.dropped = False
+        self.closed = False
+        self._buffer = collections.deque()
+
+    def get(self, timeout:float = None):
+        """
+        Wait for the next event
+
+        Returns:
+            bytes:  the encoded event, or None if there was none within the timeout or the subscriber is closed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.hub._condition:
+            while not self._buffer and not self.closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.hub._condition.wait(remaining)
+            return self._buffer.popleft() if self._buffer else None
+
+    def stream(self, heartbeat:float = 15.0):
+        """
+        Yields:
+            bytes:  the encoded events (and heartbeats when idle) until the subscriber is closed.
+                    The subscriber is unsubscribed when the generator is closed (the client disconnected).
+        """
+        try:
+            while True:
+                chunk = self.get(heartbeat)
+                if chunk is not None:
+                    yield chunk
+                elif self.closed:
+                    if self.dropped:
+                        yield encode_event("dropped", {"reason": "too slow, reconnect to continue"}, 0)
+                    return
+                else:
+                    yield HEARTBEAT
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class SpectatorHub:
+    """
+    Publishes the events of a game to all subscribers
+
+    Attributes:
+        buffer_size (int):      default buffer size of new subscribers
+        max_subscribers (int):  subscribe raises ConnectionRefusedError if there are this many (None: no limit)
+        published (int):        number of published events
+        drops (int):            number of subscribers that were dropped for being too slow
+    """
+
+    def __init__(self, buffer_size:int = 64, max_subscribers:int = None) -> None:
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.drops = 0
+        self._subscribers = set()
+        self._condition = threading.Condition()
+        self._last_event = None # sent to new subscribers, so they start with the current state
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._subscribers)
+
+    def subscribe(self, buffer_size:int = None) -> Subscriber:
+        """
+        Raises:
+            ConnectionRefusedError: if max_subscribers is reached
+        """
+        subscriber = Subscriber(self, buffer_size or self.buffer_size)
+        with self._condition:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                raise ConnectionRefusedError("too many spectators")
+            if self._last_event is not None:
+                subscriber._buffer.append(self._last_event)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber:Subscriber) -> None:
+        with self._condition:
+            self._subscribers.discard(subscriber)
+            subscriber.closed = True
+            self._condition.notify_all()
+
+    def publish(self, event:str, data:dict) -> int:
+        """
+        Encode the event once and append it to the buffers of all subscribers (slow subscribers are dropped)
+
+        Returns:
+            int:    number of subscribers that received the event
+        """
+        with self._condition:
+            self.published += 1
+            chunk = encode_event(event, data, self.published)
+            self._last_event = chunk
+            slow = []
+            for subscriber in self._subscribers:
+                if len(subscriber._buffer) >= subscriber.buffer_size:
+                    slow.append(subscriber)
+                else:
+                    subscriber._buffer.append(chunk)
+            for subscriber in slow:
+                self._subscribers.discard(subscriber)
+                subscriber._buffer.clear()
+                subscriber.dropped = subscriber.closed = True
+            self.drops += len(slow)
+            self._condition.notify_all()
+            return len(self._subscribers)
+
+    def close(self) -> None:
+        """end the streams of all subscribers (e.g. when the server shuts down)"""
+        with self._condition:
+            for subscriber in self._subscribers:
+                subscriber.closed = True
+            self._subscribers.clear()
+            self._condition.notify_all()
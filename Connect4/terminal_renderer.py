@@ -0,0 +1,105 @@
+"""
+Differential terminal rendering
+
+Instead of clearing the screen and printing the whole board for every frame, the FrameRenderer remembers
+the last frame it has drawn and only writes the cells that changed (a cursor movement followed by the new cell).
+Every frame is written with a single write call.
+
+A frame is a list of lines. A line is either
+    - a tuple of cells (strings that are cell_width characters wide on the screen, ansi escape codes don't count), or
+    - a plain string (redrawn completely when it changes)
+"""
+
+import sys
+
+import ansi_wrapper
+
+
+class FrameRenderer:
+    """
+    Draws frames to a terminal, only writing the differences to the previous frame
+
+    Attributes:
+        stream (TextIO):    where the frames are written to (default: sys.stdout)
+        cell_width (int):   width of a single cell on the screen
+        ansi (bool):        if False, the terminal does not understand cursor movements and every changed frame
+                            is printed completely (unchanged frames are skipped)
+        previous (list):    the frame that is currently on the screen (None: unknown, the next frame is drawn completely)
+    """
+
+    def __init__(self, stream = None, cell_width:int = 3, ansi:bool = True) -> None:
+        self.stream = stream
+        self.cell_width = cell_width
+        self.ansi = ansi
+        self.previous = None
+
+    def invalidate(self) -> None:
+        """forget the last frame, e.g. after something else was printed to the terminal"""
+        self.previous = None
+
+    def render(self, frame:list) -> None:
+        """
+        Draw a frame
+
+        Parameters:
+            frame (list):   lines of the frame (tuples of cells or strings)
+        """
+        stream = self.stream or sys.stdout
+        frame = [line if isinstance(line, str) else tuple(line) for line in frame]
+        if frame == self.previous:
+            return
+        if not self.ansi:
+            output = "\n".join(line if isinstance(line, str) else "".join(line) for line in frame) + "\n"
+        elif self.previous is None:
+            output = "\033[2J\033[H" + "\n".join(line if isinstance(line, str) else "".join(line) for line in frame)
+            output += f"\033[{len(frame) + 1};1H"
+        else:
+            output = self._difference(self.previous, frame)
+        stream.write(output)
+        stream.flush()
+        self.previous = frame
+
+    def _difference(self, previous:list, frame:list) -> str:
+        """
+        Returns:
+            str:    the escape sequences and cells that turn the previous frame into the new one
+        """
+        parts = []
+        for row, line in enumerate(frame):
+            old = previous[row] if row < len(previous) else None
+            if line == old:
+                continue
+            if isinstance(line, tuple) and isinstance(old, tuple) and len(line) == len(old):
+                in_run = False # consecutive changed cells only need one cursor movement
+                for column, cell in enumerate(line):
+                    if cell == old[column]:
+                        in_run = False
+                        continue
+                    if not in_run:
+                        parts.append(f"\033[{row + 1};{column * self.cell_width + 1}H")
+                        in_run = True
+                    parts.append(cell)
+            else:
+                text = line if isinstance(line, str) else "".join(line)
+                parts.append(f"\033[{row + 1};1H{text}\033[K")
+        # clear lines of the previous frame that are not part of the new one
+        for row in range(len(frame), len(previous)):
+            parts.append(f"\033[{row + 1};1H\033[K")
+        # park the cursor below the frame, where other output (e.g. the win message) continues
+        parts.append(f"\033[{len(frame) + 1};1H")
+        return "".join(parts)
+
+
+_default_renderer = None
+
+
+def default_renderer() -> FrameRenderer:
+    """
+    Returns:
+        FrameRenderer:  the renderer of the terminal (sys.stdout), shared by all players that draw to it
+    """
+    global _default_renderer
+    if _default_renderer is None:
+        # terminals without escape codes get complete frames (only when something changed)
+        _default_renderer = FrameRenderer(ansi=ansi_wrapper.supports_ansi())
+    return _default_renderer
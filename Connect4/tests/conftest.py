@@ -0,0 +1,9 @@
+"""
+The modules of Connect4 import each other by module name (e.g. `from bot import Position`), like when a script
+is started from this folder, so the folder is put on the import path of the tests.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
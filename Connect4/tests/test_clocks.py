@@ -0,0 +1,102 @@
+import threading
+import time
+
+from clocks import GameClock, TimerQueue
+
+
+def wait_for(condition, timeout:float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_timers_fire_in_deadline_order():
+    timers = TimerQueue()
+    calls = []
+    now = time.monotonic()
+    for name, delay in [("c", 0.15), ("a", 0.05), ("b", 0.1), ("b2", 0.1)]:
+        timers.schedule_at(now + delay, calls.append, name)
+    assert wait_for(lambda: len(calls) == 4)
+    assert calls == ["a", "b", "b2", "c"] # equal deadlines in the order they were scheduled
+    assert timers.fired == 4 and len(timers) == 0
+    timers.close()
+
+
+def test_a_later_timer_does_not_delay_an_earlier_one():
+    timers = TimerQueue()
+    fired = threading.Event()
+    timers.schedule(60, fired.set)
+    timers.schedule(0.05, fired.set) # the thread sleeps for the first timer and has to wake up
+    assert fired.wait(2)
+    timers.close()
+
+
+def test_cancelled_timers_are_skipped():
+    timers = TimerQueue()
+    calls = []
+    cancelled = timers.schedule(0.05, calls.append, "cancelled")
+    timers.schedule(0.1, calls.append, "kept")
+    timers.cancel(cancelled)
+    timers.cancel(cancelled) # cancelling twice is a no-op
+    assert len(timers) == 1
+    assert wait_for(lambda: calls)
+    time.sleep(0.1)
+    assert calls == ["kept"]
+    timers.cancel(cancelled)
+    assert len(timers) == 0
+    timers.close()
+
+
+def test_cancel_after_the_call_is_a_no_op():
+    timers = TimerQueue()
+    calls = []
+    timer = timers.schedule(0, calls.append, 1)
+    assert wait_for(lambda: calls)
+    timers.cancel(timer)
+    assert len(timers) == 0
+    timers.schedule(0, calls.append, 2)
+    assert wait_for(lambda: len(calls) == 2)
+    timers.close()
+
+
+def test_heap_is_compacted_when_most_timers_are_cancelled():
+    timers = TimerQueue()
+    handles = [timers.schedule(60, print) for _ in range(TimerQueue.COMPACT_MIN * 2)]
+    for timer in handles[:TimerQueue.COMPACT_MIN]:
+        timers.cancel(timer)
+    assert len(timers._heap) == TimerQueue.COMPACT_MIN * 2 # not more cancelled entries than live ones yet
+    timers.cancel(handles[TimerQueue.COMPACT_MIN])
+    assert len(timers._heap) == TimerQueue.COMPACT_MIN - 1
+    assert len(timers) == TimerQueue.COMPACT_MIN - 1
+    timers.close()
+
+
+def test_a_failing_callback_does_not_stop_the_thread():
+    timers = TimerQueue()
+    calls = []
+    timers.schedule(0, lambda: 1 / 0)
+    timers.schedule(0.01, calls.append, "next")
+    assert wait_for(lambda: calls)
+    assert timers.errors == 1
+    timers.close()
+
+
+def test_clock_budget_and_increment():
+    clock = GameClock(base=10.0, increment=2.0)
+    clock.start("a", now=100.0)
+    assert clock.deadline() == 110.0
+    assert clock.stop(now=103.0) == 3.0
+    assert clock.budget["a"] == 9.0 # 10 - 3 + 2
+    clock.start("b", now=103.0)
+    assert clock.remaining(now=104.0) == {"a": 9.0, "b": 9.0}
+    clock.stop(now=105.0, increment=False) # the game ended, no increment
+    assert clock.budget["b"] == 8.0
+    assert clock.deadline() is None
+
+
+def test_clock_move_time_limits_the_budget():
+    clock = GameClock(base=100.0, move_time=5.0)
+    clock.start("a", now=0.0)
+    assert clock.deadline() == 5.0
+    assert GameClock().deadline() is None
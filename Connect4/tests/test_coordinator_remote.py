@@ -0,0 +1,88 @@
+import threading
+import time
+
+from coordinator_remote import Coordinator_Remote
+from game import Connect4
+from game_record import read_records
+from input_events import INPUT
+from player_local import Action
+from polling import PollScheduler
+
+
+class DelayedStatusGame:
+    """local game whose get_status keeps answering an old status until release (a poll that is still underway)"""
+
+    def __init__(self, game:Connect4) -> None:
+        self.game = game
+        self.frozen = None
+
+    def get_status(self) -> dict:
+        return dict(self.frozen) if self.frozen is not None else self.game.get_status()
+
+    def get_board(self):
+        return self.game.get_board().copy()
+
+    def check_move(self, column:int, player_id) -> bool:
+        return self.game.check_move(column, id=player_id)
+
+
+class ScriptedPlayer:
+    """player whose actions are posted by a script (instead of a keyboard)"""
+
+    def __init__(self, game, script) -> None:
+        self.game = game
+        self.id = "me"
+        self.name = "Me"
+        self.icon = 'O'
+        self.board = None
+        self.drop_position = 3
+        self.script = script
+
+    def input_source(self, mux):
+        player = self
+
+        class Source:
+            def start(self) -> None:
+                threading.Thread(target=player.script, args=(mux,), daemon=True).start()
+
+            def stop(self) -> None:
+                pass
+        return Source()
+
+    def handle_action(self, action:Action):
+        if action == Action.drop and self.game.check_move(self.drop_position, self.id):
+            return self.drop_position
+        return None
+
+    def visualize(self, fetch_board:bool = True) -> None:
+        pass
+
+
+def test_drop_before_the_opponents_move_was_seen_is_ignored(tmp_path):
+    game = Connect4(verbose=False)
+    game.register_player("opponent", "Opponent", icon='X')
+    game.register_player("me", "Me", icon='O')
+    remote = DelayedStatusGame(game)
+    coordinator = Coordinator_Remote.__new__(Coordinator_Remote)
+    coordinator.record_path = str(tmp_path / "games.jsonl")
+    coordinator.poll_scheduler = PollScheduler(min_interval=0.02, max_interval=0.05, timeout=10)
+    coordinator.game = remote
+
+    def script(mux) -> None:
+        remote.frozen = game.get_status()           # the poller still sees the opponent to move
+        game.check_move(3, id="opponent")           # the opponent moves in the column of the cursor
+        mux.post(INPUT, Action.drop)                # and the player drops before the status arrived
+        time.sleep(0.2)
+        remote.frozen = None
+        deadline = time.monotonic() + 5
+        while game.turn_counter == 1 and time.monotonic() < deadline:
+            mux.post(INPUT, Action.drop)
+            time.sleep(0.1)
+        game.forfeit("me")
+
+    coordinator.player = ScriptedPlayer(remote, script)
+    coordinator.play()
+    record = next(read_records(coordinator.record_path))
+    assert record.columns() == [3, 3]
+    assert record.first_icon == 'X'
+    assert game.board[3][0] == 'X' and game.board[3][1] == 'O'
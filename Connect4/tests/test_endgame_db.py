@@ -0,0 +1,78 @@
+import random
+
+from bot import Position
+from endgame_db import EndgameDatabase, generate, write_database
+
+
+def full_search(position:Position, cache:dict) -> int:
+    """exact value of the position (1 win, 0 draw, -1 loss for the player to move) by a plain minimax search"""
+    key = position.key()
+    if key not in cache:
+        if position.is_full():
+            cache[key] = 0
+        elif any(position.is_winning_move(column) for column in position.legal_columns()):
+            cache[key] = 1
+        else:
+            values = []
+            for column in position.legal_columns():
+                child = position.copy()
+                child.play(column)
+                values.append(-full_search(child, cache))
+            cache[key] = max(values)
+    return cache[key]
+
+
+def reachable(position:Position):
+    """all positions of running games reachable from the position (including itself)"""
+    seen = {}
+    stack = [position]
+    while stack:
+        position = stack.pop()
+        if position.key() in seen:
+            continue
+        seen[position.key()] = position
+        if position.is_full():
+            continue
+        for column in position.legal_columns():
+            if not position.is_winning_move(column):
+                child = position.copy()
+                child.play(column)
+                stack.append(child)
+    return seen.values()
+
+
+def test_4x4_database_matches_full_search(tmp_path):
+    values = generate(4, 4, 16, progress=False)
+    cache = {}
+    positions = list(reachable(Position(4, 4)))
+    # every position is solved (mirrored positions are stored once)
+    for position in positions:
+        assert values[position.canonical_key()[0]] == full_search(position, cache)
+    # the file gives the same results (a sample, the lookups go through the memory mapped file)
+    path = str(tmp_path / "4x4.c4eg")
+    write_database(path, values, 4, 4, 16)
+    database = EndgameDatabase(path)
+    assert len(database) == len(values)
+    for position in positions[::97]:
+        assert database.lookup(position) == full_search(position, cache)
+        assert database.lookup(position.mirrored()) == database.lookup(position)
+
+
+def test_positions_below_the_stored_levels_are_not_found(tmp_path):
+    path = str(tmp_path / "4x4.c4eg")
+    write_database(path, generate(4, 4, 6, progress=False), 4, 4, 6)
+    database = EndgameDatabase(path)
+    assert database.min_moves == 10
+    generator = random.Random(4)
+    cache = {}
+    for _ in range(200):
+        # a random game, looked up after every move
+        position = Position(4, 4)
+        while not position.is_full():
+            column = generator.choice(position.legal_columns())
+            if position.is_winning_move(column):
+                break
+            position.play(column)
+            expected = full_search(position, cache) if position.moves >= 10 else None
+            assert database.lookup(position) == expected
+    assert database.lookup(Position(5, 4)) is None
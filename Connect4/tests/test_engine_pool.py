@@ -0,0 +1,30 @@
+import os
+import threading
+
+from bot import Position
+from engine_pool import EnginePool
+
+
+def crash_once(flag:str) -> tuple:
+    """kills its worker process the first time (runs in a worker process)"""
+    if not os.path.exists(flag):
+        open(flag, "w").close()
+        os._exit(1)
+    return "searched", 0.0
+
+
+def test_search_is_submitted_again_after_a_worker_died(tmp_path):
+    pool = EnginePool(workers=1, max_queue=1)
+    done = threading.Event()
+    results = []
+    try:
+        pool._submit(crash_once, (str(tmp_path / "crashed"),), lambda result: (results.append(result), done.set()),
+                     lambda error: (results.append(error), done.set()))
+        assert done.wait(60)
+        assert results == ["searched"]
+        assert pool.restarts == 1
+        assert pool.pending == 0
+        # the new workers are used by the next searches
+        assert pool.submit_scores(Position.from_moves([3, 3]), depth=2).result(60)[3] is not None
+    finally:
+        pool.close()
@@ -0,0 +1,46 @@
+import game_remote
+from game_remote import Connect4_remote, Connect4_remote_batch
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, body:dict) -> None:
+        self.body = body
+
+    def json(self) -> dict:
+        return self.body
+
+
+def test_polls_send_the_registered_player(monkeypatch):
+    requests = []
+
+    def send_request(method, url, max_retries = 5, **kwargs):
+        requests.append((url, kwargs))
+        return FakeResponse({"icon": "X", "board": [[""]], "turn_number": -1})
+
+    monkeypatch.setattr(game_remote, "send_request", send_request)
+    game = Connect4_remote("http://server", game_id="g1")
+    game.get_status()
+    assert requests[-1][1]["params"] == {"game_id": "g1"}
+    game.register_player("p1", "Player")
+    game.get_status()
+    assert requests[-1][1]["params"] == {"game_id": "g1", "player_id": "p1"}
+    game.get_board()
+    assert requests[-1][1]["params"] == {"game_id": "g1", "player_id": "p1"}
+
+
+def test_rate_limited_batch_moves_are_sent_again(monkeypatch):
+    answers = [{"results": [{"game_id": "g1", "ok": True, "code": 200},
+                            {"game_id": "g2", "ok": False, "code": 429, "retry_after": 0.01}]},
+               {"results": [{"game_id": "g2", "ok": True, "code": 200}]}]
+    sent = []
+
+    def send_request(method, url, max_retries = 5, **kwargs):
+        sent.append(kwargs["json"]["moves"])
+        return FakeResponse(answers[len(sent) - 1])
+
+    monkeypatch.setattr(game_remote, "send_request", send_request)
+    results = Connect4_remote_batch("http://server").check_moves([("g1", 0, "p1"), ("g2", 1, "p1")])
+    assert [result["ok"] for result in results] == [True, True]
+    assert sent[1] == [{"game_id": "g2", "column": 1, "player_id": "p1"}]
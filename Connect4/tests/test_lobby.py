@@ -0,0 +1,102 @@
+import itertools
+import time
+
+import pytest
+
+from lobby import Lobby
+
+
+class GameFactory:
+    """create_game of the lobby: records the pairs, the first ticket gets X"""
+
+    def __init__(self) -> None:
+        self.pairs = []
+        self.fail = 0
+        self._ids = itertools.count(1)
+
+    def __call__(self, tickets:list) -> tuple:
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("no game")
+        self.pairs.append([(ticket.player_id, ticket.board_size) for ticket in tickets])
+        return f"game-{next(self._ids)}", {tickets[0].player_id: 'X', tickets[1].player_id: 'O'}
+
+
+@pytest.fixture
+def factory():
+    return GameFactory()
+
+
+@pytest.fixture
+def lobby(factory):
+    lobby = Lobby(factory, batch_interval=0.01)
+    yield lobby
+    lobby.close()
+
+
+def test_players_are_paired_in_the_order_they_joined(lobby, factory):
+    for player_id in "abcde":
+        lobby.join(player_id)
+    first, second = lobby.wait("a", 2), lobby.wait("b", 2)
+    assert first.game_id == second.game_id and (first.icon, second.icon) == ('X', 'O')
+    assert lobby.wait("d", 2).game_id is not None
+    assert lobby.wait("e", 0.1).game_id is None # no opponent yet
+    assert [[player_id for player_id, _ in pair] for pair in factory.pairs] == [["a", "b"], ["c", "d"]]
+    assert lobby.waiting() == 1
+
+
+def test_players_are_only_paired_with_the_same_board_size(lobby, factory):
+    lobby.join("small", board_size=(4, 4))
+    lobby.join("a")
+    lobby.join("b")
+    assert lobby.wait("b", 2).game_id is not None
+    assert lobby.wait("small", 0.1).game_id is None
+    lobby.join("small2", board_size=(4, 4))
+    assert lobby.wait("small2", 2).game_id is not None
+    assert factory.pairs[1] == [("small", (4, 4)), ("small2", (4, 4))]
+
+
+def test_a_player_joining_twice_keeps_the_ticket(lobby):
+    ticket = lobby.join("a")
+    assert lobby.join("a") is ticket
+    assert lobby.waiting() == 1
+
+
+def test_leave(lobby):
+    lobby.join("a")
+    assert lobby.leave("a")
+    assert not lobby.leave("a")
+    assert lobby.wait("a", 0.1) is None
+    lobby.join("b")
+    lobby.join("c")
+    assert lobby.wait("b", 2).game_id is not None
+    assert not lobby.leave("b") # matched, the game exists already
+
+
+def test_a_failed_game_is_tried_again(lobby, factory):
+    factory.fail = 1
+    lobby.join("a")
+    lobby.join("b")
+    assert lobby.wait("a", 2).game_id is not None
+    assert factory.pairs == [[("a", None), ("b", None)]]
+
+
+def test_tickets_expire_after_the_match_not_after_the_join(factory):
+    lobby = Lobby(factory, batch_interval=0.01, ticket_ttl=0.5)
+    try:
+        lobby.join("a")
+        time.sleep(0.6) # a waited longer than the ttl
+        lobby.join("b")
+        assert lobby.wait("b", 2).game_id is not None
+        lobby.join("c")
+        lobby.join("d")
+        assert lobby.wait("d", 2).game_id is not None # a pairing round ran after the match of a
+        ticket = lobby.wait("a", 0)
+        assert ticket is not None and ticket.game_id == "game-1"
+        time.sleep(0.6)
+        lobby.join("e")
+        lobby.join("f")
+        assert lobby.wait("f", 2).game_id is not None
+        assert lobby.wait("a", 0) is None # forgotten ticket_ttl after the match
+    finally:
+        lobby.close()
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+import ratelimit
+from ratelimit import ConcurrencyLimiter, RateLimiter
+
+
+class FakeTime:
+    """replaces time.monotonic of the ratelimit module"""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(ratelimit, "time", fake)
+    return fake
+
+
+def test_burst_then_retry_after(clock):
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.acquire("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("a") == pytest.approx(0.5) # one token takes 1 / rate seconds
+    assert limiter.rejected == 1
+    assert limiter.acquire("b") == 0.0 # other keys have their own bucket
+
+
+def test_bucket_refills_with_the_rate(clock):
+    limiter = RateLimiter(rate=2, burst=3)
+    for _ in range(3):
+        limiter.acquire("a")
+    clock.now += 0.25
+    assert limiter.acquire("a") == pytest.approx(0.25) # half a token is there
+    clock.now += 0.25
+    assert limiter.acquire("a") == 0.0
+    clock.now += 60
+    assert [limiter.acquire("a") for _ in range(4)][-1] > 0 # never more than burst tokens
+
+
+def test_cost_of_a_batch(clock):
+    limiter = RateLimiter(rate=10, burst=20)
+    assert limiter.acquire("ip", cost=15) == 0.0
+    assert limiter.acquire("ip", cost=10) == pytest.approx(0.5)
+
+
+def test_idle_buckets_expire(clock):
+    limiter = RateLimiter(rate=2, burst=4)
+    limiter.acquire("old")
+    clock.now += 1
+    limiter.acquire("recent")
+    clock.now += 1.5 # "old" was idle for 2.5 s, full again after burst / rate = 2 s
+    limiter.acquire("new")
+    assert len(limiter) == 2
+    assert list(limiter._buckets) == ["recent", "new"]
+
+
+def test_number_of_buckets_is_bounded(clock):
+    limiter = RateLimiter(rate=1, burst=10, max_keys=3)
+    for key in "abcd":
+        limiter.acquire(key)
+    assert list(limiter._buckets) == ["b", "c", "d"]
+    limiter.acquire("b") # used again, "c" is the least recently used one now
+    limiter.acquire("e")
+    assert list(limiter._buckets) == ["d", "b", "e"]
+
+
+def test_concurrency_limiter_rejects_when_all_slots_are_taken():
+    limiter = ConcurrencyLimiter(2, wait=0.01)
+    assert limiter.acquire() and limiter.acquire()
+    assert limiter.active == 2
+    assert not limiter.acquire()
+    assert limiter.rejected == 1
+    limiter.release()
+    assert limiter.acquire()
+    assert limiter.active == 2
+
+
+def test_concurrency_limiter_waits_for_a_free_slot():
+    limiter = ConcurrencyLimiter(1, wait=2.0)
+    assert limiter.acquire()
+    threading.Timer(0.05, limiter.release).start()
+    assert limiter.acquire()
+    assert limiter.rejected == 0
@@ -0,0 +1,251 @@
+import time
+
+import pytest
+
+from lobby import Ticket
+from server import Connect4Server
+
+
+@pytest.fixture
+def server():
+    server = Connect4Server(player_rate=None, ip_rate=None)
+    yield server
+    server.timers.close()
+    server.engine.close()
+    server.analysis_pool.close()
+
+
+def board_rows(coins:dict, width:int = 8, height:int = 7) -> list:
+    """board in the format of the api (row 0 is the top) with coins at {(x, y): icon}, y=0 is the bottom"""
+    return [[coins.get((x, height - 1 - row), "") for x in range(width)] for row in range(height)]
+
+
+def test_analyze_accepts_a_valid_board(server):
+    client = server.app.test_client()
+    response = client.post("/connect4/analyze", json={"board": board_rows({(3, 0): "X", (3, 1): "O", (4, 0): "X"}),
+                                                      "depth": 4})
+    assert response.status_code == 200
+    assert len(response.json["scores"]) == 8
+
+
+@pytest.mark.parametrize("coins, active_player", [
+    ({(3, 6): "X"}, None),                              # floating coin
+    ({(0, 0): "X", (1, 0): "X", (2, 0): "X"}, None),    # X played three times in a row
+    ({(0, 0): "X"}, "X"),                               # X has more coins and can't be to move
+    ({(0, 0): "Z"}, None),
+])
+def test_analyze_rejects_impossible_boards(server, coins, active_player):
+    client = server.app.test_client()
+    body = {"board": board_rows(coins)}
+    if active_player is not None:
+        body["active_player"] = active_player
+    assert client.post("/connect4/analyze", json=body).status_code == 400
+    assert len(server.analyzer.cache) == 0
+
+
+class StubEngine:
+    """engine pool that keeps the submitted searches, the test decides when they finish"""
+
+    def __init__(self) -> None:
+        self.searches = []
+        self.busy = False
+        self.fail = None
+        self.pending = 0
+        self.restarts = 0
+        self.depth = 8
+
+    def full(self) -> bool:
+        return self.busy
+
+    def submit(self, position, callback, depth = None, on_error = None):
+        if self.fail is not None:
+            raise self.fail
+        self.searches.append((position, callback, on_error))
+
+    def close(self) -> None:
+        pass
+
+
+def test_move_against_a_failing_engine_is_applied(server):
+    server.engine = StubEngine()
+    client = server.app.test_client()
+    client.post("/connect4/register", json={"player_id": "human", "name": "Human"})
+    client.post("/connect4/engine", json={})
+    game = server.game
+    if game.players[0] != "human":
+        server.engine.searches.pop()[1](0) # the engine has the first move
+    server.engine.fail = RuntimeError("worker failed to start")
+    turn = game.turn_counter
+    assert client.post("/connect4/check_move", json={"player_id": "human", "column": 3}).status_code == 200
+    assert game.turn_counter == turn + 1
+    assert server.engine_error_counter.get() == 1
+
+
+def test_engine_move_waits_while_the_other_engine_is_busy(server):
+    server.engine = StubEngine()
+    client = server.app.test_client()
+    client.post("/connect4/engine", json={})
+    client.post("/connect4/engine", json={})
+    game = server.game
+    server.engine.busy = True
+    server.engine.searches.pop()[1](3)
+    assert game.turn_counter == 0 # not applied, the reply of the other engine could not be started
+    server.engine.busy = False
+    deadline = time.monotonic() + 5
+    while game.turn_counter == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert game.turn_counter == 1
+    assert len(server.engine.searches) == 1 # the search of the other engine
+
+
+def start_default_game(server, client) -> tuple:
+    """register two players in the default game, returns (session, id of the player to move)"""
+    client.post("/connect4/register", json={"player_id": "first", "name": "First"})
+    client.post("/connect4/register", json={"player_id": "second", "name": "Second"})
+    session = server.get_session()
+    return session, session.game.players[session.game.activeplayer]
+
+
+def test_player_out_of_time_forfeits():
+    server = Connect4Server(player_rate=None, ip_rate=None, move_time=0.2)
+    try:
+        client = server.app.test_client()
+        session, to_move = start_default_game(server, client)
+        deadline = time.monotonic() + 5
+        while session.game.winner is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert session.game.winner is not None and session.game.winner != to_move
+        assert server.forfeit_counter.get(reason="time") == 1
+        assert client.get("/connect4/status").json["winner"] == session.game.winner
+    finally:
+        server.timers.close()
+        server.engine.close()
+        server.analysis_pool.close()
+
+
+def test_idle_game_without_clock_ends_visibly_instead_of_being_reset(server):
+    client = server.app.test_client()
+    session, to_move = start_default_game(server, client)
+    client.post("/connect4/check_move", json={"player_id": to_move, "column": 0})
+    with session.lock:
+        generation = session.generation
+    server.session_timeout(session, generation) # idle_timeout passed
+    assert session.game.players # not reset under the players
+    assert session.game.winner == to_move # the player to move (the opponent) forfeited
+    assert server.forfeit_counter.get(reason="idle") == 1
+    assert server.reclaimed_counter.get(state="active") == 0
+    status = client.get("/connect4/status")
+    assert status.status_code == 200 and status.json["winner"] == to_move
+
+
+def test_finished_default_game_is_reset_and_answers_status(server):
+    client = server.app.test_client()
+    session, to_move = start_default_game(server, client)
+    session.game.forfeit(to_move)
+    with session.lock:
+        server.schedule_session(session)
+        generation = session.generation
+    server.session_timeout(session, generation) # finished_ttl passed
+    assert server.reclaimed_counter.get(state="finished") == 1
+    assert session.game.players == []
+    status = client.get("/connect4/status")
+    assert status.status_code == 200 and status.json["turn_number"] == -1
+    assert client.post("/connect4/check_move", json={"player_id": to_move, "column": 0}).status_code == 400
+    assert session.timer is None # an empty default game has no timer
+
+
+def test_finished_lobby_game_is_removed(server):
+    game_id, icons = server.create_lobby_game([Ticket("a", "A", None), Ticket("b", "B", None)])
+    session = server.get_session(game_id)
+    session.game.forfeit("a")
+    with session.lock:
+        server.schedule_session(session)
+        generation = session.generation
+    server.session_timeout(session, generation)
+    assert server.get_session(game_id) is None
+    assert server.app.test_client().get("/connect4/status", query_string={"game_id": game_id}).status_code == 404
+
+
+def test_stale_timer_is_ignored(server):
+    client = server.app.test_client()
+    session, to_move = start_default_game(server, client)
+    with session.lock:
+        generation = session.generation
+    client.post("/connect4/check_move", json={"player_id": to_move, "column": 0})
+    server.session_timeout(session, generation) # due before the move
+    assert session.game.winner is None
+
+
+def test_idle_timeout_zero_disables_the_timer():
+    server = Connect4Server(player_rate=None, ip_rate=None, idle_timeout=0)
+    try:
+        client = server.app.test_client()
+        session, _ = start_default_game(server, client)
+        assert server.idle_timeout is None and session.timer is None
+    finally:
+        server.timers.close()
+        server.engine.close()
+        server.analysis_pool.close()
+
+
+def test_status_polls_are_limited_per_player():
+    server = Connect4Server(player_rate=1, player_burst=2, ip_rate=None)
+    try:
+        client = server.app.test_client()
+        codes = [client.get("/connect4/status", query_string={"player_id": "poller"}).status_code for _ in range(3)]
+        assert codes[2] == 429
+        assert client.get("/connect4/status", query_string={"player_id": "other"}).status_code == 200
+    finally:
+        server.timers.close()
+        server.engine.close()
+        server.analysis_pool.close()
+
+
+def test_moves_outside_the_board_are_rejected(server):
+    client = server.app.test_client()
+    session, to_move = start_default_game(server, client)
+    for column in (-1, session.game.width):
+        assert client.post("/connect4/check_move", json={"player_id": to_move, "column": column}).status_code == 400
+    assert session.game.turn_counter == 0 and not session.game.moves
+
+
+def test_batch_state(server):
+    game_id, _ = server.create_lobby_game([Ticket("a", "A", None), Ticket("b", "B", None)])
+    response = server.app.test_client().post("/connect4/batch/state", json={"game_ids": [game_id, None, "nope", [1]]})
+    assert response.status_code == 200
+    games = response.json["games"]
+    assert [game["code"] for game in games] == [200, 200, 404, 400]
+    assert games[0]["game_id"] == game_id and games[0]["status"]["turn_number"] == 0
+
+
+def test_batch_moves_are_checked_one_by_one(server):
+    game_id, icons = server.create_lobby_game([Ticket("a", "A", None), Ticket("b", "B", None)])
+    game = server.get_session(game_id).game
+    to_move = game.players[game.activeplayer]
+    moves = [{"game_id": game_id, "column": -1, "player_id": to_move},
+             {"game_id": game_id, "column": "x", "player_id": to_move},
+             {"game_id": [1], "column": 0, "player_id": to_move},
+             {"game_id": "nope", "column": 0, "player_id": to_move},
+             {"game_id": game_id, "column": 2, "player_id": to_move},
+             {"game_id": game_id, "column": 3, "player_id": to_move}] # not the turn of the player anymore
+    response = server.app.test_client().post("/connect4/batch/moves", json={"moves": moves})
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert [result["code"] for result in results] == [400, 400, 400, 404, 200, 400]
+    assert results[4]["ok"] and game.moves == [2]
+
+
+def test_batch_moves_count_for_the_rate_limit_of_their_player():
+    server = Connect4Server(player_rate=1, player_burst=2, ip_rate=None)
+    try:
+        game_ids = [server.create_lobby_game([Ticket(f"a{index}", "A", None), Ticket(f"b{index}", "B", None)])[0]
+                    for index in range(3)]
+        moves = [{"game_id": game_id, "column": 0, "player_id": "poller"} for game_id in game_ids]
+        results = server.app.test_client().post("/connect4/batch/moves", json={"moves": moves}).json["results"]
+        assert [result["code"] for result in results] == [400, 400, 429] # not a player of the games, then limited
+        assert 0 < results[2]["retry_after"] <= 1
+        assert server.rate_limited_counter.get(scope="player") == 1
+    finally:
+        server.timers.close()
+        server.engine.close()
+        server.analysis_pool.close()
@@ -0,0 +1,266 @@
+"""
+Round-robin tournament between players (e.g. bots with different settings)
+
+Every pair of entrants plays the same number of games with each of them moving first. The games are played
+with headless Coordinator_Local instances (Connect4 directly, no server) in a process pool, so all cores are used.
+Results are appended to a NDJSON file as soon as a batch of games finishes, one line per game:
+    {"first": "bot:depth=4", "second": "random", "winner": "first", "moves": "3344...", "seconds": 0.012}
+(winner is "first", "second" or null for a draw, moves are encoded as in game_record.py)
+
+At the end the Elo ratings are estimated by maximum likelihood, with confidence intervals from the curvature
+of the likelihood. Like BayesElo, every entrant gets a few virtual draws against a 0 rated opponent (the prior),
+which keeps the ratings finite for entrants that won or lost all of their games.
+
+Entrants are given as KIND[:OPTION=VALUE,...], e.g.
+    python tournament.py random bot:depth=2 "bot:depth=4,randomness=0.05" --games 50 --output results.ndjson
+    python tournament.py --from-results results.ndjson          # ratings of an earlier run
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import itertools
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from coordinator_local import Coordinator_Local
+from game_record import encode_moves
+from player_bot import Player_Bot, Player_NTuple, Player_Random
+
+PLAYER_KINDS = {"bot": Player_Bot, "random": Player_Random, "ntuple": Player_NTuple}
+
+# factor between Elo points and the natural logarithm of the odds
+ELO_SCALE = math.log(10) / 400
+
+
+def parse_entrant(spec:str) -> tuple:
+    """
+    Parameters:
+        spec (str):     KIND[:OPTION=VALUE,...], e.g. "bot:depth=4,randomness=0.1"
+
+    Returns:
+        tuple:  (kind, options dict)
+    """
+    kind, _, option_text = spec.partition(":")
+    if kind not in PLAYER_KINDS:
+        raise ValueError(f"unknown player kind '{kind}' ({', '.join(PLAYER_KINDS)})")
+    options = {}
+    for item in filter(None, option_text.split(",")):
+        key, separator, value = item.partition("=")
+        if not separator:
+            raise ValueError(f"option '{item}' of '{spec}' is not KEY=VALUE")
+        for convert in (int, float, str):
+            try:
+                options[key] = convert(value)
+                break
+            except ValueError:
+                pass
+    return kind, options
+
+
+def schedule(entrants:list, games:int, batch_size:int = 10, seed:int = 0) -> list:
+    """
+    Create the batches of all pairings, every entrant moves first in half of the games
+
+    Parameters:
+        entrants (list):    names of the entrants
+        games (int):        games per pairing and colour
+        batch_size (int):   games per task of the process pool
+
+    Returns:
+        list:   (first name, second name, number of games, seed) per batch
+    """
+    tasks = []
+    for first, second in itertools.permutations(entrants, 2):
+        for start in range(0, games, batch_size):
+            tasks.append((first, second, min(batch_size, games - start), seed + len(tasks)))
+    return tasks
+
+
+def _play_batch(first:tuple, second:tuple, count:int, seed:int, width:int, height:int) -> list:
+    """
+    Play a batch of games in a worker process
+
+    Parameters:
+        first (tuple):      (name, kind, options) of the entrant that moves first
+        second (tuple):     (name, kind, options) of the other entrant
+
+    Returns:
+        list:   the result line (dict) of every game
+    """
+    factories = []
+    for index, (name, kind, options) in enumerate((first, second)):
+        options = dict(options)
+        # the seeds make the random moves differ between the batches, but keep every run reproducible
+        options.setdefault("seed", seed * 2 + index)
+        factories.append(functools.partial(PLAYER_KINDS[kind], name=name, **options))
+    coordinator = Coordinator_Local(players=factories, width=width, height=height)
+    lines = []
+    for result in coordinator.play_many(count, alternate=False):
+        lines.append({"first": first[0], "second": second[0],
+                      "winner": {1: "first", 2: "second", None: None}[result.winner],
+                      "moves": encode_moves(result.moves), "seconds": round(result.seconds, 6)})
+    return lines
+
+
+def run_tournament(specs:list, games:int, output:str = None, workers:int = None, batch_size:int = 10,
+                   width:int = 7, height:int = 6, seed:int = 0, progress:bool = True) -> list:
+    """
+    Play all pairings in a process pool
+
+    Parameters:
+        specs (list):       entrant specifications (see parse_entrant), at least two
+        games (int):        games per pairing and colour
+        output (str):       optional NDJSON file, the results are appended as soon as a batch is finished
+        workers (int):      number of processes (default: number of cores)
+
+    Returns:
+        list:   the result lines of all games
+    """
+    entrants = {}
+    for spec in specs:
+        name = spec
+        suffix = 2
+        while name in entrants:
+            name = f"{spec}#{suffix}"
+            suffix += 1
+        kind, options = parse_entrant(spec)
+        entrants[name] = (name, kind, options)
+    if len(entrants) < 2:
+        raise ValueError("a tournament needs at least two entrants")
+
+    tasks = schedule(list(entrants), games, batch_size, seed)
+    total = sum(task[2] for task in tasks)
+    results = []
+    file = open(output, "a", encoding="utf-8") if output else None
+    start = time.perf_counter()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [executor.submit(_play_batch, entrants[first], entrants[second], count, task_seed, width, height)
+                       for first, second, count, task_seed in tasks]
+            for future in concurrent.futures.as_completed(futures):
+                lines = future.result()
+                results.extend(lines)
+                if file is not None:
+                    file.write("".join(json.dumps(line, separators=(",", ":")) + "\n" for line in lines))
+                    file.flush()
+                if progress:
+                    elapsed = time.perf_counter() - start
+                    print(f"\r{len(results)}/{total} games ({len(results) / elapsed:.0f} games/s)", end="", flush=True)
+    finally:
+        if file is not None:
+            file.close()
+    if progress:
+        print()
+    return results
+
+
+def read_results(path:str) -> list:
+    """reads the result lines of a results file"""
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def estimate_elo(results:list, prior_draws:float = 2.0, confidence:float = 0.95, iterations:int = 50) -> dict:
+    """
+    Maximum likelihood Elo ratings (logistic model, draws count as half a win)
+
+    Parameters:
+        results (list):         result lines (see module docstring)
+        prior_draws (float):    virtual draws of every entrant against a 0 rated opponent (0: plain maximum likelihood)
+        confidence (float):     probability covered by the confidence intervals
+
+    Returns:
+        dict:   per entrant {"elo", "error" (half width of the confidence interval), "games", "score"},
+                the ratings are shifted to an average of 0
+    """
+    names = sorted({line["first"] for line in results} | {line["second"] for line in results})
+    index = {name: position for position, name in enumerate(names)}
+    count = len(names)
+    games = np.zeros((count, count))    # games[i, j]: number of games between i and j
+    scores = np.zeros((count, count))   # scores[i, j]: points of i against j
+    for line in results:
+        first, second = index[line["first"]], index[line["second"]]
+        points = {"first": 1.0, "second": 0.0, None: 0.5}[line["winner"]]
+        games[first, second] += 1
+        games[second, first] += 1
+        scores[first, second] += points
+        scores[second, first] += 1 - points
+
+    # Newton's method on the log likelihood
+    ratings = np.zeros(count)
+    hessian = -np.eye(count)
+    for _ in range(iterations):
+        expected = 1 / (1 + np.power(10.0, (ratings[None, :] - ratings[:, None]) / 400))
+        expected_prior = 1 / (1 + np.power(10.0, -ratings / 400))
+        gradient = ELO_SCALE * ((scores - games * expected).sum(axis=1) + prior_draws * (0.5 - expected_prior))
+        weights = ELO_SCALE ** 2 * games * expected * (1 - expected)
+        hessian = weights - np.diag(weights.sum(axis=1) + prior_draws * ELO_SCALE ** 2 * expected_prior * (1 - expected_prior))
+        if prior_draws <= 0:
+            # without the prior only rating differences are defined: fix the average
+            hessian -= 1 / count
+        step = np.linalg.solve(hessian, -gradient)
+        ratings += step
+        if np.abs(step).max() < 1e-6:
+            break
+
+    # covariance of the ratings after shifting them to an average of 0
+    centering = np.eye(count) - 1 / count
+    covariance = centering @ np.linalg.inv(-hessian) @ centering
+    # two sided normal quantile, e.g. 1.96 for 95%
+    z = math.sqrt(2) * _inverse_erf(confidence)
+    ratings -= ratings.mean()
+    played = games.sum(axis=1)
+    return {name: {"elo": float(ratings[i]),
+                   "error": float(z * math.sqrt(max(covariance[i, i], 0.0))),
+                   "games": int(played[i]),
+                   "score": float(scores[i].sum() / played[i]) if played[i] else 0.0}
+            for name, i in index.items()}
+
+
+def _inverse_erf(y:float) -> float:
+    """inverse of math.erf (Newton's method, accurate enough for confidence levels)"""
+    x = 0.0
+    for _ in range(50):
+        x -= (math.erf(x) - y) / (2 / math.sqrt(math.pi) * math.exp(-x * x))
+    return x
+
+
+def print_ratings(ratings:dict, confidence:float = 0.95) -> None:
+    print(f"{'entrant':<32}{'elo':>8}{f'±{confidence:.0%}':>8}{'games':>8}{'score':>8}")
+    for name, rating in sorted(ratings.items(), key=lambda item: -item[1]["elo"]):
+        print(f"{name:<32}{rating['elo']:>8.0f}{rating['error']:>8.0f}{rating['games']:>8}{rating['score']:>8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-robin Connect 4 tournament with Elo ratings")
+    parser.add_argument("entrants", nargs="*", help="KIND[:OPTION=VALUE,...] with KIND bot or random, e.g. bot:depth=4")
+    parser.add_argument("--games", type=int, default=20, help="games per pairing and colour")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of cores)")
+    parser.add_argument("--batch", type=int, default=10, help="games per task of the process pool")
+    parser.add_argument("--width", type=int, default=7, help="board width")
+    parser.add_argument("--height", type=int, default=6, help="board height")
+    parser.add_argument("--seed", type=int, default=0, help="base seed of the random moves")
+    parser.add_argument("--output", metavar="FILE", help="append the results to FILE (NDJSON) while the games finish")
+    parser.add_argument("--from-results", metavar="FILE", help="don't play, compute the ratings of FILE")
+    parser.add_argument("--prior", type=float, default=2.0, help="virtual draws per entrant against a 0 rated opponent")
+    parser.add_argument("--confidence", type=float, default=0.95, help="coverage of the confidence intervals")
+    parser.add_argument("--json", action="store_true", help="print the ratings as json")
+    args = parser.parse_args()
+
+    if args.from_results:
+        results = read_results(args.from_results)
+    else:
+        if len(args.entrants) < 2:
+            parser.error("at least two entrants are required")
+        results = run_tournament(args.entrants, args.games, args.output, args.workers, args.batch,
+                                 args.width, args.height, args.seed, progress=not args.json)
+    ratings = estimate_elo(results, args.prior, args.confidence)
+    if args.json:
+        print(json.dumps(ratings, indent=2))
+    else:
+        print_ratings(ratings, args.confidence)